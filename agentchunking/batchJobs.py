@@ -0,0 +1,289 @@
+from agentchunking.constants import (COPIER_GOOGLE_MODEL,
+                                     REWRITER_GOOGLE_MODEL,
+                                     BATCH_SHARD_SIZE)
+from agentchunking.llm.shortner import passage_prompt_google
+from agentchunking.llm.rewriter import build_prompt
+from agentchunking.segmentation import next_window_end, e5_limit, span_hashes
+from agentchunking.segmentBatch import SegmentBatch
+from agentchunking.rewriting import attach_context
+from agentchunking.dataLoader import passage_hash
+from typing import Callable, Iterable, List
+from abc import ABC, abstractmethod
+from datetime import datetime
+from loguru import logger
+import hashlib
+import json
+import pandas as pd
+import glob
+import os
+import shutil
+import time
+import uuid
+
+
+# --------- Request ids and shard files ---------
+def stable_request_id(kind: str, *key_parts) -> str:
+    """Request id that stays the same across exports of the same unit of work."""
+    key = "|".join([kind] + [str(part) for part in key_parts])
+    return f"{kind}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:24]}"
+
+
+def write_shards(requests: Iterable[dict], out_dir: str, prefix: str, shard_size: int = BATCH_SHARD_SIZE) -> List[str]:
+    """Write requests as JSONL shards of at most shard_size lines, returns the shard paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    handle = None
+    count = 0
+    for request in requests:
+        if count % shard_size == 0:
+            if handle is not None:
+                handle.close()
+            path = os.path.join(out_dir, f"{prefix}-{len(paths):05d}.jsonl")
+            paths.append(path)
+            handle = open(path, "w", encoding="utf-8")
+        handle.write(json.dumps(request, ensure_ascii=False) + "\n")
+        count += 1
+    if handle is not None:
+        handle.close()
+    logger.info(f"Exported {count} requests to {len(paths)} shards in {out_dir}")
+    return paths
+
+
+def read_jsonl(paths: Iterable[str]):
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as handle:
+            for line in handle:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+# --------- Batch backends ---------
+class BatchBackend(ABC):
+    """Interface of an offline batch service: submit request shards, poll, fetch result shards.
+    A result line is {"request_id": ..., "response": <raw model text> | None, "error": <str> | None}.
+    """
+    @abstractmethod
+    def submit(self, shard_paths: List[str]) -> str:
+        """Submit request shards as one job, returns the job id."""
+
+    @abstractmethod
+    def status(self, job_id: str) -> str:
+        """returns one of "pending", "done" or "failed"."""
+
+    @abstractmethod
+    def fetch_results(self, job_id: str, out_dir: str) -> List[str]:
+        """Download the result shards of a finished job into out_dir, returns their paths."""
+
+    def wait(self, job_id: str, poll_seconds: int = 60) -> str:
+        while True:
+            state = self.status(job_id)
+            if state != "pending":
+                return state
+            logger.info(f"Batch job {job_id} pending, polling again in {poll_seconds} seconds")
+            time.sleep(poll_seconds)
+
+
+def echo_responder(request: dict) -> str:
+    """Deterministic stand-in for the model: copies the passage back in the expected JSON schema."""
+    prompt = request["prompt"]
+    if request["kind"] == "copier":
+        return json.dumps({"new_passage": prompt.split("\n\n", 1)[-1]}, ensure_ascii=False)
+    passage = prompt.split("Original Passage:", 1)[-1].split("Return the rewritten passage only.", 1)[0]
+    return json.dumps({"rewritten_passage": passage.strip()}, ensure_ascii=False)
+
+
+class LocalFileBatchBackend(BatchBackend):
+    """File based stand-in for a batch API: a job is a directory, submit answers every
+    request with responder and writes the result shards right away.
+    """
+    def __init__(self, work_dir: str, responder: Callable[[dict], str] = echo_responder):
+        self.work_dir = work_dir
+        self.responder = responder
+
+    def submit(self, shard_paths: List[str]) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        job_dir = os.path.join(self.work_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        for idx, path in enumerate(shard_paths):
+            with open(os.path.join(job_dir, f"results-{idx:05d}.jsonl"), "w", encoding="utf-8") as out:
+                for request in read_jsonl([path]):
+                    try:
+                        result = {"request_id": request["request_id"], "response": self.responder(request), "error": None}
+                    except Exception as exc:
+                        result = {"request_id": request["request_id"], "response": None, "error": str(exc)}
+                    out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        logger.info(f"Local batch job {job_id} finished with {len(shard_paths)} shards")
+        return job_id
+
+    def status(self, job_id: str) -> str:
+        return "done" if os.path.isdir(os.path.join(self.work_dir, job_id)) else "failed"
+
+    def fetch_results(self, job_id: str, out_dir: str) -> List[str]:
+        os.makedirs(out_dir, exist_ok=True)
+        paths = []
+        for path in sorted(glob.glob(os.path.join(self.work_dir, job_id, "results-*.jsonl"))):
+            target = os.path.join(out_dir, os.path.basename(path))
+            shutil.copyfile(path, target)
+            paths.append(target)
+        return paths
+
+
+# --------- Copier ---------
+# The copier is sequential within a passage (the next window starts where the copied text ended),
+# so it runs in rounds: every round exports the next window of each unfinished passage.
+def load_copier_state(state_path: str) -> dict:
+    if not os.path.exists(state_path):
+        return {"passages": {}}
+    with open(state_path, "r", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def save_copier_state(state: dict, state_path: str) -> None:
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump(state, handle, ensure_ascii=False)
+    os.replace(tmp_path, state_path)
+
+
+def export_copier_requests(data, state_path: str, out_dir: str, shard_size: int = BATCH_SHARD_SIZE) -> List[str]:
+    """
+    Export the next copier window of every unfinished passage.
+
+    Args:
+        data (pd.DataFrame): passages from get_current_data_splits, added to the state once all staged passages are finished. Can be None.
+        state_path (str): json file tracking the next start word of every passage.
+        out_dir (str): directory for the request shards.
+        shard_size (int): requests per shard.
+
+    Returns:
+        list[str]: shard paths.
+    """
+    state = load_copier_state(state_path)
+    if data is not None:
+        for _, row in data.iterrows():
+            updated_at = row.get("updated_at")
+            state["passages"].setdefault(row["id"], {"text": row["text"], "next_start": 0, "segments": [],
+                                                     "source_hash": row.get("source_hash") or passage_hash(row["text"]),
+                                                     "source_updated_at": None if pd.isna(updated_at) else pd.Timestamp(updated_at).isoformat()})
+    save_copier_state(state, state_path)
+
+    def requests():
+        for passage_id, passage in state["passages"].items():
+            words = passage["text"].split()
+            start = passage["next_start"]
+            if start >= len(words):
+                continue
+            end = next_window_end(words, start, prefix=e5_limit.prefix(words))
+            chunk = " ".join(words[start:end]).strip()
+            yield {"request_id": stable_request_id("copier", passage_id, start),
+                   "kind": "copier",
+                   "model": COPIER_GOOGLE_MODEL,
+                   "prompt": passage_prompt_google.format(passage=chunk),
+                   "metadata": {"passage_id": passage_id, "start": start}}
+
+    return write_shards(requests(), out_dir, "copier", shard_size)
+
+
+def ingest_copier_results(db, result_paths: List[str], state_path: str) -> int:
+    """
+    Stage the copied segments of a round in the state and advance every passage. Passages copied to the
+    end are written with replace_passage_segments (stale segments of edited passages go in the same
+    transaction), so a half copied passage never shows up in segmentation_table.
+
+    Returns:
+        int: number of segments written for the passages finished in this round.
+    """
+    state = load_copier_state(state_path)
+    pending = {stable_request_id("copier", pid, p["next_start"]): pid for pid, p in state["passages"].items()}
+    staged = 0
+    for result in read_jsonl(result_paths):
+        passage_id = pending.get(result["request_id"])
+        if passage_id is None or result["error"] or not result["response"]:
+            continue  # stale, already ingested or failed: exported again next round
+        try:
+            shortened = json.loads(result["response"])["new_passage"].strip()
+        except Exception as exc:
+            logger.warning(f"Unparseable copier response for {result['request_id']}: {exc}")
+            continue
+        if not shortened:
+            continue
+        passage = state["passages"][passage_id]
+        start = passage["next_start"]
+        passage["next_start"] = min(start + len(shortened.split()), len(passage["text"].split()))
+        passage.setdefault("segments", []).append([shortened, start, passage["next_start"] - 1])
+        staged += 1
+
+    finished = [pid for pid, p in state["passages"].items() if p["next_start"] >= len(p["text"].split())]
+    now = datetime.now()
+    written = 0
+    for i in range(0, len(finished), 1000):
+        ids = finished[i:i + 1000]
+        segments = SegmentBatch()
+        states = []
+        for pid in ids:
+            passage = state["passages"][pid]
+            passage_segments = [{"passage_id": pid, "text": text, "start": start, "end": end}
+                                for text, start, end in passage.get("segments", [])]
+            for segment in passage_segments:
+                segments.append(**segment)
+            updated_at = passage.get("source_updated_at")
+            states.append({"passage_id": pid,
+                           "source_hash": passage.get("source_hash") or passage_hash(passage["text"]),
+                           "source_updated_at": datetime.fromisoformat(updated_at) if updated_at else None,
+                           "segmented_at": now,
+                           "span_hashes": span_hashes(passage["text"], passage_segments)})
+        db.replace_passage_segments(ids, segments, states)
+        written += len(segments)
+    # finished passages leave the state only once they are written
+    for pid in finished:
+        del state["passages"][pid]
+    save_copier_state(state, state_path)
+    logger.info(f"Staged {staged} copier segments, wrote {written} segments of {len(finished)} finished passages, "
+                f"{len(state['passages'])} passages unfinished")
+    return written
+
+
+# --------- Rewriter ---------
+def export_rewriter_requests(db, out_dir: str, shard_size: int = BATCH_SHARD_SIZE, batch_size: int = 1000) -> List[str]:
+    """Export one rewrite request per segment with empty data."""
+    def requests():
+        for batch in db.segmentation_table.select_iter(columns=["passage_id", "start", "end", "text"],
+                                                       condition_dict={"data": ""},
+                                                       batch_size=batch_size):
+            for segment in attach_context(db, batch):
+                yield {"request_id": stable_request_id("rewriter", segment["passage_id"], segment["start"], segment["end"]),
+                       "kind": "rewriter",
+                       "model": REWRITER_GOOGLE_MODEL,
+                       "prompt": build_prompt(segment["topic"], segment["heading"], segment["text"]),
+                       "metadata": {"passage_id": segment["passage_id"], "start": int(segment["start"]), "end": int(segment["end"])}}
+
+    return write_shards(requests(), out_dir, "rewriter", shard_size)
+
+
+def ingest_rewriter_results(db, request_paths: List[str], result_paths: List[str], batch_size: int = 1000) -> int:
+    """Write rewritten passages back to segmentation_table with batched updates, returns the updated count."""
+    keys = {request["request_id"]: request["metadata"] for request in read_jsonl(request_paths)}
+    updates = []
+    updated = 0
+    for result in read_jsonl(result_paths):
+        metadata = keys.get(result["request_id"])
+        if metadata is None or result["error"] or not result["response"]:
+            continue
+        try:
+            rewritten = json.loads(result["response"])["rewritten_passage"].strip()
+        except Exception as exc:
+            logger.warning(f"Unparseable rewriter response for {result['request_id']}: {exc}")
+            continue
+        if not rewritten:
+            continue
+        updates.append({**metadata, "data": rewritten})
+        if len(updates) >= batch_size:
+            db.segmentation_table.bulk_update(["passage_id", "start", "end"], updates)
+            updated += len(updates)
+            updates = []
+    if updates:
+        db.segmentation_table.bulk_update(["passage_id", "start", "end"], updates)
+        updated += len(updates)
+    logger.info(f"Ingested {updated} rewritten segments")
+    return updated
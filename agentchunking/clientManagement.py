@@ -1,19 +1,25 @@
-from agentchunking.constants import GOOGLE_APIS_CSV
-from google import genai
+from agentchunking.constants import GOOGLE_APIS_CSV,LLM_CLIENT_BACKEND,LOCAL_LLM_SERVER_URL,LOCAL_LLM_KEYS
+from agentchunking import metrics
+from agentchunking import tracing
 import pandas as pd
+import os
 from datetime import datetime, timedelta
-from typing import List
+from typing import Callable, List, Optional, Set, Tuple
+import heapq
+import itertools
 import random
+import threading
 import time
 from loguru import logger
 from collections import deque
 
 
 class APIClientWrapper:
-    def __init__(self, client, daily_limit: int, rpm_limit: int):
+    def __init__(self, client, daily_limit: int, rpm_limit: int, models: Optional[Set[str]] = None):
         self.client = client
         self.daily_limit = daily_limit
         self.rpm_limit = rpm_limit
+        self.models = models  # None: eligible for every model
         self.calls_made = 0
         self.last_reset = datetime.now().date()
         self.request_timestamps = deque()
@@ -33,6 +39,29 @@ class APIClientWrapper:
         # Check limits
         return self.calls_made < self.daily_limit and len(self.request_timestamps) < self.rpm_limit
 
+    def ready_at(self) -> float:
+        """Epoch seconds from which the key can take its next request (now if it can already)."""
+        if self.is_available():
+            return time.time()
+        if self.calls_made >= self.daily_limit:
+            return datetime.combine(self.last_reset + timedelta(days=1), datetime.min.time()).timestamp()
+        # the oldest request that has to leave the one minute window
+        return (self.request_timestamps[-self.rpm_limit] + timedelta(minutes=1, milliseconds=1)).timestamp()
+
+    def used_fraction(self) -> float:
+        return self.calls_made / self.daily_limit if self.daily_limit else 1.0
+
+    def rpm_headroom(self) -> int:
+        # read-only, called from the metrics endpoint thread
+        cutoff = datetime.now() - timedelta(minutes=1)
+        recent = sum(1 for ts in list(self.request_timestamps) if ts > cutoff)
+        return max(0, self.rpm_limit - recent)
+
+    def rpd_headroom(self) -> int:
+        if self.last_reset != datetime.now().date():
+            return self.daily_limit
+        return max(0, self.daily_limit - self.calls_made)
+
     def use(self):
         if not self.is_available():
             raise RuntimeError("Quota exceeded for this client (daily or RPM limit).")
@@ -41,42 +70,172 @@ class APIClientWrapper:
         return self.client
 
 
-class RoundRobinClientManager:
-    def __init__(self, clients: List[APIClientWrapper]):
+class PriorityClientManager:
+    """
+    Key selection over two heaps:
+        ready   -> keys that can take a request now, lowest priority first (by default the used share of
+                   the daily budget, so free and paid keys run out together instead of one after the other)
+        cooling -> keys at their RPM or daily limit, ordered by the time they can take the next request
+    Only the picked key changes state, so a pick is a few heap operations: O(log n) in the number of keys.
+    Heap entries carry the version of their key; re-pushing a key makes its older entries stale.
+    """
+    def __init__(self, clients: List[APIClientWrapper], pool: str = "google", max_wait: float = 60.0,
+                 priority: Optional[Callable[[int], float]] = None):
+        if not clients:
+            raise ValueError(f"No API clients for pool {pool}.")
         self.clients = clients
-        self.index = 0  # Round-robin pointer
-
-    def get_next_available_client(self):
-        start_index = self.index
-        num_clients = len(self.clients)
-
-        for _ in range(num_clients):
-            client = self.clients[self.index]
-            self.index = (self.index + 1) % num_clients
-            if client.is_available():
-                return client
-
-        # No client available: wait and retry
-        logger.warning("All clients exceeded RPM. Waiting 60 seconds to retry.")
-        time.sleep(60)
-
-        # Retry once after cooldown
-        for _ in range(num_clients):
-            client = self.clients[self.index]
-            self.index = (self.index + 1) % num_clients
-            if client.is_available():
-                return client
-
-        # If still unavailable, raise error
-        logger.error("No available clients even after cooldown.")
-        raise RuntimeError("No available clients after waiting for RPM reset.")
+        self.max_wait = max_wait  # longest RPM cooldown to wait for before giving up
+        self.priority = priority or (lambda idx: self.clients[idx].used_fraction())
+        self.lock = threading.Lock()  # concurrent drivers share one manager
+        self.sequence = itertools.count()  # tie breaker: equally used keys take turns
+        self.build_heaps()
+        for idx, client in enumerate(clients):
+            metrics.KEY_RPM_HEADROOM.set_function(client.rpm_headroom, pool=pool, key=idx)
+            metrics.KEY_RPD_HEADROOM.set_function(client.rpd_headroom, pool=pool, key=idx)
+
+    def build_heaps(self):
+        self.day = datetime.now().date()
+        self.ready = []
+        self.cooling = []
+        self.versions = [0] * len(self.clients)
+        for idx in range(len(self.clients)):
+            self.push(idx)
+
+    def push(self, idx: int):
+        self.versions[idx] += 1
+        client = self.clients[idx]
+        if client.is_available():
+            heapq.heappush(self.ready, (self.priority(idx), next(self.sequence), idx, self.versions[idx]))
+        else:
+            heapq.heappush(self.cooling, (client.ready_at(), next(self.sequence), idx, self.versions[idx]))
+
+    def stale(self, entry) -> bool:
+        return entry[3] != self.versions[entry[2]]
+
+    def promote(self):
+        if self.day != datetime.now().date():
+            self.build_heaps()  # daily budgets are back
+        now = time.time()
+        while self.cooling and (self.cooling[0][0] <= now or self.stale(self.cooling[0])):
+            entry = heapq.heappop(self.cooling)
+            if not self.stale(entry):
+                self.push(entry[2])
+
+    def acquire(self, exclude: Optional[Set[int]] = None) -> Optional[int]:
+        """Charge the best ready key outside exclude to its quota and return its index, None if no key is ready."""
+        with self.lock:
+            self.promote()
+            skipped = []
+            picked = None
+            while self.ready:
+                entry = heapq.heappop(self.ready)
+                if self.stale(entry):
+                    continue
+                if exclude and entry[2] in exclude:
+                    skipped.append(entry)
+                    continue
+                if not self.clients[entry[2]].is_available():
+                    self.push(entry[2])
+                    continue
+                picked = entry[2]
+                break
+            for entry in skipped:
+                heapq.heappush(self.ready, entry)
+            if picked is not None:
+                self.clients[picked].use()
+                self.push(picked)
+            return picked
+
+    def reprioritize(self, idx: int):
+        """Re-rank a key whose priority changed outside use() (e.g. a new latency measurement)."""
+        with self.lock:
+            self.push(idx)
+
+    def next_ready_at(self) -> Tuple[Optional[float], Optional[int]]:
+        with self.lock:
+            self.promote()
+            if self.ready:
+                return time.time(), None
+            return self.cooling[0][0], self.cooling[0][2]
+
+    def get_next_available_client(self) -> int:
+        """Index of the key charged for the next request, waits up to max_wait for an RPM cooldown.
+        The wait happens outside the lock so other callers can still take keys that free up.
+        """
+        waited = 0.0
+        while True:
+            idx = self.acquire()
+            if idx is not None:
+                return idx
+            ready_at, cooling_idx = self.next_ready_at()
+            if cooling_idx is None:
+                continue  # a key became ready meanwhile
+            wait = max(ready_at - time.time(), 0.0)
+            if waited + wait > self.max_wait:
+                client = self.clients[cooling_idx]
+                reason = "daily limit" if client.calls_made >= client.daily_limit else "RPM limit"
+                logger.error(f"All clients exceeded their {reason}, next one is free in {wait:.0f} seconds.")
+                raise RuntimeError(f"No available clients: {reason} reached on every key.")
+            logger.warning(f"All clients exceeded RPM. Waiting {wait:.1f} seconds to retry.")
+            metrics.sleep(wait, site="client_cooldown")
+            waited += wait
 
     def get_client(self):
-        client_wrapper = self.get_next_available_client()
-        return client_wrapper.use()
-
-
-def create_wrapped_clients_google(rpd, rpm):
-    apis = pd.read_csv(GOOGLE_APIS_CSV)["api"].tolist()
-    wrapped_clients = [APIClientWrapper(genai.Client(api_key=key), rpd, rpm) for key in apis]
-    return RoundRobinClientManager(wrapped_clients)
+        idx = self.get_next_available_client()
+        tracing.annotate(key_index=idx)
+        return self.clients[idx].client
+
+
+def create_google_client(key: str, backend: str = LLM_CLIENT_BACKEND):
+    """genai client for the real API, the local stand-in server or the in-process fake."""
+    if backend in ("google", "local"):
+        from google import genai  # the fake backend and the router run without google-genai
+    if backend == "google":
+        return genai.Client(api_key=key)
+    if backend == "local":
+        return genai.Client(api_key=key, http_options=genai.types.HttpOptions(base_url=LOCAL_LLM_SERVER_URL))
+    if backend == "fake":
+        from agentchunking.llm.fake import FakeGeminiClient
+        return FakeGeminiClient()
+    raise ValueError(f"Unknown LLM client backend: {backend}")
+
+
+def read_api_keys(rpd: int, rpm: int, model: Optional[str] = None) -> List[dict]:
+    """
+    Keys of GOOGLE_APIS_CSV with their own limits. Columns:
+        api    -> the key (required)
+        rpd    -> requests per day of the key, empty for the pool default
+        rpm    -> requests per minute of the key, empty for the pool default
+        models -> ";" separated models the key may call, empty for any model
+
+    Args:
+        rpd (int): default requests per day.
+        rpm (int): default requests per minute.
+        model (str): only keep keys eligible for this model.
+
+    Returns:
+        list of dict: {"api", "rpd", "rpm", "models"} per key.
+    """
+    frame = pd.read_csv(GOOGLE_APIS_CSV, dtype=str).fillna("")
+    keys = []
+    for row in frame.to_dict(orient="records"):
+        models = {name.strip() for name in row.get("models", "").split(";") if name.strip()} or None
+        if model is not None and models is not None and model not in models:
+            continue
+        keys.append({"api": row["api"].strip(),
+                     "rpd": int(float(row["rpd"])) if row.get("rpd", "").strip() else rpd,
+                     "rpm": int(float(row["rpm"])) if row.get("rpm", "").strip() else rpm,
+                     "models": models})
+    return keys
+
+
+def create_wrapped_clients_google(rpd, rpm, pool="google", backend=LLM_CLIENT_BACKEND, model=None):
+    if backend != "google" and not os.path.exists(GOOGLE_APIS_CSV):
+        keys = [{"api": f"local-key-{idx}", "rpd": rpd, "rpm": rpm, "models": None} for idx in range(LOCAL_LLM_KEYS)]
+    else:
+        keys = read_api_keys(rpd, rpm, model)
+    if backend != "google":
+        logger.info(f"Using {backend} LLM clients for {pool} ({len(keys)} keys)")
+    wrapped_clients = [APIClientWrapper(create_google_client(key["api"], backend), key["rpd"], key["rpm"], key["models"])
+                       for key in keys]
+    return PriorityClientManager(wrapped_clients, pool=pool)
@@ -1,3 +1,5 @@
+import os
+
 MAX_TOKEN_PASSAGE_TO_USE_AS_IT_IS=500
 ABSOLUTE_MAX_TOKEN_LIMIT=512
 
@@ -6,12 +8,100 @@ LLM_MODEL="meta-llama/Llama-3.3-70B-Instruct"
 DB_CONFIG_PATH="configs/database.yaml"
 
 GOOGLE_APIS_CSV="extra/google_apis.csv"
+LLM_CLIENT_BACKEND=os.environ.get("LLM_CLIENT_BACKEND", "google")  # "google" (real API), "local" (stand-in server, see llm_server.py) or "fake" (in-process)
+LOCAL_LLM_SERVER_URL="http://127.0.0.1:8765"
+LOCAL_LLM_KEYS=8                    # keys simulated when GOOGLE_APIS_CSV is missing in local/fake mode
 
 
 COPIER_GOOGLE_MODEL="gemini-2.0-flash"
 COPIER_MAX_ALLOWED_RPD=1480
 COPIER_MAX_ALLOWED_RPM=12
+COPIER_HEDGE_PERCENTILE=None        # e.g. 95 to hedge calls slower than the recent p95, None disables hedging
+COPIER_HEDGE_MAX_FRACTION=0.05      # at most this fraction of copier calls may be duplicated
+ROUTER_PRIOR_LATENCY=5.0            # seconds a backend is assumed to take until its first successful call
 
 REWRITER_GOOGLE_MODEL="gemini-2.5-flash-preview-05-20"
 REWRITER_MAX_ALLOWED_RPD=480
 REWRITER_MAX_ALLOWED_RPM=8
+REWRITER_WORKERS=8                  # concurrent rewrite requests
+REWRITER_BATCH_SIZE=200             # segments fetched and written back per batch
+REWRITER_PACKING=True               # pack segments sharing topic/heading into one request
+REWRITER_PACK_MAX_TOKENS=3000       # llama tokens of packed passages per request
+REWRITER_PACK_MAX_SEGMENTS=8
+
+# segment embeddings
+EMBEDDING_PASSAGE_PREFIX="passage: "
+EMBEDDING_QUERY_PREFIX="query: "
+EMBEDDING_MAX_BATCH_TOKENS=16384    # padded tokens per inference batch
+EMBEDDING_BACKEND="torch"           # "torch" or "onnx"
+EMBEDDING_QUANTIZE=True             # int8 dynamic quantization for CPU inference
+EMBEDDING_ONNX_DIR="models/e5-onnx"
+
+# segment vector store
+VECTOR_STORE_DIR="stores/vectors"
+VECTOR_DIM=1024                     # multilingual-e5-large
+VECTOR_INDEX="ivf"                  # "ivf" (numpy) or "hnsw" (hnswlib)
+IVF_NLIST=1024
+IVF_NPROBE=16
+HNSW_M=32
+HNSW_EF_CONSTRUCTION=200
+HNSW_EF_SEARCH=64
+
+# bengali BM25 lexical index
+LEXICAL_INDEX_DIR="stores/lexical"
+LEXICAL_MAX_SEGMENTS=16             # merge the index once it has more immutable segments than this
+STORE_SYNC_WATERMARK_LAG=300        # seconds; segments updated more recently wait for the next index/store sync
+BM25_K1=1.2
+BM25_B=0.75
+
+# retrieval service
+RETRIEVAL_QUERY_CACHE_SIZE=10000    # cached query embeddings
+RETRIEVAL_RESULT_CACHE_SIZE=2000    # cached hydrated result sets
+RETRIEVAL_CANDIDATES=50             # candidates per store before fusion
+
+# near-duplicate passage detection (MinHash + LSH)
+DEDUP_NUM_PERM=64
+DEDUP_BANDS=8                       # 8 bands x 8 rows -> candidates from ~0.77 jaccard
+DEDUP_SHINGLE_SIZE=3
+DEDUP_JACCARD_THRESHOLD=0.8
+
+# offline batch mode
+BATCH_SHARD_SIZE=5000               # requests per JSONL shard
+BATCH_WORK_DIR="batch"
+
+PROVIDERS_CONFIG_PATH="configs/providers.yaml"
+
+# intra-passage parallelism: long passages are cut at blank lines / headings into sections segmented concurrently
+SECTION_MIN_PASSAGE_WORDS=1500      # shorter passages are segmented sequentially
+SECTION_MIN_WORDS=400               # paragraphs are grouped until a section has at least this many words
+SECTION_WORKERS=4                   # sections of one passage in flight at once
+SECTION_HEADING_MAX_WORDS=12        # a line this short without final punctuation counts as a heading
+
+# streaming pipeline (stream.py): worker threads per stage, bounded queues between stages
+PIPELINE_QUEUE_SIZE=64              # items per inter-stage queue, a full queue blocks the upstream stage
+PIPELINE_LOADER_BATCH_SIZE=200      # annotation rows per loader batch
+PIPELINE_SPLITTER_WORKERS=1
+PIPELINE_COPIER_WORKERS=8
+PIPELINE_SINK_WORKERS=2
+PIPELINE_REWRITER_WORKERS=4
+
+# live metrics (prometheus text format on localhost), None disables the endpoint
+METRICS_PORT=9464
+
+# tracing and profiling (segment.py --trace / --profile)
+TRACE_DIR="traces"                  # one Chrome trace + OTLP json per passage
+PROFILE_DIR="profiles"              # folded stacks for flamegraph.pl / speedscope
+PROFILE_INTERVAL=0.01               # seconds between stack samples
+
+# parquet export of finished segments (export.py)
+EXPORT_DIR="exports/segments"
+EXPORT_SHARD_ROWS=500000            # rows per parquet shard
+EXPORT_ROW_GROUP_ROWS=50000         # rows per row group, the unit readers skip by min/max statistics
+EXPORT_ZSTD_LEVEL=6
+EXPORT_WATERMARK_LAG=300            # seconds; rows younger than this wait for the next export (late commits)
+
+# calibrated token estimates (calibrate_tokens.py): exact tokenizers only run when the bounds straddle a limit
+TOKEN_ESTIMATOR_PATH="configs/token_estimators.json"   # missing file: every check uses the exact tokenizer
+TOKEN_ESTIMATE_QUANTILE=0.995       # bounds cover this share of the calibration sample on each side
+TOKEN_ESTIMATE_AUDIT_EVERY=200      # every n-th check also runs the exact tokenizer to track calibration error
+TOKEN_ESTIMATE_HARD_MARGIN=0.1      # hard limits (e5 truncates past them) only trust estimates this far below the limit
@@ -1,48 +1,124 @@
 from agentchunking.utils.filehelpers import config_loader
 from agentchunking.database.manager import SQLDatabaseManager
+from agentchunking.dedup import mark_near_duplicates
+from agentchunking.segmentBatch import SegmentBatch
+from agentchunking.segmentation import span_hashes, count_e5_tokens, e5_limit  # one e5 tokenizer and TokenLimit (audit counter, metrics)
 from agentchunking.constants import (MAX_TOKEN_PASSAGE_TO_USE_AS_IT_IS,
                                      DB_CONFIG_PATH,
-                                     LLM_MODEL,
-                                     EMBDEEING_MODEL)
-import re
+                                     LLM_MODEL)
+from agentchunking.utils.texthelpers import clear_tag_text,clean_bangla_text
+from agentchunking import metrics
 from transformers import AutoTokenizer
 from loguru import logger
+from datetime import datetime
+import hashlib
+import pandas as pd
 
 # global 
-e5_tokenizer = AutoTokenizer.from_pretrained(EMBDEEING_MODEL)  # or "intfloat/multilingual-e5-large"
 llama_tokenizer = AutoTokenizer.from_pretrained(LLM_MODEL)
 
 
 # helpers
-def count_e5_tokens(text):
-    # Tokenize the text and count tokens
-    tokens = e5_tokenizer.encode(text,add_special_tokens=True)
-    return len(tokens)
-
-
-
 def count_llama_tokens(text):
     # Tokenize the text and count tokens
-    tokens = llama_tokenizer.encode(text)
+    with metrics.TOKENIZER_SECONDS.time(tokenizer="llama"):
+        tokens = llama_tokenizer.encode(text)
     return len(tokens)
 
 
 
-def clear_tag_text(text):
-    if "passage_heading:" in text:
-        return text.split('\n', 1)[-1]
-    else:
-        return text
+def passage_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def passage_state(row, segmented_at, segments=None):
+    """passage_state_table row, with the span hashes of segments (copier output) for later reuse."""
+    updated_at = row["updated_at"]
+    return {"passage_id": row["id"],
+            "source_hash": row["source_hash"],
+            "source_updated_at": None if pd.isna(updated_at) else updated_at.to_pydatetime(),
+            "segmented_at": segmented_at,
+            "span_hashes": span_hashes(row["text"], segments) if segments is not None else ""}
+
+
+def find_modified_passages(data, inserted_ids, db, states=None):
+    """
+    Ids of already segmented passages whose text changed since segmentation.
+    data carries the source_hash of every row; only rows with a newer updated_at (or no timestamps)
+    are compared with the stored hash.
+    Segmented passages without a recorded state are assumed current and get one.
+    states can be passed in when the passages are checked batch by batch.
+    """
+    if states is None:
+        states = db.passage_state_table.select_columns(columns=['passage_id', 'source_hash', 'source_updated_at'])
+    # the stored hash would otherwise collide with the source_hash column of data
+    states = states.rename(columns={"source_hash": "stored_hash"})
+    segmented = data[data["id"].isin(inserted_ids)]
+    merged = segmented.merge(states, how="left", left_on="id", right_on="passage_id")
+
+    missing = merged[merged["passage_id"].isna()]
+    if len(missing) > 0:
+        logger.info(f"# recording source state of {len(missing)} segmented passages")
+        now = datetime.now()
+        db.passage_state_table.upsert([passage_state(row, now) for _, row in missing.iterrows()],
+                                      ["source_hash", "source_updated_at", "segmented_at"])
+
+    known = merged[merged["passage_id"].notna()]
+    maybe_changed = known[known["updated_at"].isna() | known["source_updated_at"].isna() |
+                          (known["updated_at"] > known["source_updated_at"])]
+    modified = maybe_changed[maybe_changed["source_hash"] != maybe_changed["stored_hash"]]
+    return set(modified["id"])
+
+
+def prepare_passages(data: pd.DataFrame) -> pd.DataFrame:
+    """Clean heading/topic, drop unusable rows and flag passages short enough (in e5 tokens) to use as they are.
+    Expects the tag-cleaned loader frame (id, text, topic, heading)."""
+    logger.info('# process heading')
+    data['heading'] = data['heading'].apply(clean_bangla_text)
+    data = data[data['heading'].str.len() > 0]
+    
+    logger.info('# process topic')
+    data["topic"] = data["topic"].apply(clean_bangla_text)
+    data = data[data['topic'].str.len() > 0]
     
-def clean_bangla_text(text):
-    # Remove trailing underscores, hyphens, newlines, pipes
-    text = re.sub(r'[_|-|\n]+$', '', text.rstrip())
-    # Keep Bangla characters (U+0980 to U+09FF), alphanumeric, and spaces; remove others
-    text = re.sub(r'[^\u0980-\u09FFa-zA-Z0-9\s]', '', text)
-    # Replace multiple spaces with a single space
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+    logger.info('# get word count')
+    data["word_count"]=data["text"].apply(lambda x: len(x.split()))
+    data = data[data.word_count>10]
 
+    logger.info('# clear data')
+    data = data.dropna(subset=['text', 'heading', 'topic'])
+    
+    data.reset_index(drop=True, inplace=True)
+
+    logger.info('# create split')
+    # calibrated estimate, the e5 tokenizer only runs for passages close to the limit
+    data["use_as_it_is"]=data['text'].apply(lambda text: e5_limit.within(text, MAX_TOKEN_PASSAGE_TO_USE_AS_IT_IS, hard=True))
+    return data
+
+
+def iter_current_data(db, batch_size: int = 500):
+    """
+    Streaming counterpart of get_current_data_splits: yields loader frames (id, url, text, topic, heading,
+    updated_at, source_hash, resegment) of new or edited passages batch by batch, so downstream stages start
+    on the first batch instead of waiting for the whole corpus. Near-duplicate grouping needs the whole
+    corpus and is not applied here.
+    """
+    inserted=db.segmentation_table.select_columns(columns=['passage_id'])
+    inserted_ids=set(inserted.passage_id.unique())
+    states=db.passage_state_table.select_columns(columns=['passage_id', 'source_hash', 'source_updated_at'])
+    logger.info(f"# found already inserted ids:{len(inserted_ids)}")
+
+    for data in db.annotation_table.select_iter(columns=['annotation_data_id','url', 'text', 'site_name', 'passage_heading', 'updated_at'],
+                                                batch_size=batch_size):
+        data.rename(columns={'annotation_data_id': 'id',"site_name":"topic","passage_heading":"heading"}, inplace=True)
+        data['text'] = data['text'].apply(clear_tag_text)
+        data = data[data['text'].str.len() > 0].copy()
+        data['source_hash'] = data['text'].apply(passage_hash)
+        modified_ids=find_modified_passages(data, inserted_ids, db, states)
+        data=data[~data["id"].isin(inserted_ids) | data["id"].isin(modified_ids)].copy()
+        data["resegment"]=data["id"].isin(modified_ids)
+        if len(data) > 0:
+            yield data
 
 
 def get_current_data_splits():
@@ -52,56 +128,43 @@ def get_current_data_splits():
         db = SQLDatabaseManager(db_config)
 
         logger.info("# load data")
-        data=db.annotation_table.select_columns(columns=['annotation_data_id','url', 'text', 'site_name', 'passage_heading'])
+        data=db.annotation_table.select_columns(columns=['annotation_data_id','url', 'text', 'site_name', 'passage_heading', 'updated_at'])
         data.rename(columns={'annotation_data_id': 'id',"site_name":"topic","passage_heading":"heading"}, inplace=True)
 
-        inserted=db.segmentation_table.select()
-        inserted_ids=[pid for pid in inserted.passage_id.unique()]
-        logger.info(f"# found already inserted ids:{len(inserted_ids)}")
-        data=data[~data["id"].isin(inserted_ids)]
-
         logger.info("# clear text from tags")
         data['text'] = data['text'].apply(clear_tag_text)
         data = data[data['text'].str.len() > 0]
+        data['source_hash'] = data['text'].apply(passage_hash)
+
+        inserted=db.segmentation_table.select_columns(columns=['passage_id'])
+        inserted_ids=[pid for pid in inserted.passage_id.unique()]
+        logger.info(f"# found already inserted ids:{len(inserted_ids)}")
+        modified_ids=find_modified_passages(data, inserted_ids, db)
+        logger.info(f"# found modified passages to re-segment:{len(modified_ids)}")
+        data=data[~data["id"].isin(inserted_ids) | data["id"].isin(modified_ids)]
+        data["resegment"]=data["id"].isin(modified_ids)
 
         # data['text'] = data['text'].apply(clean_bangla_text)
         # data = data[data['text'].str.len() > 0]
 
-        logger.info('# process heading')
-        data['heading'] = data['heading'].apply(clean_bangla_text)
-        data = data[data['heading'].str.len() > 0]
-        
-        logger.info('# process topic')
-        data["topic"] = data["topic"].apply(clean_bangla_text)
-        data = data[data['topic'].str.len() > 0]
-        
-        logger.info('# get word count')
-        data["word_count"]=data["text"].apply(lambda x: len(x.split()))
-        data = data[data.word_count>10]
-
-        logger.info('# clear data')
-        data = data.dropna(subset=['text', 'heading', 'topic'])
-        
-        logger.info('# get tokens')
-        data["llama_token_count"] = data['text'].apply(count_llama_tokens)
-        data["e5_token_count"] = data['text'].apply(count_e5_tokens)
-        data.reset_index(drop=True, inplace=True)
-
-        logger.info('# create split')
-        data["use_as_it_is"]=data.apply(lambda x: True  if x["e5_token_count"]<=MAX_TOKEN_PASSAGE_TO_USE_AS_IT_IS else False,axis=1)
+        data = prepare_passages(data)
         unchanged=data.loc[data.use_as_it_is==True]
         changed=data.loc[data.use_as_it_is!=True]
         
         if len(unchanged)>0:
             logger.info("Inseting the segmentation data ")
-            unchanged=unchanged[["id","text"]]
-            unchanged.rename(columns={"id":"passage_id"},inplace=True)
-            unchanged["start"]=0
-            unchanged["data"]=""
-            unchanged["end"]=unchanged["text"].apply(lambda x: len(x.split())) 
-            list_of_dicts = unchanged.to_dict(orient='records')
-            db.segmentation_table_insert(list_of_dicts)
+            now=datetime.now()
+            states=[passage_state(row, now) for _, row in unchanged.iterrows()]
+            segments = SegmentBatch.whole_passages(unchanged["id"].tolist(), unchanged["text"].tolist(),
+                                                   unchanged["text"].str.split().str.len().to_numpy())
+            # stale segments of modified passages are replaced in the same transaction
+            for i in range(0, len(segments), 5000):
+                batch = segments[i:i + 5000]
+                db.replace_passage_segments(batch.passage_id, batch, states[i:i + 5000])
         changed.reset_index(drop=True,inplace=True)
+
+        logger.info('# group near-duplicate passages')
+        changed = mark_near_duplicates(changed)
         return changed,db
     except Exception as e:
         logger.error(f"Error in getting current split data:{e}")
@@ -0,0 +1,278 @@
+import sys
+import time
+import asyncio
+import pandas as pd
+from functools import wraps
+from sqlalchemy import select, insert, delete, update, and_, bindparam, any_, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from loguru import logger
+from agentchunking.database.definitions import AnnotationTable, SegmentationTable, SegmentEmbeddingTable, PassageStateTable
+from agentchunking.segmentBatch import SegmentBatch, COLUMNS as SEGMENT_COLUMNS
+from agentchunking import metrics
+
+"""asyncio counterpart of SQLTable / SQLDatabaseManager (SQLAlchemy asyncio on asyncpg).
+Same table definitions and the same statements as the synchronous layer, so an asyncio driver
+can overlap database I/O with in-flight LLM calls instead of blocking the event loop.
+Schema creation and migrations stay with the synchronous SQLDatabaseManager.
+"""
+
+
+def timed_operation(operation: str):
+    """Async variant of definitions.timed_operation."""
+    def decorator(method):
+        @wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            result = await method(self, *args, **kwargs)
+            metrics.DB_QUERY_SECONDS.observe(time.perf_counter() - start, table=self.table.name, operation=f"async_{operation}")
+            return result
+        return wrapper
+    return decorator
+
+
+async def copy_segment_batch(conn, table, batch: SegmentBatch) -> None:
+    """COPY a SegmentBatch into table inside the open transaction of conn (asyncpg copy_records_to_table)."""
+    if not len(batch):
+        return
+    raw = await conn.get_raw_connection()
+    driver = raw.driver_connection
+    if not driver.is_in_transaction():
+        # the asyncpg adapter only opens the database transaction with the first statement,
+        # open it now so the COPY commits or rolls back with the surrounding begin()
+        await conn.execute(text("SELECT 1"))
+        if not driver.is_in_transaction():
+            raise RuntimeError("COPY needs an open transaction, call it inside engine.begin().")
+    await driver.copy_records_to_table(table.name, records=list(batch.rows()), columns=list(SEGMENT_COLUMNS))
+
+
+class AsyncSQLTable:
+    """Async SQL table operations on an AsyncEngine.
+    """
+    def __init__(self, engine: AsyncEngine, table) -> None:
+        self.engine = engine
+        self.table = table
+
+    def columns(self, column_names: list[str] = None):
+        if not column_names:
+            return [self.table]
+        for col_name in column_names:
+            if not hasattr(self.table.c, col_name):
+                raise AttributeError(f"Column '{col_name}' not found in table '{self.table.name}'.")
+        return [getattr(self.table.c, col_name) for col_name in column_names]
+
+    def where(self, stmt, condition_dict: dict = None):
+        if condition_dict:
+            stmt = stmt.where(and_(*[getattr(self.table.c, col) == val for col, val in condition_dict.items()]))
+        return stmt
+
+    @timed_operation("insert")
+    async def insert(self, insert_data: list[dict]) -> int:
+        """insert rows in one transaction.
+
+        Args:
+            insert_data (list of dict | SegmentBatch): rows to be inserted
+
+        Returns:
+            int: returns 0 if successful
+        """
+        if not insert_data:
+            return 0
+        try:
+            async with self.engine.begin() as conn:
+                if isinstance(insert_data, SegmentBatch):
+                    await copy_segment_batch(conn, self.table, insert_data)
+                else:
+                    await conn.execute(insert(self.table), insert_data)
+        except Exception as exc:
+            logger.error(f"An error occurred during async INSERT: {exc}")
+            sys.exit(-1)
+        return 0
+
+    @timed_operation("bulk_insert")
+    async def bulk_insert(self, insert_data: list[dict], batch_size: int = 5000, max_concurrency: int = 1) -> int:
+        """insert many rows as executemany batches (a SegmentBatch is sliced and COPYed instead).
+        With max_concurrency > 1 batches are written concurrently on separate pooled connections
+        (each batch is its own transaction).
+
+        Returns:
+            int: number of inserted rows
+        """
+        if not insert_data:
+            return 0
+        batches = [insert_data[i:i + batch_size] for i in range(0, len(insert_data), batch_size)]
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def write(batch):
+            async with semaphore, self.engine.begin() as conn:
+                if isinstance(batch, SegmentBatch):
+                    await copy_segment_batch(conn, self.table, batch)
+                else:
+                    await conn.execute(insert(self.table), batch)
+
+        try:
+            await asyncio.gather(*[write(batch) for batch in batches])
+        except Exception as exc:
+            logger.error(f"An error occurred during async bulk INSERT: {exc}")
+            sys.exit(-1)
+        return len(insert_data)
+
+    @timed_operation("select_columns")
+    async def select_columns(self, columns: list[str] = None, condition_dict: dict = None) -> pd.DataFrame:
+        """select columns (all by default) of the rows matching condition_dict."""
+        try:
+            stmt = self.where(select(*self.columns(columns)), condition_dict)
+            async with self.engine.connect() as conn:
+                result = await conn.execute(stmt)
+                return pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+        except Exception as exc:
+            logger.error(f"An error occurred during async SELECT: {exc}")
+            sys.exit(-1)
+
+    async def select_iter(self, columns: list[str] = None, condition_dict: dict = None, batch_size: int = 1000):
+        """
+        Streams rows with a server side cursor.
+
+        Yields:
+            pd.DataFrame: batches of at most batch_size rows. Exits on database errors.
+        """
+        try:
+            stmt = self.where(select(*self.columns(columns)), condition_dict)
+            async with self.engine.connect() as conn:
+                result = await conn.stream(stmt.execution_options(yield_per=batch_size))
+                keys = list(result.keys())
+                async for rows in result.partitions(batch_size):
+                    metrics.DB_ROWS.inc(len(rows), table=self.table.name, operation="async_select_iter")
+                    yield pd.DataFrame(rows, columns=keys)
+        except Exception as exc:
+            logger.error(f"An error occurred during async select_iter: {exc}")
+            sys.exit(-1)
+
+    @timed_operation("get_data_by_ids")
+    async def get_data_by_ids(self,
+                              id_column_name: str,
+                              ids: list,
+                              select_columns: list[str],
+                              batch_size: int = 5000,
+                              max_concurrency: int = 4,
+                              output: str = "dict"):
+        """
+        Async SQLTable.get_data_by_ids: batches of ids bound as one array parameter (= ANY(:ids)),
+        up to max_concurrency batches in flight on separate connections.
+
+        Returns:
+            dict | pd.DataFrame: {id: {column: value}} for "dict", column lists for "columns",
+                                 a DataFrame for "dataframe".
+        """
+        if output not in ("dict", "columns", "dataframe"):
+            logger.error(f"Unknown output format for get_data_by_ids: {output}")
+            sys.exit(-1)
+        if not select_columns:
+            logger.error("select_columns list cannot be empty for get_data_by_ids.")
+            sys.exit(-1)
+        columns_to_fetch = [id_column_name] + [col for col in select_columns if col != id_column_name]
+        if not ids:
+            if output == "dict":
+                return {}
+            empty = {col: [] for col in columns_to_fetch}
+            return empty if output == "columns" else pd.DataFrame(empty)
+        try:
+            id_column = getattr(self.table.c, id_column_name)
+            stmt = select(*self.columns(columns_to_fetch)).where(id_column == any_(bindparam("ids", type_=ARRAY(id_column.type))))
+            unique_ids = list(dict.fromkeys(ids))
+            semaphore = asyncio.Semaphore(max_concurrency)
+
+            async def fetch(batch):
+                async with semaphore, self.engine.connect() as conn:
+                    return (await conn.execute(stmt, {"ids": batch})).fetchall()
+
+            row_batches = await asyncio.gather(*[fetch(unique_ids[i:i + batch_size]) for i in range(0, len(unique_ids), batch_size)])
+        except Exception as exc:
+            logger.error(f"An error occurred during async get_data_by_ids: {exc}")
+            sys.exit(-1)
+
+        rows = [row for batch_rows in row_batches for row in batch_rows]
+        if output == "dict":
+            return {row[0]: dict(zip(columns_to_fetch, row)) for row in rows} if id_column_name in select_columns \
+                else {row[0]: dict(zip(columns_to_fetch[1:], row[1:])) for row in rows}
+        columns = dict(zip(columns_to_fetch, (list(values) for values in zip(*rows)))) if rows \
+            else {col: [] for col in columns_to_fetch}
+        return columns if output == "columns" else pd.DataFrame(columns)
+
+    @timed_operation("bulk_update")
+    async def bulk_update(self, condition_columns: list, update_array: list[dict], batch_size: int = 5000) -> int:
+        """update many rows with executemany batches in one transaction (see SQLTable.bulk_update).
+
+        Returns:
+            int: returns 0 if successful
+        """
+        if not update_array:
+            return 0
+        try:
+            value_columns = [col for col in update_array[0] if col not in condition_columns]
+            stmt = (
+                update(self.table)
+                .where(and_(*[getattr(self.table.c, col) == bindparam(f"b_{col}") for col in condition_columns]))
+                .values({col: bindparam(f"b_{col}") for col in value_columns})
+            )
+            params = [{f"b_{col}": value for col, value in row.items()} for row in update_array]
+            async with self.engine.begin() as conn:
+                for i in range(0, len(params), batch_size):
+                    await conn.execute(stmt, params[i:i + batch_size])
+        except Exception as exc:
+            logger.error(f"An error occurred during async bulk UPDATE: {exc}")
+            sys.exit(-1)
+        return 0
+
+
+class AsyncSQLDatabaseManager:
+    """asyncio database manager over the tables of definitions.py (postgres + asyncpg).
+    """
+    def __init__(self, database_config: dict, pool_size: int = 10) -> None:
+        try:
+            conn_url = 'postgresql+asyncpg://{}:{}@{}:{}/{}'.format(
+                database_config['user'],
+                database_config['password'],
+                database_config['host'],
+                database_config['port'],
+                database_config['database']
+            )
+            self.engine = create_async_engine(conn_url, echo=False, pool_size=pool_size)
+        except Exception as exc:
+            logger.error("Exception occurred while creating async SQL engine. Error: {}".format(exc))
+            sys.exit(-1)
+        self.annotation_table = AsyncSQLTable(self.engine, AnnotationTable.__table__)
+        self.segmentation_table = AsyncSQLTable(self.engine, SegmentationTable.__table__)
+        self.segment_embedding_table = AsyncSQLTable(self.engine, SegmentEmbeddingTable.__table__)
+        self.passage_state_table = AsyncSQLTable(self.engine, PassageStateTable.__table__)
+
+    async def replace_passage_segments(self, passage_ids: list, segments, states: list[dict]) -> int:
+        """Async SQLDatabaseManager.replace_passage_segments (one transaction)."""
+        if not passage_ids:
+            return 0
+        segmentation = SegmentationTable.__table__
+        embedding = SegmentEmbeddingTable.__table__
+        state = PassageStateTable.__table__
+        ids_param = bindparam("ids", type_=ARRAY(segmentation.c.passage_id.type))
+        try:
+            async with self.engine.begin() as conn:
+                await conn.execute(delete(embedding).where(embedding.c.passage_id == any_(ids_param)), {"ids": list(passage_ids)})
+                await conn.execute(delete(segmentation).where(segmentation.c.passage_id == any_(ids_param)), {"ids": list(passage_ids)})
+                if isinstance(segments, SegmentBatch):
+                    await copy_segment_batch(conn, segmentation, segments)
+                elif segments:
+                    await conn.execute(insert(segmentation), segments)
+                if states:
+                    stmt = pg_insert(state).values(states)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[state.c.passage_id],
+                        set_={col: getattr(stmt.excluded, col) for col in ("source_hash", "source_updated_at", "segmented_at")})
+                    await conn.execute(stmt)
+        except Exception as exc:
+            logger.error(f"An error occurred while replacing passage segments: {exc}")
+            sys.exit(-1)
+        return 0
+
+    async def dispose(self) -> None:
+        await self.engine.dispose()
@@ -1,12 +1,21 @@
 import sys
 import pandas as pd
-from sqlalchemy import select, insert, delete, update, Column, Integer, String, Float, LargeBinary, DateTime, Boolean, PrimaryKeyConstraint, ForeignKeyConstraint
+from sqlalchemy import select, insert, delete, update, Column, Integer, String, Float, LargeBinary, DateTime, Boolean, PrimaryKeyConstraint, ForeignKeyConstraint, Index
+from sqlalchemy import text as sql_text  # the text columns below shadow text() inside class bodies
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, bindparam, any_, func, tuple_
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from typing import Optional
+import inspect
+import time
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.dialects.postgresql import ARRAY  # Added for list type support in PostgreSQL
 
 from loguru import logger
+from agentchunking import metrics
+from agentchunking import tracing
+from agentchunking.segmentBatch import SegmentBatch, COLUMNS as SEGMENT_COLUMNS
 
 
 class Base(DeclarativeBase):
@@ -57,9 +66,10 @@ class AnnotationTable(Base):
     site_name_english = Column(Boolean, nullable=True)
     text_data_score = Column(Float, nullable=True)
 
-    # Define composite primary key
+    # Define composite primary key; the url-led key does not serve lookups by annotation_data_id
     __table_args__ = (
         PrimaryKeyConstraint('url', 'annotation_data_id'),
+        Index('ix_annotation_table_annotation_data_id', 'annotation_data_id'),
     )
 
     def __repr__(self) -> str:
@@ -85,10 +95,13 @@ class SegmentationTable(Base):
     end =Column(Integer,nullable=False)
     text= Column(String, nullable=False)  # Assuming text content is mandatory
     data= Column(String,nullable=False)
+    updated_at = Column(DateTime, nullable=False, server_default=func.now())  # bumped by a trigger on every UPDATE, export watermark
     
-    # Define composite primary key
+    # Define composite primary key, plus a partial index over segments still waiting for the rewriter
     __table_args__ = (
         PrimaryKeyConstraint('passage_id',"start","end"),
+        Index('ix_segmentation_table_pending_rewrite', 'passage_id', 'start', 'end', postgresql_where=sql_text("data = ''")),
+        Index('ix_segmentation_table_updated_at', 'updated_at'),
     )
 
     def __repr__(self) -> str:
@@ -98,6 +111,110 @@ class SegmentationTable(Base):
         )
 
 
+class SegmentEmbeddingTable(Base):
+    """
+    Float16 embedding of a segment, keyed like segmentation_table.
+    The vector is stored as raw little-endian float16 bytes of length 2 * dim.
+    """
+    __tablename__ = "segment_embedding_table"
+
+    passage_id = Column(String, nullable=False)
+    start = Column(Integer, nullable=False)
+    end = Column(Integer, nullable=False)
+    model = Column(String, nullable=False)
+    dim = Column(Integer, nullable=False)
+    embedding = Column(LargeBinary, nullable=False)
+    embedded_at = Column(DateTime, nullable=False, server_default=func.now())  # vector store sync watermark
+
+    # Define composite primary key
+    __table_args__ = (
+        PrimaryKeyConstraint('passage_id', "start", "end"),
+        Index('ix_segment_embedding_table_embedded_at', 'embedded_at'),
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"passage_id={self.passage_id!r}, start={self.start!r}, end={self.end!r}, "
+            f"model={self.model!r}, dim={self.dim!r}, embedded_at={self.embedded_at!r}"
+        )
+
+
+class PassageStateTable(Base):
+    """
+    Source fingerprint of every segmented passage, used to detect edited annotation rows.
+    source_hash is the sha1 of the passage text the segments were built from, span_hashes the sha1 of the
+    words behind every segment (json [[start, end, sha1], ...]) so unchanged spans of an edit are reused.
+    """
+    __tablename__ = "passage_state_table"
+
+    passage_id = Column(String, primary_key=True)
+    source_hash = Column(String, nullable=False)
+    source_updated_at = Column(DateTime, nullable=True)  # annotation_table.updated_at at segmentation time
+    segmented_at = Column(DateTime, nullable=False)
+    span_hashes = Column(String, nullable=False, server_default="")  # empty: spans unknown, nothing is reused
+
+    def __repr__(self) -> str:
+        return (
+            f"passage_id={self.passage_id!r}, source_hash={self.source_hash!r}, "
+            f"source_updated_at={self.source_updated_at!r}, segmented_at={self.segmented_at!r}"
+        )
+
+
+def result_rows(result) -> Optional[int]:
+    """Rows in a read result: a DataFrame, an {id: row} dict, a {column: values} dict or a list of rows."""
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    if isinstance(result, dict):
+        first = next(iter(result.values()), None)
+        return len(first) if isinstance(first, list) else len(result)
+    if isinstance(result, (list, SegmentBatch)):
+        return len(result)
+    return None
+
+
+def timed_operation(operation: str):
+    """Record statement time and row count of a SQLTable method in the metrics registry (and a db span).
+    Reads count the rows of their result, writes (which return a status) the rows they were given."""
+    def decorator(method):
+        signature = inspect.signature(method)
+        written_argument = next((name for name in ("insert_data", "update_array") if name in signature.parameters), None)
+
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            with tracing.span(f"db.{operation}", table=self.table.name):
+                result = method(self, *args, **kwargs)
+            metrics.DB_QUERY_SECONDS.observe(time.perf_counter() - start, table=self.table.name, operation=operation)
+            rows = result_rows(result)
+            if rows is None and written_argument is not None:
+                written = signature.bind(self, *args, **kwargs).arguments.get(written_argument)
+                rows = len(written) if isinstance(written, (list, SegmentBatch)) else None
+            if rows is not None:
+                metrics.DB_ROWS.inc(rows, table=self.table.name, operation=operation)
+            return result
+        return wrapper
+    return decorator
+
+
+def insert_segment_batch(conn, table, batch: SegmentBatch, page_size: int = 1000) -> None:
+    """Insert a SegmentBatch inside the open transaction of conn without building a dict per row:
+    psycopg2 execute_values (multi-row VALUES pages) on postgres, executemany on other dialects."""
+    if not len(batch):
+        return
+    if conn.dialect.driver == "psycopg2":
+        from psycopg2.extras import execute_values
+        preparer = conn.dialect.identifier_preparer
+        statement = "INSERT INTO {} ({}) VALUES %s".format(preparer.format_table(table),
+                                                           ", ".join(preparer.quote(col) for col in SEGMENT_COLUMNS))
+        cursor = conn.connection.cursor()
+        try:
+            execute_values(cursor, statement, batch.rows(), page_size=page_size)
+        finally:
+            cursor.close()
+    else:
+        conn.execute(insert(table), batch.to_records())
+
+
 class SQLTable:
     """SQL table class to handle manipulating data to SQL Database. 
     """
@@ -123,11 +240,13 @@ class SQLTable:
         pass
 
 
+    @timed_operation("insert")
     def insert(self, insert_data: list[dict]) -> int:
         """insert new data to the SQL table with insert_data
 
         Args:
-            insert_data (list of dict): list of dictionary of column and data pair to be inserted
+            insert_data (list of dict | SegmentBatch): list of dictionary of column and data pair to be inserted,
+                                                       or a SegmentBatch for segmentation_table
 
         
         Returns:
@@ -140,10 +259,13 @@ class SQLTable:
         
         try:
             with self.engine.connect() as conn:
-                _ = conn.execute(
-                    insert(self.table),
-                    insert_data,
-                )
+                if isinstance(insert_data, SegmentBatch):
+                    insert_segment_batch(conn, self.table, insert_data)
+                else:
+                    _ = conn.execute(
+                        insert(self.table),
+                        insert_data,
+                    )
                 conn.commit()
         except Exception as exc:
             logger.error(f"An error occurred during INSERT: {exc}")
@@ -155,6 +277,7 @@ class SQLTable:
     
     
         
+    @timed_operation("select")
     def select(self, condition_dict: dict = None, range_condition_dict: dict = None) -> pd.DataFrame:
         """select rows of data from the database
 
@@ -203,6 +326,7 @@ class SQLTable:
         return df
 
     
+    @timed_operation("multi_select")
     def multi_select(self, condition_list: list = None, range_condition_list: list = None) -> pd.DataFrame:
         """Select rows from the database based on multiple condition sets.
 
@@ -246,6 +370,7 @@ class SQLTable:
         return df
 
 
+    @timed_operation("update")
     def update(self, condition_columns: list, update_array: list[dict] = None) -> int:
         """update a row of a SQL table.
         Args:
@@ -280,6 +405,38 @@ class SQLTable:
             
         return 0
 
+    @timed_operation("bulk_update")
+    def bulk_update(self, condition_columns: list, update_array: list[dict]) -> int:
+        """update many rows with a single executemany in one transaction.
+        Every dictionary must contain the same keys.
+
+        Args:
+            condition_columns (list): list of column names that identify the row to update (usually the primary key)
+            update_array (list of dict): list of dictionary of column and data pair, including the condition columns
+
+        Returns:
+            int: returns 0 if successful
+        """
+        if not update_array:
+            return 0
+        try:
+            value_columns = [col for col in update_array[0] if col not in condition_columns]
+            # bind parameter names must not clash with column names in UPDATE ... SET
+            stmt = (
+                update(self.table)
+                .where(and_(*[getattr(self.table.c, col) == bindparam(f"b_{col}") for col in condition_columns]))
+                .values({col: bindparam(f"b_{col}") for col in value_columns})
+            )
+            params = [{f"b_{col}": val for col, val in value.items()} for value in update_array]
+            with self.engine.begin() as conn:
+                conn.execute(stmt, params)
+        except Exception as exc:
+            logger.error(f"An error occurred during BULK UPDATE: {exc}")
+            sys.exit(-1)
+
+        return 0
+
+    @timed_operation("upsert")
     def upsert(self, insert_data: list[dict], update_columns: list[str]) -> int:
         """
         Insert new rows or update an existing row's single column if conflict occurs.
@@ -400,6 +557,7 @@ class SQLTable:
         finally:
             conn.close()
 
+    @timed_operation("delete")
     def delete(self, condition_dict: dict = None) -> int:
         """delete rows depending on condition_dict from the SQL table
 
@@ -450,6 +608,7 @@ class SQLTable:
     
     # --- New methods ---
 
+    @timed_operation("select_columns")
     def select_columns(self, columns: list[str], condition_dict: dict = None, range_condition_dict: dict = None) -> pd.DataFrame:
         """
         Selects specified columns from the table, with optional filtering.
@@ -506,29 +665,145 @@ class SQLTable:
         return df
 
 
-    def get_data_by_ids(self, id_column_name: str, ids: list, select_columns: list[str]) -> dict:
+    def explain(self, stmt, params: dict = None, disable_seqscan: bool = True) -> list[str]:
+        """
+        Returns the PostgreSQL query plan of a statement built on this table.
+
+        Args:
+            stmt: SQLAlchemy statement.
+            params (dict, optional): bound parameters of the statement.
+            disable_seqscan (bool): discourage sequential scans so the plan shows whether an index is usable
+                                    even on small tables where a scan would be cheaper.
+
+        Returns:
+            list[str]: plan lines.
+        """
+        compiled = stmt.compile(self.engine)
+        try:
+            with self.engine.begin() as conn:
+                if disable_seqscan:
+                    conn.execute(sql_text("SET LOCAL enable_seqscan = off"))
+                result = conn.exec_driver_sql(f"EXPLAIN {compiled}", compiled.construct_params(params or {}))
+                return [row[0] for row in result]
+        except Exception as exc:
+            logger.error(f"An error occurred during EXPLAIN: {exc}")
+            sys.exit(-1)
+
+    def select_iter(self, columns: list[str] = None, condition_dict: dict = None, batch_size: int = 1000):
+        """
+        Streams rows with a server side cursor instead of loading the whole table.
+
+        Args:
+            columns (list[str], optional): column names to select. Defaults to all columns.
+            condition_dict (dict, optional): Equality conditions. Defaults to None.
+            batch_size (int): number of rows per yielded DataFrame.
+
+        Yields:
+            pd.DataFrame: batches of at most batch_size rows. Exits on database errors.
+        """
+        try:
+            if columns:
+                for col_name in columns:
+                    if not hasattr(self.table.c, col_name):
+                        raise AttributeError(f"Column '{col_name}' not found in table '{self.table.name}'.")
+                stmt = select(*[getattr(self.table.c, col_name) for col_name in columns])
+            else:
+                stmt = select(self.table)
+            if condition_dict:
+                stmt = stmt.where(and_(*[getattr(self.table.c, col) == val for col, val in condition_dict.items()]))
+
+            with self.engine.connect() as conn:
+                result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(stmt)
+                keys = list(result.keys())
+                fetch_start = time.perf_counter()
+                for rows in result.partitions(batch_size):
+                    metrics.DB_QUERY_SECONDS.observe(time.perf_counter() - fetch_start, table=self.table.name, operation="select_iter")
+                    metrics.DB_ROWS.inc(len(rows), table=self.table.name, operation="select_iter")
+                    yield pd.DataFrame(rows, columns=keys)
+                    fetch_start = time.perf_counter()
+        except AttributeError as ae:
+            logger.error(f"Configuration error in select_iter: {ae}")
+            sys.exit(-1)
+        except Exception as exc:
+            logger.error(f"An error occurred during select_iter: {exc}")
+            sys.exit(-1)
+
+
+    @timed_operation("select_by_keys")
+    def select_by_keys(self, key_columns: list[str], keys: list[tuple], columns: list[str] = None) -> pd.DataFrame:
+        """
+        Selects the rows of composite keys (e.g. passage_id, start, end of segments) with one tuple IN query.
+
+        Args:
+            key_columns (list[str]): columns forming the key.
+            keys (list[tuple]): key values, in the order of key_columns.
+            columns (list[str], optional): column names to select. Defaults to all columns.
+
+        Returns:
+            pd.DataFrame: matching rows, keys without a row are left out. Exits on errors.
+        """
+        try:
+            for col_name in key_columns + (columns or []):
+                if not hasattr(self.table.c, col_name):
+                    raise AttributeError(f"Column '{col_name}' not found in table '{self.table.name}'.")
+            stmt = select(*[getattr(self.table.c, col_name) for col_name in columns]) if columns else select(self.table)
+            if not keys:
+                stmt = stmt.where(sql_text("1 = 0"))
+            else:
+                key_tuple = tuple_(*[getattr(self.table.c, col_name) for col_name in key_columns])
+                stmt = stmt.where(key_tuple.in_(list(dict.fromkeys(tuple(key) for key in keys))))
+            with self.engine.connect() as conn:
+                return pd.read_sql(stmt, conn)
+        except AttributeError as ae:
+            logger.error(f"Configuration error in select_by_keys: {ae}")
+            sys.exit(-1)
+        except Exception as exc:
+            logger.error(f"An error occurred during select_by_keys: {exc}")
+            sys.exit(-1)
+
+    @timed_operation("get_data_by_ids")
+    def get_data_by_ids(self,
+                        id_column_name: str,
+                        ids: list,
+                        select_columns: list[str],
+                        batch_size: int = 5000,
+                        max_workers: int = 1,
+                        output: str = "dict"):
         """
         Queries information by a list of IDs for a specific ID column and returns selected column values.
+        IDs are looked up in batches of batch_size with one bound array parameter (= ANY(:ids)) per batch,
+        so the statement text and its plan do not grow with the number of IDs.
 
         Args:
             id_column_name (str): The name of the ID column to filter on (e.g., "annotation_data_id").
             ids (list): A list of ID values to query.
             select_columns (list[str]): A list of column names to retrieve for each ID.
+            batch_size (int, optional): IDs per query. Defaults to 5000.
+            max_workers (int, optional): batches queried concurrently on pooled connections. Defaults to 1.
+            output (str, optional): "dict" (nested dict per ID), "columns" (dict of column lists, including
+                                    the ID column) or "dataframe". Defaults to "dict".
 
         Returns:
-            dict: A dictionary where keys are the IDs and values are dictionaries
+            dict | pd.DataFrame: For "dict", a dictionary where keys are the IDs and values are dictionaries
                   containing the selected column data.
                   Example: {"id1":{"url":"url_val1","text":"text_val1"}, ...}
-                  Returns an empty dictionary if no IDs are provided. Exits on errors.
+                  "columns" and "dataframe" skip the per row dictionaries.
+                  Returns an empty result if no IDs are provided. Exits on errors.
         """
-        if not ids:
-            logger.info("No IDs provided to get_data_by_ids, returning empty dictionary.")
-            return {}
+        if output not in ("dict", "columns", "dataframe"):
+            logger.error(f"Unknown output format for get_data_by_ids: {output}")
+            sys.exit(-1)
         if not select_columns:
             logger.error("select_columns list cannot be empty for get_data_by_ids.")
             sys.exit(-1)
+        columns_to_fetch_db_names = [id_column_name] + [col for col in select_columns if col != id_column_name]
+        if not ids:
+            logger.info("No IDs provided to get_data_by_ids, returning empty result.")
+            if output == "dict":
+                return {}
+            empty = {col: [] for col in columns_to_fetch_db_names}
+            return empty if output == "columns" else pd.DataFrame(empty)
 
-        output_dict = {}
         try:
             # Validate id_column_name
             if not hasattr(self.table.c, id_column_name):
@@ -539,25 +814,40 @@ class SQLTable:
                 if not hasattr(self.table.c, col_name):
                     raise AttributeError(f"Selected column '{col_name}' not found in table '{self.table.name}'.")
 
-            columns_to_fetch_db_names = list(set([id_column_name] + select_columns))
+            id_column = getattr(self.table.c, id_column_name)
             column_objects_to_fetch = [getattr(self.table.c, col) for col in columns_to_fetch_db_names]
+            if self.engine.dialect.name == "postgresql":
+                condition = id_column == any_(bindparam("ids", type_=ARRAY(id_column.type)))
+            else:
+                condition = id_column.in_(bindparam("ids", expanding=True))
+            stmt = select(*column_objects_to_fetch).where(condition)
 
-            stmt = select(*column_objects_to_fetch).where(getattr(self.table.c, id_column_name).in_(ids))
-            
-            with self.engine.connect() as conn: # 'conn' here is local to 'with' block
-                result_proxy = conn.execute(stmt)
-                actual_fetched_column_names = list(result_proxy.keys())
-
-                for row_tuple in result_proxy:
-                    row_data_dict = {name: value for name, value in zip(actual_fetched_column_names, row_tuple)}
-                    current_id = row_data_dict[id_column_name]
-                    data_for_id = {col: row_data_dict[col] for col in select_columns}
-                    output_dict[current_id] = data_for_id
+            unique_ids = list(dict.fromkeys(ids))
+            batches = [unique_ids[i:i + batch_size] for i in range(0, len(unique_ids), batch_size)]
+
+            def fetch(batch):
+                with self.engine.connect() as conn: # one pooled connection per batch
+                    return conn.execute(stmt, {"ids": batch}).fetchall()
+
+            if max_workers > 1 and len(batches) > 1:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    row_batches = list(executor.map(fetch, batches))
+            else:
+                row_batches = [fetch(batch) for batch in batches]
         except AttributeError as ae:
             logger.error(f"Configuration error in get_data_by_ids: {ae}")
             sys.exit(-1)
         except Exception as exc:
             logger.error(f"An error occurred during get_data_by_ids: {exc}")
             sys.exit(-1)
-        
-        return output_dict
\ No newline at end of file
+
+        rows = [row for batch_rows in row_batches for row in batch_rows]
+        if output == "dict":
+            output_dict = {}
+            for row_tuple in rows:
+                row_data_dict = dict(zip(columns_to_fetch_db_names, row_tuple))
+                output_dict[row_tuple[0]] = {col: row_data_dict[col] for col in select_columns}
+            return output_dict
+        columns = dict(zip(columns_to_fetch_db_names, (list(values) for values in zip(*rows)))) if rows \
+            else {col: [] for col in columns_to_fetch_db_names}
+        return columns if output == "columns" else pd.DataFrame(columns)
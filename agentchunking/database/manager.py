@@ -4,10 +4,20 @@ from loguru import logger
 import sys
 import psycopg2
 from psycopg2 import sql
-from sqlalchemy import create_engine, inspect
+from sqlalchemy import create_engine, inspect, select, insert, delete, bindparam, any_, case, func, union
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 from psycopg2.extensions import register_adapter, AsIs
-from agentchunking.database.definitions import (Base,SQLTable,AnnotationTable,SegmentationTable)
+from agentchunking.database.definitions import (Base,SQLTable,AnnotationTable,SegmentationTable,SegmentEmbeddingTable,PassageStateTable,
+                                                insert_segment_batch)
+from agentchunking.segmentBatch import SegmentBatch
+from agentchunking.database.migrations import run_migrations
+from agentchunking.constants import STORE_SYNC_WATERMARK_LAG
+from agentchunking import tracing
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+import pandas as pd
 """ psycopg2 throws datatype error into postgres DB.
 Following block of code can solve this issue.
 Source: https://stackoverflow.com/a/56390591
@@ -26,13 +36,16 @@ register_adapter(np.int64, addapt_numpy_int64)
 class SQLDatabaseManager:
     """SQL database manager. It will save tracklet informations in SQL DB
     """
-    def __init__(self, database_config: dict,create_db :bool=False) -> None:
+    def __init__(self, database_config: dict,create_db :bool=False,migrate :bool=True) -> None:
         """create all the SQL tables with appropriate column names.
         Args:
                 database_config (dict): config dictionary containing information about databases
+                create_db (bool): create all tables from the definitions
+                migrate (bool): apply pending schema migrations (indexes, new tables)
                 
         """
         self.create_db = create_db
+        self.migrate = migrate
         self.config = database_config
         self.create_engine(database_config)
         self.declare_tables()
@@ -153,10 +166,170 @@ class SQLDatabaseManager:
                 Base.metadata.create_all(self.engine)
             self.annotation_table = SQLTable(self.engine, AnnotationTable.__table__)
             self.segmentation_table= SQLTable(self.engine, SegmentationTable.__table__)
+            if self.migrate:
+                applied = run_migrations(self.engine)
+                if applied:
+                    logger.info(f"Applied schema migrations: {applied}")
+            self.segment_embedding_table = SQLTable(self.engine, SegmentEmbeddingTable.__table__)
+            self.passage_state_table = SQLTable(self.engine, PassageStateTable.__table__)
         except Exception as exc:
             logger.error('Exception occured while table defining. Error: {}'.format(exc))
             sys.exit(-1)
         
+    def replace_passage_segments(self, passage_ids: list, segments, states: list[dict]) -> int:
+        """
+        Atomically replace the segments of passages: stale segments and their embeddings are deleted,
+        the new segments inserted and the passage states upserted in one transaction.
+
+        Args:
+            passage_ids (list): passages whose segments are replaced (new passages simply have none).
+            segments (SegmentBatch | list[dict]): new segmentation_table rows for these passages.
+            states (list[dict]): passage_state_table rows (passage_id, source_hash, source_updated_at, segmented_at, span_hashes).
+
+        Returns:
+            int: Returns 0 if successful, exits on errors.
+        """
+        if not passage_ids:
+            return 0
+        segmentation = SegmentationTable.__table__
+        embedding = SegmentEmbeddingTable.__table__
+        state = PassageStateTable.__table__
+        ids_param = bindparam("ids", type_=ARRAY(segmentation.c.passage_id.type))
+        try:
+            with tracing.span("db.replace_passage_segments", passages=len(passage_ids), segments=len(segments)), \
+                 self.engine.begin() as conn:
+                conn.execute(delete(embedding).where(embedding.c.passage_id == any_(ids_param)), {"ids": list(passage_ids)})
+                conn.execute(delete(segmentation).where(segmentation.c.passage_id == any_(ids_param)), {"ids": list(passage_ids)})
+                if isinstance(segments, SegmentBatch):
+                    insert_segment_batch(conn, segmentation, segments)
+                elif segments:
+                    conn.execute(insert(segmentation), segments)
+                if states:
+                    stmt = pg_insert(state).values(states)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[state.c.passage_id],
+                        set_={col: getattr(stmt.excluded, col) for col in ("source_hash", "source_updated_at", "segmented_at", "span_hashes")})
+                    conn.execute(stmt)
+        except Exception as exc:
+            logger.error(f"An error occurred while replacing passage segments: {exc}")
+            sys.exit(-1)
+        logger.info(f"Replaced segments of {len(passage_ids)} passages with {len(segments)} segments.")
+        return 0
+
+    def sync_watermark(self, lag: int = STORE_SYNC_WATERMARK_LAG) -> datetime:
+        """
+        Database clock minus lag seconds. Index and store syncs read rows stamped up to it, younger rows
+        (possibly from transactions that are still open) wait for the next sync.
+
+        Returns:
+            datetime: the new watermark, exits on errors.
+        """
+        try:
+            with self.engine.connect() as conn:
+                return conn.execute(select(func.localtimestamp())).scalar() - timedelta(seconds=lag)
+        except Exception as exc:
+            logger.error(f"An error occurred while reading the database clock: {exc}")
+            sys.exit(-1)
+
+    def changed_passage_segments(self, low: Optional[datetime], high: datetime, batch_size: int = 10000) -> Iterator[pd.DataFrame]:
+        """
+        Streams the keys of every segment of the passages with a segment updated in (low, high].
+        text is only selected for segments updated after low; the keys of the others tell which
+        indexed segments of a changed passage still exist.
+
+        Args:
+            low (datetime | None): previous watermark, None selects every passage.
+            high (datetime): new watermark.
+            batch_size (int): rows per yielded DataFrame.
+
+        Yields:
+            pd.DataFrame: passage_id, start, end, text (None for segments unchanged since low). Exits on errors.
+        """
+        segmentation = SegmentationTable.__table__
+        if low is None:
+            stmt = select(segmentation.c.passage_id, segmentation.c.start, segmentation.c.end, segmentation.c.text)
+        else:
+            changed = (select(segmentation.c.passage_id)
+                       .where(segmentation.c.updated_at > low, segmentation.c.updated_at <= high)
+                       .distinct().subquery())
+            stmt = (select(segmentation.c.passage_id, segmentation.c.start, segmentation.c.end,
+                           case((segmentation.c.updated_at > low, segmentation.c.text)).label("text"))
+                    .join(changed, changed.c.passage_id == segmentation.c.passage_id))
+        try:
+            with self.engine.connect() as conn:
+                result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(stmt)
+                keys = list(result.keys())
+                for rows in result.partitions(batch_size):
+                    yield pd.DataFrame(rows, columns=keys)
+        except Exception as exc:
+            logger.error(f"An error occurred while reading changed segments: {exc}")
+            sys.exit(-1)
+
+    def changed_passage_embeddings(self, low: Optional[datetime], high: datetime, batch_size: int = 4096) -> Iterator[pd.DataFrame]:
+        """
+        Streams the embedding keys of every passage with a segment updated or embedded in (low, high].
+        embedding is only selected for rows embedded after low. A passage without embeddings left
+        (re-segmented, not embedded again yet) comes back as one row with NULL start/end.
+
+        Args:
+            low (datetime | None): previous watermark, None selects every embedding.
+            high (datetime): new watermark.
+            batch_size (int): rows per yielded DataFrame.
+
+        Yields:
+            pd.DataFrame: passage_id, start, end, embedding (None for rows embedded before low). Exits on errors.
+        """
+        segmentation = SegmentationTable.__table__
+        embedding = SegmentEmbeddingTable.__table__
+        if low is None:
+            stmt = select(embedding.c.passage_id, embedding.c.start, embedding.c.end, embedding.c.embedding)
+        else:
+            changed = union(
+                select(segmentation.c.passage_id).where(segmentation.c.updated_at > low, segmentation.c.updated_at <= high),
+                select(embedding.c.passage_id).where(embedding.c.embedded_at > low, embedding.c.embedded_at <= high),
+            ).subquery()
+            stmt = (select(changed.c.passage_id, embedding.c.start, embedding.c.end,
+                           case((embedding.c.embedded_at > low, embedding.c.embedding)).label("embedding"))
+                    .select_from(changed.outerjoin(embedding, embedding.c.passage_id == changed.c.passage_id)))
+        try:
+            with self.engine.connect() as conn:
+                result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(stmt)
+                keys = list(result.keys())
+                for rows in result.partitions(batch_size):
+                    yield pd.DataFrame(rows, columns=keys)
+        except Exception as exc:
+            logger.error(f"An error occurred while reading changed embeddings: {exc}")
+            sys.exit(-1)
+
+    def check_query_plans(self) -> dict:
+        """
+        EXPLAIN the hot lookups and check that each one is served by an index.
+
+        Returns:
+            dict: query name -> True if the plan uses an index. Plans are logged.
+        """
+        annotation = AnnotationTable.__table__
+        segmentation = SegmentationTable.__table__
+        queries = {
+            "annotation by annotation_data_id": (
+                select(annotation.c.site_name, annotation.c.passage_heading)
+                .where(annotation.c.annotation_data_id == any_(bindparam("ids", type_=ARRAY(annotation.c.annotation_data_id.type)))),
+                {"ids": ["probe"]}, self.annotation_table),
+            "segments by passage_id": (
+                select(segmentation.c.start, segmentation.c.end).where(segmentation.c.passage_id == bindparam("pid")),
+                {"pid": "probe"}, self.segmentation_table),
+            "segments pending rewrite": (
+                select(segmentation.c.passage_id, segmentation.c.start, segmentation.c.end).where(segmentation.c.data == ''),
+                {}, self.segmentation_table),
+        }
+        report = {}
+        for name, (stmt, params, table) in queries.items():
+            plan = table.explain(stmt, params)
+            report[name] = any("Index" in line for line in plan)
+            log = logger.info if report[name] else logger.warning
+            log(f"Plan for {name} ({'index' if report[name] else 'NO INDEX'}):\n" + "\n".join(plan))
+        return report
+
     def annotation_table_insert(self, insert_data: list[dict]) -> int:
         """
         Insert data into the annotation_table.
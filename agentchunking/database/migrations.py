@@ -0,0 +1,106 @@
+from sqlalchemy import text
+from loguru import logger
+from agentchunking.database.definitions import SegmentEmbeddingTable, PassageStateTable
+
+"""Versioned schema migrations. Every step is idempotent (IF NOT EXISTS / checkfirst), so re-running
+a partially applied migration is safe; applied versions are recorded in schema_migrations.
+Index steps run with CREATE INDEX CONCURRENTLY outside a transaction so writers are not blocked.
+"""
+
+# arbitrary constant for pg_advisory_lock, serializes concurrent migrators
+MIGRATION_LOCK_ID = 720_431_001
+
+
+def create_segment_embedding_table(conn):
+    SegmentEmbeddingTable.__table__.create(conn, checkfirst=True)
+
+
+def create_passage_state_table(conn):
+    PassageStateTable.__table__.create(conn, checkfirst=True)
+
+
+# (version, description, steps); a step is a SQL string run in autocommit mode or a callable(conn)
+MIGRATIONS = [
+    (1, "index annotation_table.annotation_data_id for loader and get_data_by_ids lookups",
+     ["CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_annotation_table_annotation_data_id "
+      "ON annotation_table (annotation_data_id)"]),
+    # lookups by passage_id alone already use the (passage_id, start, end) primary key
+    (2, "partial index on segments still waiting for the rewriter",
+     ["CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_segmentation_table_pending_rewrite "
+      "ON segmentation_table (passage_id, start, \"end\") WHERE data = ''"]),
+    (3, "segment_embedding_table", [create_segment_embedding_table]),
+    (4, "passage_state_table for change detection", [create_passage_state_table]),
+    # adding a column with a stable default does not rewrite the table (postgres >= 11)
+    (5, "segmentation_table.updated_at, touched on every update, as the export watermark",
+     ["ALTER TABLE segmentation_table ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT now()",
+      "CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger AS $$ "
+      "BEGIN NEW.updated_at = now(); RETURN NEW; END; $$ LANGUAGE plpgsql",
+      "DROP TRIGGER IF EXISTS trg_segmentation_table_updated_at ON segmentation_table",
+      "CREATE TRIGGER trg_segmentation_table_updated_at BEFORE UPDATE ON segmentation_table "
+      "FOR EACH ROW EXECUTE FUNCTION touch_updated_at()",
+      "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_segmentation_table_updated_at ON segmentation_table (updated_at)"]),
+    # a re-embedded segment keeps its key, the vector store sync finds it by embedded_at
+    (6, "segment_embedding_table.embedded_at as the vector store sync watermark",
+     ["ALTER TABLE segment_embedding_table ADD COLUMN IF NOT EXISTS embedded_at TIMESTAMP NOT NULL DEFAULT now()",
+      "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_segment_embedding_table_embedded_at ON segment_embedding_table (embedded_at)"]),
+    # passages segmented before have no span hashes, their next edit is segmented from scratch
+    (7, "passage_state_table.span_hashes to reuse unchanged segments of edited passages",
+     ["ALTER TABLE passage_state_table ADD COLUMN IF NOT EXISTS span_hashes VARCHAR NOT NULL DEFAULT ''"]),
+]
+
+
+def ensure_migration_table(engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, "
+            "description VARCHAR NOT NULL, "
+            "applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        ))
+
+
+def applied_versions(engine) -> set:
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def run_migrations(engine, migrations: list = MIGRATIONS) -> list:
+    """
+    Apply every migration that is not recorded in schema_migrations yet.
+
+    Args:
+        engine: sql engine
+        migrations (list): (version, description, steps) tuples ordered by version.
+
+    Returns:
+        list: versions applied by this call.
+    """
+    ensure_migration_table(engine)
+    pending = [m for m in migrations if m[0] not in applied_versions(engine)]
+    if not pending:
+        return []
+
+    applied = []
+    # advisory locks are postgres only, other engines (sqlite in the tests) have a single migrator
+    locking = engine.dialect.name == "postgresql"
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if locking:
+            conn.execute(text("SELECT pg_advisory_lock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+        try:
+            done = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+            for version, description, steps in pending:
+                if version in done:
+                    continue  # applied by a concurrent migrator while we waited for the lock
+                logger.info(f"Applying schema migration {version}: {description}")
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(text(step))
+                conn.execute(text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+                             {"version": version, "description": description})
+                applied.append(version)
+        finally:
+            if locking:
+                conn.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+    return applied
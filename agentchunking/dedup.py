@@ -0,0 +1,159 @@
+import zlib
+from difflib import SequenceMatcher
+from typing import Callable, List, Optional
+import numpy as np
+import pandas as pd
+from loguru import logger
+from agentchunking.segmentBatch import SegmentBatch
+from agentchunking.constants import (DEDUP_NUM_PERM,
+                                     DEDUP_BANDS,
+                                     DEDUP_SHINGLE_SIZE,
+                                     DEDUP_JACCARD_THRESHOLD,
+                                     ABSOLUTE_MAX_TOKEN_LIMIT)
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+class MinHasher:
+    """MinHash signatures over word shingles, seeded so signatures are reproducible across runs."""
+    def __init__(self, num_perm: int = DEDUP_NUM_PERM, shingle_size: int = DEDUP_SHINGLE_SIZE, seed: int = 42):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 31, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, words: List[str]) -> np.ndarray:
+        k = self.shingle_size
+        if len(words) < k:
+            grams = [" ".join(words)]
+        else:
+            grams = [" ".join(words[i:i + k]) for i in range(len(words) - k + 1)]
+        return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in set(grams)), dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = self.shingles(text.split())
+        if not len(hashes):
+            return np.full(self.num_perm, MAX_HASH, dtype=np.uint64)
+        # (a * x + b) mod p, truncated to 32 bits; a, x < 2**32 so the product fits in uint64
+        permuted = (np.outer(self.a, hashes) + self.b[:, None]) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=1)
+
+
+def find_near_duplicate_groups(ids: List[str],
+                               texts: List[str],
+                               bands: int = DEDUP_BANDS,
+                               threshold: float = DEDUP_JACCARD_THRESHOLD) -> List[List[int]]:
+    """Group near-duplicate texts with MinHash + LSH banding.
+
+    Args:
+        ids (list[str]): passage ids, only used for logging.
+        texts (list[str]): passage texts.
+        bands (int): number of LSH bands, must divide the signature length.
+        threshold (float): minimum estimated Jaccard similarity to merge two candidates.
+
+    Returns:
+        list[list[int]]: groups (positions into texts) with more than one member.
+    """
+    hasher = MinHasher()
+    rows = hasher.num_perm // bands
+    signatures = np.stack([hasher.signature(t) for t in texts]) if texts else np.zeros((0, hasher.num_perm), dtype=np.uint64)
+
+    parent = list(range(len(texts)))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for band in range(bands):
+        buckets = {}
+        band_sig = signatures[:, band * rows:(band + 1) * rows]
+        for idx in range(len(texts)):
+            buckets.setdefault(band_sig[idx].tobytes(), []).append(idx)
+        for members in buckets.values():
+            head = members[0]
+            for other in members[1:]:
+                if find(head) == find(other):
+                    continue
+                similarity = float(np.mean(signatures[head] == signatures[other]))
+                if similarity >= threshold:
+                    parent[find(other)] = find(head)
+
+    groups = {}
+    for idx in range(len(texts)):
+        groups.setdefault(find(idx), []).append(idx)
+    groups = [sorted(members) for members in groups.values() if len(members) > 1]
+    logger.info(f"Found {len(groups)} near-duplicate groups covering {sum(len(g) for g in groups)} of {len(ids)} passages")
+    return groups
+
+
+def mark_near_duplicates(data: pd.DataFrame) -> pd.DataFrame:
+    """Adds a duplicate_of column (representative passage id or None) and orders the frame so
+    every representative is segmented before the passages that reuse its boundaries.
+    """
+    data = data.copy()
+    data["duplicate_of"] = None
+    if len(data) < 2:
+        return data
+    ids = data["id"].tolist()
+    groups = find_near_duplicate_groups(ids, data["text"].tolist())
+    for members in groups:
+        representative = ids[members[0]]
+        for idx in members[1:]:
+            data.iat[idx, data.columns.get_loc("duplicate_of")] = representative
+    data["_is_duplicate"] = data["duplicate_of"].notna()
+    data = data.sort_values("_is_duplicate", kind="stable").drop(columns=["_is_duplicate"])
+    data.reset_index(drop=True, inplace=True)
+    return data
+
+
+def project_segments(rep_text: str,
+                     rep_segments: List[dict],
+                     text: str,
+                     passage_id: str,
+                     count_tokens: Optional[Callable[[str], int]] = None,
+                     max_tokens: int = ABSOLUTE_MAX_TOKEN_LIMIT) -> Optional[SegmentBatch]:
+    """Project the segment boundaries of a representative passage onto a near-duplicate by word alignment.
+
+    Args:
+        rep_text (str): text of the segmented representative passage.
+        rep_segments (SegmentBatch | list[dict]): its segments with word offsets start/end.
+        text (str): text of the near-duplicate passage.
+        passage_id (str): id of the near-duplicate passage.
+        count_tokens (callable, optional): token counter used to reject oversized projected segments.
+        max_tokens (int): token limit of a projected segment.
+
+    Returns:
+        SegmentBatch | None: segments for the near-duplicate, None if the alignment does not hold.
+    """
+    rep_words = rep_text.split()
+    words = text.split()
+    matcher = SequenceMatcher(None, rep_words, words, autojunk=False)
+    mapping = {}
+    for block in matcher.get_matching_blocks():
+        for offset in range(block.size):
+            mapping[block.a + offset] = block.b + offset
+
+    starts = []
+    for segment in sorted(rep_segments, key=lambda s: s["start"]):
+        if segment["start"] == 0:
+            starts.append(0)
+            continue
+        if segment["start"] not in mapping:
+            return None
+        starts.append(mapping[segment["start"]])
+
+    if not starts or starts[0] != 0 or any(b <= a for a, b in zip(starts, starts[1:])) or starts[-1] >= len(words):
+        return None
+
+    segments = SegmentBatch()
+    bounds = starts + [len(words)]
+    for start, next_start in zip(bounds, bounds[1:]):
+        chunk = " ".join(words[start:next_start])
+        if count_tokens is not None and count_tokens(chunk) > max_tokens:
+            return None
+        segments.append(passage_id, chunk, start, next_start - 1)
+    return segments
@@ -0,0 +1,156 @@
+from agentchunking.constants import (EMBDEEING_MODEL,
+                                     ABSOLUTE_MAX_TOKEN_LIMIT,
+                                     EMBEDDING_PASSAGE_PREFIX,
+                                     EMBEDDING_MAX_BATCH_TOKENS,
+                                     EMBEDDING_BACKEND,
+                                     EMBEDDING_QUANTIZE,
+                                     EMBEDDING_ONNX_DIR)
+from transformers import AutoTokenizer
+from typing import List
+from loguru import logger
+import numpy as np
+import os
+import time
+
+
+class SegmentEmbedder:
+    """
+    CPU embedding of segments with the e5 model.
+    Inputs are sorted by token length and cut into batches bounded by padded tokens,
+    so short segments are not padded up to the longest one in the corpus.
+
+    backend "torch" runs the HF model (int8 dynamic quantization of the linear layers when quantize is set),
+    backend "onnx" exports the model with optimum/onnxruntime (int8 dynamic quantization when quantize is set).
+    """
+    def __init__(self,
+                 model_name: str = EMBDEEING_MODEL,
+                 backend: str = EMBEDDING_BACKEND,
+                 quantize: bool = EMBEDDING_QUANTIZE,
+                 max_batch_tokens: int = EMBEDDING_MAX_BATCH_TOKENS,
+                 max_length: int = ABSOLUTE_MAX_TOKEN_LIMIT,
+                 onnx_dir: str = EMBEDDING_ONNX_DIR):
+        self.model_name = model_name
+        self.backend = backend
+        self.quantize = quantize
+        self.max_batch_tokens = max_batch_tokens
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        if backend == "torch":
+            self.model = self.load_torch_model()
+        elif backend == "onnx":
+            self.model = self.load_onnx_model(onnx_dir)
+        else:
+            raise ValueError(f"Unknown embedding backend: {backend}")
+
+    def load_torch_model(self):
+        import torch
+        from transformers import AutoModel
+
+        model = AutoModel.from_pretrained(self.model_name).eval()
+        if self.quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    def load_onnx_model(self, onnx_dir: str):
+        try:
+            from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        except ImportError as exc:
+            raise ImportError("The onnx embedding backend needs `pip install optimum[onnxruntime]`") from exc
+
+        model_dir = os.path.join(onnx_dir, "int8" if self.quantize else "fp32")
+        if not os.path.exists(model_dir):
+            logger.info(f"Exporting {self.model_name} to onnx in {model_dir}")
+            model = ORTModelForFeatureExtraction.from_pretrained(self.model_name, export=True)
+            if self.quantize:
+                quantizer = ORTQuantizer.from_pretrained(model)
+                quantizer.quantize(save_dir=model_dir, quantization_config=AutoQuantizationConfig.avx2(is_static=False))
+            else:
+                model.save_pretrained(model_dir)
+        return ORTModelForFeatureExtraction.from_pretrained(model_dir)
+
+    def length_buckets(self, token_ids: List[List[int]]) -> List[List[int]]:
+        """Indices grouped into batches of similar length whose padded size stays under max_batch_tokens."""
+        order = sorted(range(len(token_ids)), key=lambda idx: len(token_ids[idx]))
+        batches, batch, batch_max = [], [], 0
+        for idx in order:
+            length = len(token_ids[idx])
+            if batch and max(batch_max, length) * (len(batch) + 1) > self.max_batch_tokens:
+                batches.append(batch)
+                batch, batch_max = [], 0
+            batch.append(idx)
+            batch_max = max(batch_max, length)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def forward(self, batch_ids: List[List[int]]) -> np.ndarray:
+        encoded = self.tokenizer.pad({"input_ids": batch_ids}, padding=True, return_tensors="pt")
+        if self.backend == "torch":
+            import torch
+            with torch.inference_mode():
+                hidden = self.model(**encoded).last_hidden_state
+            hidden, mask = hidden.float().numpy(), encoded["attention_mask"].numpy()
+        else:
+            hidden = self.model(**encoded).last_hidden_state
+            hidden, mask = np.asarray(hidden, dtype=np.float32), encoded["attention_mask"].numpy()
+        # e5 uses mean pooling over the attention mask followed by L2 normalization
+        mask = mask[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed(self, texts: List[str], prefix: str = EMBEDDING_PASSAGE_PREFIX) -> np.ndarray:
+        """Embed texts, returns a float16 array of shape (len(texts), dim) in input order."""
+        token_ids = self.tokenizer([prefix + text for text in texts],
+                                   truncation=True,
+                                   max_length=self.max_length)["input_ids"]
+        vectors = None
+        for batch in self.length_buckets(token_ids):
+            pooled = self.forward([token_ids[idx] for idx in batch])
+            if vectors is None:
+                vectors = np.zeros((len(texts), pooled.shape[1]), dtype=np.float16)
+            vectors[batch] = pooled.astype(np.float16)
+        if vectors is None:
+            return np.zeros((0, 0), dtype=np.float16)
+        return vectors
+
+
+def decode_embedding(blob: bytes) -> np.ndarray:
+    """Inverse of the storage format used by embed_pending_segments."""
+    return np.frombuffer(blob, dtype="<f2")
+
+
+def embed_pending_segments(db, embedder: SegmentEmbedder, batch_size: int = 512) -> int:
+    """
+    Embed every finished (rewritten) segment that has no embedding yet and store it as float16 bytes.
+
+    Args:
+        db (SQLDatabaseManager): database manager.
+        embedder (SegmentEmbedder): embedding model.
+        batch_size (int): segments read, embedded and inserted per batch.
+
+    Returns:
+        int: number of embedded segments.
+    """
+    existing = db.segment_embedding_table.select_columns(columns=["passage_id", "start", "end"])
+    done = set(zip(existing["passage_id"], existing["start"], existing["end"]))
+    logger.info(f"# found already embedded segments:{len(done)}")
+
+    embedded = 0
+    run_start = time.time()
+    for batch in db.segmentation_table.select_iter(columns=["passage_id", "start", "end", "data"], batch_size=batch_size):
+        batch = batch[batch["data"].str.len() > 0]
+        keys = list(zip(batch["passage_id"], batch["start"], batch["end"]))
+        pending = [idx for idx, key in enumerate(keys) if key not in done]
+        if not pending:
+            continue
+        batch = batch.iloc[pending]
+        vectors = embedder.embed(batch["data"].tolist())
+        rows = [{"passage_id": pid, "start": int(start), "end": int(end),
+                 "model": embedder.model_name, "dim": int(vectors.shape[1]),
+                 "embedding": vector.astype("<f2").tobytes()}
+                for (pid, start, end), vector in zip(zip(batch["passage_id"], batch["start"], batch["end"]), vectors)]
+        db.segment_embedding_table.insert(rows)
+        embedded += len(rows)
+        logger.info(f"Embedded {embedded} segments, {embedded / max(time.time() - run_start, 1e-6):.1f} segments/sec")
+    return embedded
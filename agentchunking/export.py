@@ -0,0 +1,222 @@
+from agentchunking.constants import (EXPORT_DIR,
+                                     EXPORT_SHARD_ROWS,
+                                     EXPORT_ROW_GROUP_ROWS,
+                                     EXPORT_ZSTD_LEVEL,
+                                     EXPORT_WATERMARK_LAG)
+from agentchunking import metrics
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import text
+from loguru import logger
+import pandas as pd
+import json
+import os
+
+"""Incremental Parquet export of finished segments joined with their annotation metadata.
+
+Every run exports the passages with a segment updated between the previous watermark and the new one
+(the database clock minus EXPORT_WATERMARK_LAG) as zstd compressed shards sorted by passage_id, start.
+manifest.json lists the exports in order with their shards and per row group min/max statistics.
+A passage is always exported whole: consumers read the exports in order (from the last full one) and
+let the rows of a passage in a later export replace its rows from earlier exports.
+"""
+
+EXPORT_COLUMNS = ["passage_id", "start", "end", "text", "data", "updated_at", "url", "topic", "heading"]
+STATS_COLUMNS = ["passage_id", "updated_at"]  # row group statistics repeated in the manifest
+
+# passages touched in (:low, :high], only those whose segments are all rewritten unless pending ones are included
+EXPORT_QUERY = """
+WITH changed AS (
+    SELECT DISTINCT passage_id FROM segmentation_table
+    WHERE updated_at > :low AND updated_at <= :high
+), selected AS (
+    SELECT s.passage_id FROM segmentation_table s JOIN changed c ON c.passage_id = s.passage_id
+    GROUP BY s.passage_id
+    HAVING :include_pending OR bool_and(s.data <> '')
+)
+SELECT s.passage_id, s.start, s."end", s.text, s.data, s.updated_at,
+       a.url, a.site_name AS topic, a.passage_heading AS heading
+FROM segmentation_table s
+JOIN selected p ON p.passage_id = s.passage_id
+LEFT JOIN (
+    -- one metadata row per passage, annotation rows sharing an id would duplicate its segments
+    SELECT DISTINCT ON (annotation_data_id) annotation_data_id, url, site_name, passage_heading
+    FROM annotation_table
+    WHERE annotation_data_id IN (SELECT passage_id FROM selected)
+    ORDER BY annotation_data_id, updated_at DESC NULLS LAST, url
+) a ON a.annotation_data_id = s.passage_id
+ORDER BY s.passage_id, s.start
+"""
+
+
+def parquet_modules():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as exc:
+        raise ImportError("The parquet export needs `pip install pyarrow`") from exc
+    return pyarrow, pyarrow.parquet
+
+
+def load_manifest(directory: str) -> dict:
+    path = os.path.join(directory, "manifest.json")
+    if not os.path.exists(path):
+        return {"format": "parquet", "compression": "zstd", "columns": EXPORT_COLUMNS, "watermark": None, "exports": []}
+    with open(path, "r", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def save_manifest(manifest: dict, directory: str) -> str:
+    path = os.path.join(directory, "manifest.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)  # readers never see a half written manifest
+    return path
+
+
+def stat_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class ParquetShardWriter:
+    """
+    Writes frames into shards of at most shard_rows rows, buffering until a row group is full so every
+    row group (except the last one of a shard) has exactly row_group_rows rows.
+    """
+    def __init__(self, directory: str, prefix: str, shard_rows: int = EXPORT_SHARD_ROWS,
+                 row_group_rows: int = EXPORT_ROW_GROUP_ROWS, zstd_level: int = EXPORT_ZSTD_LEVEL):
+        self.pa, self.pq = parquet_modules()
+        self.directory = directory
+        self.prefix = prefix
+        self.shard_rows = max(shard_rows, row_group_rows)
+        self.row_group_rows = row_group_rows
+        self.zstd_level = zstd_level
+        self.schema = self.pa.schema([("passage_id", self.pa.string()), ("start", self.pa.int32()), ("end", self.pa.int32()),
+                                      ("text", self.pa.string()), ("data", self.pa.string()),
+                                      ("updated_at", self.pa.timestamp("us")), ("url", self.pa.string()),
+                                      ("topic", self.pa.string()), ("heading", self.pa.string())])
+        self.buffer: List[pd.DataFrame] = []
+        self.buffered = 0
+        self.writer = None
+        self.shard_path = None
+        self.shard_written = 0
+        self.shards: List[dict] = []
+
+    def write(self, frame: pd.DataFrame) -> None:
+        self.buffer.append(frame)
+        self.buffered += len(frame)
+        while self.buffered >= self.row_group_rows:
+            self.write_row_group(self.take(self.row_group_rows))
+
+    def take(self, rows: int) -> pd.DataFrame:
+        frame = pd.concat(self.buffer, ignore_index=True) if len(self.buffer) > 1 else self.buffer[0]
+        head, rest = frame.iloc[:rows], frame.iloc[rows:]
+        self.buffer = [rest] if len(rest) else []
+        self.buffered = len(rest)
+        return head
+
+    def write_row_group(self, frame: pd.DataFrame) -> None:
+        if self.writer is None:
+            self.shard_path = os.path.join(self.directory, f"{self.prefix}-{len(self.shards):05d}.parquet")
+            self.writer = self.pq.ParquetWriter(self.shard_path, self.schema, compression="zstd",
+                                                compression_level=self.zstd_level, write_statistics=True)
+        table = self.pa.Table.from_pandas(frame[EXPORT_COLUMNS], schema=self.schema, preserve_index=False)
+        self.writer.write_table(table, row_group_size=len(frame))
+        self.shard_written += len(frame)
+        if self.shard_written >= self.shard_rows:
+            self.close_shard()
+
+    def close_shard(self) -> None:
+        self.writer.close()
+        self.writer = None
+        metadata = self.pq.ParquetFile(self.shard_path).metadata
+        names = [metadata.schema.column(i).name for i in range(metadata.num_columns)]
+        row_groups = []
+        for i in range(metadata.num_row_groups):
+            group = metadata.row_group(i)
+            stats = {"rows": group.num_rows}
+            for column in STATS_COLUMNS:
+                statistics = group.column(names.index(column)).statistics
+                if statistics is not None and statistics.has_min_max:
+                    stats[column] = [stat_value(statistics.min), stat_value(statistics.max)]
+            row_groups.append(stats)
+        self.shards.append({"path": os.path.basename(self.shard_path), "rows": metadata.num_rows,
+                            "bytes": os.path.getsize(self.shard_path), "row_groups": row_groups})
+        logger.info(f"Wrote {self.shard_path}: {metadata.num_rows} rows in {metadata.num_row_groups} row groups")
+        self.shard_written = 0
+
+    def close(self) -> List[dict]:
+        if self.buffered:
+            self.write_row_group(self.take(self.buffered))
+        if self.writer is not None:
+            self.close_shard()
+        return self.shards
+
+
+def export_segments(db,
+                    directory: str = EXPORT_DIR,
+                    full: bool = False,
+                    include_pending: bool = False,
+                    batch_size: int = 10000,
+                    shard_rows: int = EXPORT_SHARD_ROWS,
+                    row_group_rows: int = EXPORT_ROW_GROUP_ROWS,
+                    watermark_lag: int = EXPORT_WATERMARK_LAG) -> Optional[dict]:
+    """
+    Export the segments changed since the last watermark into a new set of Parquet shards.
+
+    Args:
+        db (SQLDatabaseManager): database manager (postgres).
+        directory (str): export directory holding manifest.json and the shards.
+        full (bool): export everything up to the new watermark; readers start over from this export.
+        include_pending (bool): also export passages with segments the rewriter has not finished.
+        batch_size (int): rows fetched per server side cursor batch.
+        shard_rows (int): rows per shard.
+        row_group_rows (int): rows per row group.
+        watermark_lag (int): seconds before the database clock that the new watermark stays behind.
+
+    Returns:
+        dict | None: manifest entry of the new export, None if nothing changed since the last one.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = load_manifest(directory)
+    with db.engine.connect() as conn:
+        high = conn.execute(text("SELECT LOCALTIMESTAMP - make_interval(secs => :lag)"), {"lag": watermark_lag}).scalar()
+    low = datetime(1970, 1, 1) if full or manifest["watermark"] is None else datetime.fromisoformat(manifest["watermark"])
+    if high <= low:
+        logger.info(f"Nothing to export, watermark {manifest['watermark']} is ahead of {high}")
+        return None
+
+    export_id = max((entry["export_id"] for entry in manifest["exports"]), default=0) + 1
+    writer = ParquetShardWriter(directory, f"segments-{export_id:06d}", shard_rows, row_group_rows)
+    rows = 0
+    passages = 0
+    params = {"low": low, "high": high, "include_pending": include_pending}
+    with metrics.DB_QUERY_SECONDS.time(table="segmentation_table", operation="export"), \
+         db.engine.connect().execution_options(stream_results=True, yield_per=batch_size) as conn:
+        result = conn.execute(text(EXPORT_QUERY), params)
+        columns = list(result.keys())
+        for batch in result.partitions(batch_size):
+            frame = pd.DataFrame(batch, columns=columns)
+            writer.write(frame)
+            rows += len(frame)
+            passages += int((frame["start"] == 0).sum())
+            metrics.DB_ROWS.inc(len(frame), table="segmentation_table", operation="export")
+    shards = writer.close()
+
+    entry = {"export_id": export_id,
+             "created_at": datetime.now().isoformat(),
+             "full": full or manifest["watermark"] is None,
+             "watermark_from": None if full or manifest["watermark"] is None else manifest["watermark"],
+             "watermark_to": high.isoformat(),
+             "include_pending": include_pending,
+             "rows": rows,
+             "passages": passages,
+             "shards": shards}
+    manifest["exports"].append(entry)
+    manifest["watermark"] = high.isoformat()
+    save_manifest(manifest, directory)
+    logger.info(f"Export {export_id}: {rows} segments of {passages} passages in {len(shards)} shards, watermark {high}")
+    return entry
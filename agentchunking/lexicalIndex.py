@@ -0,0 +1,314 @@
+from agentchunking.constants import LEXICAL_INDEX_DIR, BM25_K1, BM25_B, STORE_SYNC_WATERMARK_LAG
+from agentchunking.utils.texthelpers import clean_bangla_text
+from typing import Dict, Iterable, List, Tuple
+from datetime import datetime
+from loguru import logger
+import numpy as np
+import heapq
+import json
+import math
+import os
+
+SegmentKey = Tuple[str, int, int]  # (passage_id, start, end) as in SegmentationTable
+
+# Bengali digits are normalized so "২০২৩" and "2023" match
+BANGLA_DIGITS = str.maketrans("০১২৩৪৫৬৭৮৯", "0123456789")
+
+
+def tokenize(text: str) -> List[str]:
+    """Bengali-aware normalization shared by indexing and querying."""
+    return clean_bangla_text(text).translate(BANGLA_DIGITS).lower().split()
+
+
+# --------- Posting list encoding ---------
+def encode_varints(values: Iterable[int]) -> bytearray:
+    out = bytearray()
+    for value in values:
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return out
+
+
+def decode_varints(buffer, offset: int, count: int) -> List[int]:
+    values = []
+    value, shift = 0, 0
+    while len(values) < count:
+        byte = int(buffer[offset])
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value, shift = 0, 0
+    return values
+
+
+class IndexSegment:
+    """
+    Immutable piece of the index written by one incremental update.
+    postings.bin holds, per term, varint pairs (doc id delta, term frequency) and is memory-mapped,
+    terms.json maps term -> [byte offset, document frequency], docs.jsonl holds key and length per local doc.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "terms.json"), "r", encoding="utf-8") as handle:
+            self.terms = json.load(handle)
+        self.keys: List[SegmentKey] = []
+        self.lengths = []
+        with open(os.path.join(path, "docs.jsonl"), "r", encoding="utf-8") as handle:
+            for line in handle:
+                passage_id, start, end, length = json.loads(line)
+                self.keys.append((passage_id, start, end))
+                self.lengths.append(length)
+        self.lengths = np.asarray(self.lengths, dtype=np.int32)
+        postings_path = os.path.join(path, "postings.bin")
+        self.postings = np.memmap(postings_path, dtype=np.uint8, mode="r") if os.path.getsize(postings_path) else b""
+
+    @staticmethod
+    def write(path: str, docs: List[Tuple[SegmentKey, List[str]]]) -> "IndexSegment":
+        inverted: Dict[str, List[Tuple[int, int]]] = {}
+        for local_id, (_, tokens) in enumerate(docs):
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                inverted.setdefault(token, []).append((local_id, tf))
+
+        os.makedirs(path, exist_ok=True)
+        terms = {}
+        with open(os.path.join(path, "postings.bin"), "wb") as handle:
+            offset = 0
+            for term in sorted(inverted):
+                previous = 0
+                values = []
+                for local_id, tf in inverted[term]:
+                    values += [local_id - previous, tf]
+                    previous = local_id
+                encoded = encode_varints(values)
+                handle.write(encoded)
+                terms[term] = [offset, len(inverted[term])]
+                offset += len(encoded)
+        with open(os.path.join(path, "terms.json"), "w", encoding="utf-8") as handle:
+            json.dump(terms, handle, ensure_ascii=False)
+        with open(os.path.join(path, "docs.jsonl"), "w", encoding="utf-8") as handle:
+            for (passage_id, start, end), tokens in docs:
+                handle.write(json.dumps([passage_id, int(start), int(end), len(tokens)], ensure_ascii=False) + "\n")
+        return IndexSegment(path)
+
+    def postings_for(self, term: str) -> List[Tuple[int, int]]:
+        entry = self.terms.get(term)
+        if entry is None:
+            return []
+        offset, df = entry
+        values = decode_varints(self.postings, offset, 2 * df)
+        postings, doc = [], 0
+        for delta, tf in zip(values[0::2], values[1::2]):
+            doc += delta
+            postings.append((doc, tf))
+        return postings
+
+
+class BM25Index:
+    """
+    On-disk BM25 index over segment text made of immutable segments (one per incremental update).
+    Re-adding an existing key supersedes the older document, delete() tombstones the copies a key has
+    so far (kept in the manifest); merge() compacts all live documents into one segment.
+    The manifest also keeps the watermark of the last sync_lexical_index run.
+    """
+    def __init__(self, directory: str = LEXICAL_INDEX_DIR, k1: float = BM25_K1, b: float = BM25_B):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        self.generation = 0  # bumped whenever the live documents change, keys the retrieval result cache
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        manifest = {"segments": [], "next_segment": 0, "deleted": [], "watermark": None}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as handle:
+                manifest = json.load(handle)
+        self.next_segment = manifest["next_segment"]
+        self.watermark = manifest.get("watermark")  # isoformat, segments updated up to it are indexed
+        self.segments = [IndexSegment(os.path.join(directory, name)) for name in manifest["segments"]]
+        # key -> segment number before which its copies are deleted
+        self.tombstones: Dict[SegmentKey, int] = {(pid, start, end): number
+                                                  for pid, start, end, number in manifest.get("deleted", [])}
+        self.refresh_stats()
+
+    @staticmethod
+    def segment_number(segment: IndexSegment) -> int:
+        return int(os.path.basename(segment.path).split("-")[1])
+
+    def refresh_stats(self) -> None:
+        # the newest segment holding a key owns it, older copies are superseded
+        self.live = {}
+        for seg_idx, segment in enumerate(self.segments):
+            number = self.segment_number(segment)
+            for local_id, key in enumerate(segment.keys):
+                if number < self.tombstones.get(key, -1):
+                    continue
+                self.live[key] = (seg_idx, local_id)
+        self.doc_count = len(self.live)
+        total = sum(int(self.segments[s].lengths[l]) for s, l in self.live.values())
+        self.avg_length = total / self.doc_count if self.doc_count else 0.0
+        self.generation += 1
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    def __contains__(self, key: SegmentKey) -> bool:
+        return key in self.live
+
+    def save_manifest(self) -> None:
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as handle:
+            json.dump({"segments": [os.path.basename(s.path) for s in self.segments], "next_segment": self.next_segment,
+                       "deleted": [[pid, start, end, number] for (pid, start, end), number in self.tombstones.items()],
+                       "watermark": self.watermark},
+                      handle, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    def add_documents(self, docs: List[Tuple[SegmentKey, str]]) -> int:
+        """Index (key, text) pairs as a new immutable segment, returns the number of indexed documents."""
+        tokenized = [(key, tokenize(text)) for key, text in docs]
+        tokenized = [(key, tokens) for key, tokens in tokenized if tokens]
+        if not tokenized:
+            return 0
+        name = f"seg-{self.next_segment:06d}"
+        self.next_segment += 1
+        self.segments.append(IndexSegment.write(os.path.join(self.directory, name), tokenized))
+        self.save_manifest()
+        self.refresh_stats()
+        return len(tokenized)
+
+    def delete(self, keys: Iterable[SegmentKey]) -> int:
+        """Tombstone the indexed copies of keys (a later add_documents makes a key live again), returns the deleted count."""
+        deleted = 0
+        for key in keys:
+            if key in self.live:
+                self.tombstones[key] = self.next_segment
+                deleted += 1
+        if deleted:
+            self.save_manifest()
+            self.refresh_stats()
+        return deleted
+
+    def merge(self) -> None:
+        """Rewrite all live documents into one segment (drops superseded copies)."""
+        if len(self.segments) < 2:
+            return
+        docs = {}
+        for seg_idx, segment in enumerate(self.segments):
+            for term in segment.terms:
+                for local_id, tf in segment.postings_for(term):
+                    key = segment.keys[local_id]
+                    if self.live.get(key) == (seg_idx, local_id):
+                        docs.setdefault(key, []).extend([term] * tf)
+        old_segments = self.segments
+        name = f"seg-{self.next_segment:06d}"
+        self.next_segment += 1
+        self.segments = [IndexSegment.write(os.path.join(self.directory, name), list(docs.items()))]
+        self.tombstones = {}  # deleted copies are gone with the old segments
+        self.save_manifest()
+        self.refresh_stats()
+        for segment in old_segments:
+            for file_name in ("postings.bin", "terms.json", "docs.jsonl"):
+                os.remove(os.path.join(segment.path, file_name))
+            os.rmdir(segment.path)
+        logger.info(f"Merged {len(old_segments)} lexical index segments into {name}")
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[SegmentKey, float]]:
+        """Top-k segments by BM25 score."""
+        terms = set(tokenize(query))
+        if not terms or not self.doc_count:
+            return []
+        # live postings only: superseded and deleted copies count neither in df nor in the scores
+        postings: Dict[str, List[Tuple[IndexSegment, int, int]]] = {}
+        for seg_idx, segment in enumerate(self.segments):
+            for term in terms:
+                for local_id, tf in segment.postings_for(term):
+                    if self.live.get(segment.keys[local_id]) == (seg_idx, local_id):
+                        postings.setdefault(term, []).append((segment, local_id, tf))
+        scores: Dict[SegmentKey, float] = {}
+        for term, term_postings in postings.items():
+            df = len(term_postings)
+            idf = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+            for segment, local_id, tf in term_postings:
+                norm = self.k1 * (1 - self.b + self.b * float(segment.lengths[local_id]) / self.avg_length)
+                key = segment.keys[local_id]
+                scores[key] = scores.get(key, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+def sync_lexical_index(db, index: BM25Index, batch_size: int = 10000, full: bool = False,
+                       watermark_lag: int = STORE_SYNC_WATERMARK_LAG) -> int:
+    """
+    Bring the index up to date with the segments updated since its watermark.
+    Only passages with a segment updated in (watermark, new watermark] are read: their updated segments
+    are tombstoned and indexed again (an edit under the same (passage_id, start, end) replaces the old
+    text) and their indexed segments that are no longer in the table are deleted.
+
+    Args:
+        db (SQLDatabaseManager): database manager.
+        index (BM25Index): lexical index.
+        batch_size (int): rows per server side cursor batch.
+        full (bool): re-index every segment and delete every indexed segment that is gone.
+        watermark_lag (int): seconds before the database clock that the new watermark stays behind.
+
+    Returns:
+        int: number of (re-)indexed segments.
+    """
+    high = db.sync_watermark(watermark_lag)
+    low = None if full or index.watermark is None else datetime.fromisoformat(index.watermark)
+    if low is not None and high <= low:
+        logger.info(f"Lexical index is up to date, watermark {index.watermark} is ahead of {high}")
+        return 0
+    docs = []
+    current = set()
+    passages = set()
+    for batch in db.changed_passage_segments(low, high, batch_size=batch_size):
+        for pid, start, end, text in zip(batch["passage_id"], batch["start"], batch["end"], batch["text"]):
+            key = (pid, int(start), int(end))
+            current.add(key)
+            passages.add(pid)
+            if isinstance(text, str):  # updated since the last sync
+                docs.append((key, text))
+    stale = [key for key in index.live if (low is None or key[0] in passages) and key not in current]
+    # tombstone the old copies first, so a changed segment whose new text has no tokens is not left behind
+    index.delete(stale + [key for key, _ in docs])
+    added = index.add_documents(docs)
+    index.watermark = high.isoformat()
+    index.save_manifest()
+    logger.info(f"Indexed {added} and deleted {len(stale)} segments of {len(passages)} changed passages "
+                f"in the lexical index, {len(index)} in total, watermark {index.watermark}")
+    return added
+
+
+# --------- Score fusion ---------
+def reciprocal_rank_fusion(result_lists: List[List[Tuple[SegmentKey, float]]], k: int = 60, top_k: int = 10) -> List[Tuple[SegmentKey, float]]:
+    """Fuse ranked lists (e.g. BM25 and vector search) by reciprocal rank."""
+    fused: Dict[SegmentKey, float] = {}
+    for results in result_lists:
+        for rank, (key, _) in enumerate(results):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return heapq.nlargest(top_k, fused.items(), key=lambda item: item[1])
+
+
+def weighted_fusion(dense: List[Tuple[SegmentKey, float]],
+                    lexical: List[Tuple[SegmentKey, float]],
+                    alpha: float = 0.5,
+                    top_k: int = 10) -> List[Tuple[SegmentKey, float]]:
+    """alpha * dense + (1 - alpha) * lexical after min-max normalizing each list."""
+    def normalized(results):
+        if not results:
+            return {}
+        values = [score for _, score in results]
+        low, high = min(values), max(values)
+        return {key: (score - low) / (high - low) if high > low else 1.0 for key, score in results}
+
+    dense_scores, lexical_scores = normalized(dense), normalized(lexical)
+    fused = {key: alpha * dense_scores.get(key, 0.0) + (1 - alpha) * lexical_scores.get(key, 0.0)
+             for key in set(dense_scores) | set(lexical_scores)}
+    return heapq.nlargest(top_k, fused.items(), key=lambda item: item[1])
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import re
+import time
+from types import SimpleNamespace
+from typing import List, Optional
+
+"""Deterministic stand-ins for the Gemini responses of the copier and the rewriter.
+The same prompt always produces the same output, so benchmark and load-test runs are comparable.
+"""
+
+SENTENCE_END = re.compile(r"(?<=[।?!.])\s+")
+
+
+def prompt_seed(prompt: str) -> int:
+    return int.from_bytes(hashlib.sha1(prompt.encode("utf-8")).digest()[:4], "big")
+
+
+def extract_passage(prompt: str) -> str:
+    """Passage of a copier prompt (everything after the instruction block)."""
+    marker = "natural breaking point, such as the end of a section or topic:\n\n"
+    if marker in prompt:
+        return prompt.split(marker, 1)[1]
+    if "Here is the original passage to process:\n" in prompt:
+        return prompt.split("Here is the original passage to process:\n", 1)[1].strip()
+    return prompt
+
+
+def copy_passage(passage: str, seed: int, min_fraction: float = 0.5, max_fraction: float = 0.9) -> str:
+    """Copy the passage up to a sentence end between min_fraction and max_fraction of its words,
+    like the copier stopping at a natural breaking point."""
+    sentences = [s for s in SENTENCE_END.split(passage.strip()) if s]
+    if len(sentences) <= 1:
+        return passage.strip()
+    total = sum(len(s.split()) for s in sentences)
+    target = total * (min_fraction + (max_fraction - min_fraction) * (seed % 1000) / 1000.0)
+    copied, words = [], 0
+    for sentence in sentences:
+        copied.append(sentence)
+        words += len(sentence.split())
+        if words >= target:
+            break
+    return " ".join(copied)
+
+
+def extract_rewrite_segments(prompt: str) -> List[tuple]:
+    """(segment_id, passage) pairs of a packed rewrite prompt."""
+    body = prompt.split("Original Passages:", 1)[1].split("Return exactly one rewritten passage", 1)[0]
+    return re.findall(r"\[segment_id: ([^\]]+)\]\n(.*?)(?=\n\n\[segment_id: |\Z)", body.strip(), flags=re.S)
+
+
+def fake_response_json(prompt: str, schema: Optional[str]) -> dict:
+    """
+    JSON body the real model would return for a prompt.
+
+    Args:
+        prompt (str): prompt sent by the copier or the rewriter.
+        schema (str): response schema name, CopiedPassage, RewrittenPassage or RewrittenPassages.
+
+    Returns:
+        dict: response matching the pydantic schema.
+    """
+    if schema == "RewrittenPassages":
+        return {"passages": [{"segment_id": segment_id, "rewritten_passage": passage.strip()}
+                             for segment_id, passage in extract_rewrite_segments(prompt)]}
+    if schema == "RewrittenPassage":
+        passage = prompt.split("Original Passage:", 1)[1].split("Return the rewritten passage only.", 1)[0]
+        return {"rewritten_passage": passage.strip()}
+    return {"new_passage": copy_passage(extract_passage(prompt), prompt_seed(prompt))}
+
+
+def estimate_tokens(text: str) -> int:
+    # rough count for usage metadata, Bengali words split into ~3 llama/gemini tokens
+    return max(1, int(len(text.split()) * 2.8))
+
+
+class FakeModels:
+    def __init__(self, owner: "FakeGeminiClient"):
+        self.owner = owner
+
+    def generate_content(self, model: str, contents: str, config=None):
+        schema = getattr(getattr(config, "response_schema", None), "__name__", None)
+        body = fake_response_json(contents, schema)
+        if self.owner.latency:
+            time.sleep(self.owner.latency)
+        self.owner.calls += 1
+        text = json.dumps(body, ensure_ascii=False)
+        usage = SimpleNamespace(prompt_token_count=estimate_tokens(contents), candidates_token_count=estimate_tokens(text))
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+class FakeGeminiClient:
+    """Offline replacement for genai.Client exposing client.models.generate_content."""
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self.models = FakeModels(self)
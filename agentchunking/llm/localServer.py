@@ -0,0 +1,201 @@
+from agentchunking.llm.fake import fake_response_json, estimate_tokens
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import deque
+from datetime import datetime
+from typing import Optional
+from loguru import logger
+import json
+import random
+import threading
+import time
+
+"""Local stand-in for the Gemini (generateContent) and OpenAI-compatible (chat/completions) APIs.
+Responses are the deterministic copier/rewriter JSON of agentchunking.llm.fake; latency, 429/503
+errors and per-key RPM/RPD limits are injected so client management, retries and rate limiting
+can be load tested offline.
+"""
+
+
+class StandInBehaviour:
+    """
+    Latency and failure model of the stand-in server.
+
+    Args:
+        latency_median (float): median response latency in seconds (log-normal).
+        latency_sigma (float): sigma of the log-normal latency, 0 for a fixed latency.
+        rate_429 (float): fraction of requests answered with 429 RESOURCE_EXHAUSTED.
+        rate_503 (float): fraction of requests answered with 503 UNAVAILABLE.
+        rpm (int): requests per minute allowed per API key, None for no limit.
+        rpd (int): requests per day allowed per API key, None for no limit.
+        seed (int): seed of the latency and error draws.
+    """
+    def __init__(self,
+                 latency_median: float = 1.0,
+                 latency_sigma: float = 0.5,
+                 rate_429: float = 0.0,
+                 rate_503: float = 0.0,
+                 rpm: Optional[int] = None,
+                 rpd: Optional[int] = None,
+                 seed: int = 0):
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.rate_429 = rate_429
+        self.rate_503 = rate_503
+        self.rpm = rpm
+        self.rpd = rpd
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.minute_windows = {}  # key -> deque of request times
+        self.day_counts = {}  # key -> (date, count)
+        self.stats = {"requests": 0, "ok": 0, "rate_limited": 0, "injected_429": 0, "injected_503": 0}
+
+    def latency(self) -> float:
+        with self.lock:
+            if self.latency_sigma <= 0:
+                return self.latency_median
+            return self.rng.lognormvariate(0.0, self.latency_sigma) * self.latency_median
+
+    def admit(self, key: str) -> Optional[tuple]:
+        """None if the request is served, else the (status code, status, message) error to return."""
+        now = time.time()
+        today = datetime.now().date()
+        with self.lock:
+            self.stats["requests"] += 1
+            window = self.minute_windows.setdefault(key, deque())
+            while window and now - window[0] > 60:
+                window.popleft()
+            day, count = self.day_counts.get(key, (today, 0))
+            if day != today:
+                count = 0
+            if (self.rpm is not None and len(window) >= self.rpm) or (self.rpd is not None and count >= self.rpd):
+                self.stats["rate_limited"] += 1
+                return 429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (e.g. check quota)."
+            window.append(now)
+            self.day_counts[key] = (today, count + 1)
+
+            roll = self.rng.random()
+            if roll < self.rate_429:
+                self.stats["injected_429"] += 1
+                return 429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (e.g. check quota)."
+            if roll < self.rate_429 + self.rate_503:
+                self.stats["injected_503"] += 1
+                return 503, "UNAVAILABLE", "The model is overloaded. Please try again later."
+            self.stats["ok"] += 1
+        return None
+
+    def report(self) -> dict:
+        with self.lock:
+            return dict(self.stats, keys=len(self.minute_windows))
+
+
+def schema_name(response_schema) -> Optional[str]:
+    """Map a generateContent responseSchema (as sent by google-genai) to the pydantic model name."""
+    properties = (response_schema or {}).get("properties") or {}
+    if "new_passage" in properties:
+        return "CopiedPassage"
+    if "rewritten_passage" in properties:
+        return "RewrittenPassage"
+    if "passages" in properties:
+        return "RewrittenPassages"
+    return None
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    behaviour: StandInBehaviour = None
+
+    def send_json(self, code: int, body: dict) -> None:
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def api_key(self) -> str:
+        key = self.headers.get("x-goog-api-key")
+        if not key and "key=" in self.path:
+            key = self.path.split("key=", 1)[1].split("&", 1)[0]
+        if not key:
+            key = self.headers.get("Authorization", "").replace("Bearer ", "")
+        return key or "anonymous"
+
+    def do_GET(self):
+        if self.path.startswith("/stats"):
+            self.send_json(200, self.behaviour.report())
+        else:
+            self.send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        path = self.path.split("?", 1)[0]
+        if path.endswith(":generateContent"):
+            handler = self.generate_content
+        elif path.endswith("/chat/completions"):
+            handler = self.chat_completions
+        else:
+            self.send_json(404, {"error": {"code": 404, "message": f"Unknown endpoint {path}", "status": "NOT_FOUND"}})
+            return
+
+        time.sleep(self.behaviour.latency())
+        error = self.behaviour.admit(self.api_key())
+        if error is not None:
+            code, status, message = error
+            self.send_json(code, {"error": {"code": code, "message": message, "status": status}})
+            return
+        handler(path, request)
+
+    def generate_content(self, path: str, request: dict) -> None:
+        prompt = "".join(part.get("text", "") for content in request.get("contents", []) for part in content.get("parts", []))
+        config = request.get("generationConfig") or {}
+        text = json.dumps(fake_response_json(prompt, schema_name(config.get("responseSchema"))), ensure_ascii=False)
+        prompt_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(text)
+        self.send_json(200, {
+            "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {"promptTokenCount": prompt_tokens,
+                              "candidatesTokenCount": output_tokens,
+                              "totalTokenCount": prompt_tokens + output_tokens},
+            "modelVersion": path.rsplit("/", 1)[-1].split(":", 1)[0],
+        })
+
+    def chat_completions(self, path: str, request: dict) -> None:
+        prompt = "".join(message.get("content") or "" for message in request.get("messages", []) if message.get("role") == "user")
+        text = json.dumps(fake_response_json(prompt, None), ensure_ascii=False)
+        prompt_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(text)
+        self.send_json(200, {
+            "id": f"chatcmpl-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stand-in"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": output_tokens,
+                      "total_tokens": prompt_tokens + output_tokens},
+        })
+
+    def log_message(self, format, *args):
+        pass  # thousands of requests per minute would flood the logs
+
+
+def start_stand_in_server(behaviour: StandInBehaviour, port: int, host: str = "127.0.0.1", block: bool = True) -> ThreadingHTTPServer:
+    """
+    Serve the stand-in APIs at http://host:port (Gemini under /v1beta, OpenAI under /v1).
+
+    Args:
+        behaviour (StandInBehaviour): latency, error and quota model.
+        port (int): port to listen on.
+        host (str): interface to bind.
+        block (bool): serve in the calling thread, else in a daemon thread.
+
+    Returns:
+        ThreadingHTTPServer: the running server.
+    """
+    handler = type("BoundStandInHandler", (StandInHandler,), {"behaviour": behaviour})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    logger.info(f"LLM stand-in server listening on http://{host}:{port}")
+    if block:
+        server.serve_forever()
+    else:
+        threading.Thread(target=server.serve_forever, name="llm-stand-in", daemon=True).start()
+    return server
@@ -1,8 +1,11 @@
 from google.genai import types
 from pydantic import BaseModel, Field
-from typing import Optional,Any
+from typing import Optional,Any,List,Tuple,Dict
 import json 
 from agentchunking.constants import REWRITER_GOOGLE_MODEL
+from agentchunking.llm.singleflight import SingleFlight,prompt_fingerprint
+from agentchunking import metrics
+from loguru import logger
 # --------- Gemini Configuration ---------
 class RewrittenPassage(BaseModel):
     rewritten_passage: str = Field(..., description="Self-contained, rewritten Bengali passage")
@@ -11,6 +14,19 @@ rewrite_gen_config = types.GenerateContentConfig(
     response_mime_type="application/json",
     response_schema=RewrittenPassage,
     temperature=0.3)  # Slight creativity for paraphrasing, but still factual
+
+# --------- Packed (multi-segment) Configuration ---------
+class RewrittenSegment(BaseModel):
+    segment_id: str = Field(..., description="Id of the segment exactly as given in the prompt")
+    rewritten_passage: str = Field(..., description="Self-contained, rewritten Bengali passage")
+
+class RewrittenPassages(BaseModel):
+    passages: List[RewrittenSegment] = Field(..., description="One rewritten passage per given segment id")
+
+packed_rewrite_gen_config = types.GenerateContentConfig(
+    response_mime_type="application/json",
+    response_schema=RewrittenPassages,
+    temperature=0.3)
     
 # --------- Prompt Template ---------
 def build_prompt(topic: str, passage_heading: str, passage: str) -> str:
@@ -35,22 +51,102 @@ Original Passage: {passage}
 Return the rewritten passage only.
 """
 
+def build_packed_prompt(topic: str, passage_heading: str, segments: List[Tuple[str, str]]) -> str:
+    """Same rules as build_prompt, sent once for several segments of the same topic/heading."""
+    passages = "\n\n".join(f"[segment_id: {segment_id}]\n{passage}" for segment_id, passage in segments)
+    return f"""
+You are a passage rewriting assistant for Bengali government content.
 
-# --------- Main Rewrite Function ---------
-def rewrite_passage(topic: str, heading: str, passage: str,client:Any) -> Optional[str]:
-    try:
-        prompt = build_prompt(topic, heading, passage)
+Your task is to rewrite EACH of the following passages in Bengali, independently of each other, while keeping the following rules:
 
-        
+1. Preserve all factual information and clarity.
+2. Ensure the rewritten passage is fully self-contained.
+3. Maintain a formal, clear, and neutral tone.
+4. Use the topic and passage heading to provide context. THE PASSAGE MUST CLEARLY RELATE TO THE TOPIC.
+5. Absoulte information like name,number,date,time,year must be preserved.
+6. Reduce the number of words if it is too wordy but YOU CAN NOT LOOSE INFORMATION
+7.The idea is that if a question is asked in about original passage it can not be missing in the rewriten passage.
+8.Tone or words may not match but INFORMATION MUST BE PRESERVED
+
+Topic: {topic}
+Passage Heading: {passage_heading}
+Original Passages:
+
+{passages}
+
+Return exactly one rewritten passage for every segment_id above, using the same segment_id.
+"""
+
+
+# identical prompts requested concurrently share one in-flight call
+rewrite_flight = SingleFlight("rewriter")
+
+def generate_rewrite(prompt: str, client: Any) -> str:
+    with metrics.track_llm_call("rewriter", REWRITER_GOOGLE_MODEL):
         response = client.models.generate_content(
             model=REWRITER_GOOGLE_MODEL,
             contents=prompt,
             config=rewrite_gen_config,
         )
-        rewriten=json.loads(response.text)['rewritten_passage']
+    metrics.record_gemini_usage("rewriter", REWRITER_GOOGLE_MODEL, response)
+    return json.loads(response.text)['rewritten_passage']
+
+# --------- Main Rewrite Function ---------
+def rewrite_passage(topic: str, heading: str, passage: str,clients:Any) -> Optional[str]:
+    """clients is a PriorityClientManager; only the single-flight leader takes a key, so
+    coalesced callers do not spend quota."""
+    try:
+        prompt = build_prompt(topic, heading, passage)
+        key = prompt_fingerprint(REWRITER_GOOGLE_MODEL, prompt)
+        rewriten = rewrite_flight.do(key, lambda: generate_rewrite(prompt, clients.get_client()))
 
         return rewriten
 
+    except RuntimeError:
+        raise  # every key is out of quota, the rewrite stage stops on this
     except Exception as e:
-        print("Error during generation:", e)
+        logger.warning(f"Error during generation: {e}")
         return None
+
+
+def generate_packed_rewrite(prompt: str, client: Any) -> List[dict]:
+    with metrics.track_llm_call("rewriter_packed", REWRITER_GOOGLE_MODEL):
+        response = client.models.generate_content(
+            model=REWRITER_GOOGLE_MODEL,
+            contents=prompt,
+            config=packed_rewrite_gen_config,
+        )
+    metrics.record_gemini_usage("rewriter_packed", REWRITER_GOOGLE_MODEL, response)
+    return json.loads(response.text)['passages']
+
+def rewrite_packed_passages(topic: str, heading: str, segments: List[Tuple[str, str]], clients: Any) -> Dict[str, str]:
+    """
+    Rewrites several (segment_id, passage) pairs with a single request, the key is taken from
+    clients by the single-flight leader only.
+    Only entries that validate (known id, returned once, non-empty text) are returned,
+    the caller rewrites the missing ids one by one.
+    """
+    try:
+        prompt = build_packed_prompt(topic, heading, segments)
+        key = prompt_fingerprint(REWRITER_GOOGLE_MODEL, prompt)
+        passages = rewrite_flight.do(key, lambda: generate_packed_rewrite(prompt, clients.get_client()))
+    except RuntimeError:
+        raise  # every key is out of quota, the rewrite stage stops on this
+    except Exception as e:
+        logger.warning(f"Error during packed generation: {e}")
+        return {}
+
+    expected = {segment_id for segment_id, _ in segments}
+    rewritten = {}
+    duplicated = set()
+    for item in passages:
+        segment_id = str(item.get('segment_id', '')).strip()
+        text = (item.get('rewritten_passage') or '').strip()
+        if segment_id not in expected or not text:
+            continue
+        if segment_id in rewritten:
+            duplicated.add(segment_id)
+        rewritten[segment_id] = text
+    for segment_id in duplicated:
+        rewritten.pop(segment_id)
+    return rewritten
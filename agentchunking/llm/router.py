@@ -0,0 +1,249 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import contextvars
+from typing import Any, Callable, List, Optional, Tuple
+from loguru import logger
+from agentchunking.clientManagement import APIClientWrapper, PriorityClientManager
+from agentchunking.constants import ROUTER_PRIOR_LATENCY
+from agentchunking import tracing
+
+
+class LLMBackend:
+    """One callable LLM endpoint (a google key, an OpenAI-compatible endpoint or a local server)
+    with its own quota wrapper and running latency/error statistics.
+    """
+    def __init__(self, name: str, wrapper: APIClientWrapper, call_fn: Callable[[str, Any], str], ewma_alpha: float = 0.2,
+                 prior_latency: float = ROUTER_PRIOR_LATENCY):
+        self.name = name
+        self.wrapper = wrapper
+        self.call_fn = call_fn
+        self.ewma_alpha = ewma_alpha
+        self.prior_latency = prior_latency  # seconds assumed until the first successful call
+        self.ewma_latency = None  # seconds, None until the first successful call
+        self.ewma_error_rate = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        return self.wrapper.is_available()
+
+    def priority(self) -> float:
+        """Heap key of the router: score inflated by the used share of the daily budget, so quota is
+        spread over similarly fast keys while a slow or failing key still goes last.
+        """
+        return self.score() / max(1e-3, 1.0 - self.wrapper.used_fraction())
+
+    def score(self) -> float:
+        """Expected cost of a call: EWMA latency inflated by the EWMA error rate.
+        Backends without a successful call yet use prior_latency, so their failures still count.
+        """
+        latency = self.prior_latency if self.ewma_latency is None else self.ewma_latency
+        return latency / max(1e-3, 1.0 - self.ewma_error_rate)
+
+    def record(self, latency: Optional[float], failed: bool) -> None:
+        with self.lock:
+            self.calls += 1
+            self.errors += int(failed)
+            self.ewma_error_rate += self.ewma_alpha * (float(failed) - self.ewma_error_rate)
+            if latency is not None and not failed:
+                if self.ewma_latency is None:
+                    self.ewma_latency = latency
+                else:
+                    self.ewma_latency += self.ewma_alpha * (latency - self.ewma_latency)
+
+    def call(self, text: str, client: Any) -> str:
+        """Run call_fn with a client already charged to this backend's quota (see ProviderRouter.acquire)."""
+        with tracing.span("llm_call", backend=self.name, words=len(text.split())):
+            start = time.perf_counter()
+            try:
+                result = self.call_fn(text, client)
+            except Exception:
+                self.record(None, failed=True)
+                raise
+            self.record(time.perf_counter() - start, failed=False)
+        return result
+
+    def __repr__(self) -> str:
+        latency = "n/a" if self.ewma_latency is None else f"{self.ewma_latency:.2f}s"
+        return f"LLMBackend(name={self.name!r}, ewma_latency={latency}, error_rate={self.ewma_error_rate:.2f}, calls={self.calls})"
+
+
+class ProviderRouter:
+    """Routes each request to the fastest backend that still has quota left.
+    On failure the next best backend is tried before giving up. Backends are picked through a
+    PriorityClientManager keyed by LLMBackend.priority, so a pick costs O(log n) in the number of keys.
+
+    With hedge_percentile set, a call that runs longer than that percentile of recent
+    latencies gets a duplicate request on a different backend with free RPM and the first
+    successful response wins. Hedges are capped at hedge_max_fraction of all calls.
+    """
+    def __init__(self,
+                 backends: List[LLMBackend],
+                 hedge_percentile: Optional[float] = None,
+                 hedge_max_fraction: float = 0.05,
+                 latency_window: int = 200,
+                 hedge_min_samples: int = 20,
+                 pool: str = "router"):
+        if not backends:
+            raise ValueError("ProviderRouter needs at least one backend.")
+        self.backends = backends
+        self.positions = {backend.name: idx for idx, backend in enumerate(backends)}
+        self.keys = PriorityClientManager([backend.wrapper for backend in backends], pool=pool,
+                                          priority=lambda idx: self.backends[idx].priority())
+        self.lock = threading.Lock()
+
+        self.hedge_percentile = hedge_percentile
+        self.hedge_max_fraction = hedge_max_fraction
+        self.hedge_min_samples = hedge_min_samples
+        self.recent_latencies = deque(maxlen=latency_window)
+        self.total_calls = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        # only hedged attempts run on the pool, every other call stays on the caller's thread
+        self.executor = None if hedge_percentile is None else \
+            ThreadPoolExecutor(max_workers=2 * len(backends), thread_name_prefix="hedge")
+
+    def acquire(self, exclude: Optional[set] = None) -> Tuple[Optional[LLMBackend], Any]:
+        """Best backend with quota left and its client, charged to its quota in the same locked heap
+        operation so concurrent callers never both take a key's last RPM slot. (None, None) if none is left.
+        """
+        idx = self.keys.acquire({self.positions[name] for name in exclude} if exclude else None)
+        if idx is None:
+            return None, None
+        return self.backends[idx], self.backends[idx].wrapper.client
+
+    def timed_call(self, backend: LLMBackend, client: Any, text: str) -> str:
+        start = time.perf_counter()
+        try:
+            result = backend.call(text, client)
+        finally:
+            self.keys.reprioritize(self.positions[backend.name])  # the call changed its score
+        with self.lock:
+            self.recent_latencies.append(time.perf_counter() - start)
+        return result
+
+    def hedge_threshold(self) -> Optional[float]:
+        """Latency (seconds) after which a hedge is sent, None while there is too little history."""
+        with self.lock:
+            if len(self.recent_latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self.recent_latencies)
+        idx = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100.0))
+        return ordered[idx]
+
+    def hedge_allowed(self) -> bool:
+        with self.lock:
+            return self.hedges_sent < self.hedge_max_fraction * self.total_calls
+
+    def reserve_hedge(self) -> bool:
+        """Count a hedge against the cap in the same locked step as the check, so concurrent callers
+        cannot all pass the check before any of them is counted. False if the cap is reached."""
+        with self.lock:
+            if self.hedges_sent >= self.hedge_max_fraction * self.total_calls:
+                return False
+            self.hedges_sent += 1
+            return True
+
+    def release_hedge(self) -> None:
+        with self.lock:
+            self.hedges_sent -= 1
+
+    def call(self, text: str) -> str:
+        with self.lock:
+            self.total_calls += 1
+        if self.hedge_percentile is not None:
+            return self.hedged_call(text)
+        return self.call_with_fallback(text)
+
+    def call_with_fallback(self, text: str, tried: Optional[set] = None) -> str:
+        tried = set(tried or ())
+        last_exc = None
+        while True:
+            backend, client = self.acquire(exclude=tried)
+            if backend is None:
+                break
+            tried.add(backend.name)
+            try:
+                return self.timed_call(backend, client, text)
+            except Exception as exc:
+                last_exc = exc
+                logger.warning(f"Backend {backend.name} failed: {exc}")
+        if last_exc is not None:
+            raise last_exc
+        raise RuntimeError("No backend with remaining quota is available.")
+
+    def submit(self, backend: LLMBackend, client: Any, text: str, started: Optional[threading.Event] = None):
+        """Run timed_call on the hedge pool in a copy of the caller's context (spans nest under the caller's span)."""
+        def attempt():
+            if started is not None:
+                started.set()
+            return self.timed_call(backend, client, text)
+        return self.executor.submit(contextvars.copy_context().run, attempt)
+
+    def hedged_call(self, text: str) -> str:
+        threshold = self.hedge_threshold()
+        if threshold is None or not self.hedge_allowed():
+            return self.call_with_fallback(text)  # no hedge possible, no reason to go through the pool
+        primary, client = self.acquire()
+        if primary is None:
+            raise RuntimeError("No backend with remaining quota is available.")
+
+        started = threading.Event()
+        futures = {self.submit(primary, client, text, started): primary}
+        started.wait()  # time queued on the pool does not count towards the threshold
+        done, _ = wait(futures, timeout=threshold)
+        if not done and self.reserve_hedge():
+            hedge, hedge_client = self.acquire(exclude={primary.name})
+            if hedge is not None:
+                logger.info(f"Hedging call on {primary.name} after {threshold:.2f}s with {hedge.name}")
+                futures[self.submit(hedge, hedge_client, text)] = hedge
+            else:
+                self.release_hedge()  # no backend left to hedge on, nothing was sent
+
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                exc = fut.exception()
+                if exc is None:
+                    if futures[fut] is not primary:
+                        with self.lock:
+                            self.hedges_won += 1
+                    return fut.result()
+                logger.warning(f"Backend {futures[fut].name} failed: {exc}")
+        # every in-flight attempt failed, fall back to the remaining backends
+        return self.call_with_fallback(text, tried={b.name for b in futures.values()})
+
+    def hedge_report(self) -> dict:
+        with self.lock:
+            return {"calls": self.total_calls,
+                    "hedges_sent": self.hedges_sent,
+                    "hedges_won": self.hedges_won,
+                    "extra_quota_fraction": self.hedges_sent / self.total_calls if self.total_calls else 0.0}
+
+    def report(self) -> List[str]:
+        return [repr(b) for b in sorted(self.backends, key=lambda b: b.score())]
+
+
+def create_openai_compatible_backends(provider_configs: List[dict], call_fn: Callable[[str, Any, str], str]) -> List[LLMBackend]:
+    """Build backends for OpenAI-compatible endpoints (hosted or local servers).
+
+    Args:
+        provider_configs (list[dict]): entries with name, base_url, api_key, model, rpd and rpm.
+        call_fn (callable): function(text, client, model) performing the request.
+
+    Returns:
+        list[LLMBackend]: one backend per configured endpoint.
+    """
+    from openai import OpenAI
+
+    backends = []
+    for conf in provider_configs:
+        client = OpenAI(base_url=conf["base_url"], api_key=conf.get("api_key", "EMPTY"))
+        model = conf["model"]
+        wrapper = APIClientWrapper(client, conf.get("rpd", 10**9), conf.get("rpm", 10**6))
+        backends.append(LLMBackend(conf["name"], wrapper, lambda text, c, m=model: call_fn(text, c, m)))
+    return backends
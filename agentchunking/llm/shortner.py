@@ -1,21 +1,35 @@
-from google.genai import types
-from pydantic import BaseModel, Field
+from functools import lru_cache
 from typing import List, Tuple
 import json
-from agentchunking.constants import COPIER_GOOGLE_MODEL,COPIER_MAX_ALLOWED_RPD,COPIER_MAX_ALLOWED_RPM
+import os
+import threading
+from agentchunking.constants import (COPIER_GOOGLE_MODEL,COPIER_MAX_ALLOWED_RPD,COPIER_MAX_ALLOWED_RPM,PROVIDERS_CONFIG_PATH,
+                                     COPIER_HEDGE_PERCENTILE,COPIER_HEDGE_MAX_FRACTION,LLM_CLIENT_BACKEND)
 from agentchunking.clientManagement import create_wrapped_clients_google
+from agentchunking.llm.router import LLMBackend,ProviderRouter,create_openai_compatible_backends
+from agentchunking.llm.singleflight import SingleFlight,prompt_fingerprint
+from agentchunking.utils.filehelpers import config_loader
+from agentchunking import metrics
 from loguru import logger
 #------------------------------------------------------------------------------------------------------------------
-google_clients=create_wrapped_clients_google(COPIER_MAX_ALLOWED_RPD,COPIER_MAX_ALLOWED_RPM)
 # --------- Gemini Configuration ---------
-class CopiedPassage(BaseModel):
-    new_passage: str = Field(..., description="Self-contained, copied Bengali passage.")
+@lru_cache(maxsize=None)
+def get_copy_config():
+    """Response config of the copier, built on first use so the fake backend runs without google-genai."""
+    try:
+        from google.genai import types
+        from pydantic import BaseModel, Field
+    except ImportError:
+        return None  # only the in-process fake client exists without google-genai, it needs no schema
 
-copy_config = types.GenerateContentConfig(
-    response_mime_type="application/json",
-    response_schema=CopiedPassage,
-    temperature=0.0
-)
+    class CopiedPassage(BaseModel):
+        new_passage: str = Field(..., description="Self-contained, copied Bengali passage.")
+
+    return types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=CopiedPassage,
+        temperature=0.0
+    )
 
 passage_prompt_google = (
     "Copy the following text until you reach a natural breaking point, "
@@ -24,11 +38,13 @@ passage_prompt_google = (
 
 def shorten_text_goole_api(text: str, client) -> str:
     prompt = passage_prompt_google.format(passage=text)
-    response = client.models.generate_content(
-        model=COPIER_GOOGLE_MODEL,
-        contents=prompt,
-        config=copy_config,
-    )
+    with metrics.track_llm_call("copier", COPIER_GOOGLE_MODEL):
+        response = client.models.generate_content(
+            model=COPIER_GOOGLE_MODEL,
+            contents=prompt,
+            config=get_copy_config(),
+        )
+    metrics.record_gemini_usage("copier", COPIER_GOOGLE_MODEL, response)
     return json.loads(response.text)["new_passage"].strip()
 #------------------------------------------------------------------------------------------------------------------
 
@@ -52,20 +68,56 @@ Here is the original passage to process:
 {passage}
 """
 
-def shorten_text_llama(text: str, client) -> str:
+def shorten_text_llama(text: str, client, model: str = "meta-llama/llama-3.3-8b-instruct:free") -> str:
     prompt = passage_prompt_llama.format(passage=text)
     
-    completion = client.chat.completions.create(extra_body={},model="meta-llama/llama-3.3-8b-instruct:free",
-                                                messages=[{"role": "user","content": prompt}])
+    with metrics.track_llm_call("copier", model):
+        completion = client.chat.completions.create(extra_body={},model=model,
+                                                    messages=[{"role": "user","content": prompt}])
+    metrics.record_openai_usage("copier", model, completion)
     # Generate Q&A using the LLM
     result = completion.choices[0].message.content
     try:
-        return json.loads(result.text)["new_passage"].strip()
+        return json.loads(result)["new_passage"].strip()
     except Exception as e:
         logger.warning(f"Json formatting not found:{e}")
-        return result.text.replace("new_passage","").strip()
+        return result.replace("new_passage","").strip()
 #------------------------------------------------------------------------------------------------------------------
 
+def create_copier_router(backend: str = LLM_CLIENT_BACKEND) -> ProviderRouter:
+    # every google key is its own backend so a slow or failing key is routed around
+    google_clients = create_wrapped_clients_google(COPIER_MAX_ALLOWED_RPD, COPIER_MAX_ALLOWED_RPM, pool="copier",
+                                                   backend=backend, model=COPIER_GOOGLE_MODEL)
+    backends = [LLMBackend(f"google-{idx}", wrapper, shorten_text_goole_api)
+                for idx, wrapper in enumerate(google_clients.clients)]
+    if os.path.exists(PROVIDERS_CONFIG_PATH):
+        provider_config = config_loader(PROVIDERS_CONFIG_PATH) or {}
+        backends += create_openai_compatible_backends(provider_config.get("openai_compatible") or [], shorten_text_llama)
+    return ProviderRouter(backends,
+                          hedge_percentile=COPIER_HEDGE_PERCENTILE,
+                          hedge_max_fraction=COPIER_HEDGE_MAX_FRACTION,
+                          pool="copier")
+
+# built on first use, so importing the copier reads no keys and creates no clients
+_copier_router=None
+_copier_router_lock=threading.Lock()
+
+def get_copier_router() -> ProviderRouter:
+    global _copier_router
+    with _copier_router_lock:
+        if _copier_router is None:
+            _copier_router = create_copier_router()
+        return _copier_router
+
+def set_copier_router(router: ProviderRouter) -> None:
+    """Replace the copier router, e.g. with fake clients in benchmarks."""
+    global _copier_router
+    with _copier_router_lock:
+        _copier_router = router
+
+# identical chunks requested concurrently share one in-flight call
+copier_flight=SingleFlight("copier")
+
 def shorten_text(chunk: str) -> str:
-    client = google_clients.get_client()  # now using round-robin logic
-    return shorten_text_goole_api(chunk, client)
+    key = prompt_fingerprint(COPIER_GOOGLE_MODEL, passage_prompt_google.format(passage=chunk))
+    return copier_flight.do(key, get_copier_router().call, chunk)
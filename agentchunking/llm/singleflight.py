@@ -0,0 +1,58 @@
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable
+from loguru import logger
+
+
+def prompt_fingerprint(*parts: str) -> str:
+    """Stable fingerprint of a request (model name, prompt, ...)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one in-flight request.
+    The first caller runs the function, callers arriving while it is running wait
+    on the same future and receive its result (or exception).
+    Nothing is cached once the call finishes.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self.lock:
+            self.calls += 1
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.in_flight[key] = future
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            logger.debug(f"{self.name}: joined in-flight request {key[:12]}")
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+
+    def report(self) -> dict:
+        with self.lock:
+            return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self.in_flight)}
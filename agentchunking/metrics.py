@@ -0,0 +1,285 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+from loguru import logger
+from agentchunking import tracing
+import bisect
+import threading
+import time
+
+"""In-process metrics with a Prometheus text exposition endpoint.
+Recording is a dict lookup plus a lock-protected add, so instrumenting hot paths
+(tokenizer calls, DB statements) stays cheap. Nothing is exported until start_metrics_server is called.
+"""
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+TOKEN_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+ERROR_BUCKETS = (-0.2, -0.1, -0.05, -0.02, 0.0, 0.02, 0.05, 0.1, 0.2)
+
+LabelKey = Tuple[str, ...]
+
+
+def escape_label_value(value: str) -> str:
+    """Backslash, double quote and newline escaped as the Prometheus text format requires."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: Tuple[str, ...], values: LabelKey, extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label_value(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def key(self, labels: dict) -> LabelKey:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def expose(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self.lock:
+            return self.values.get(self.key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            return [f"{self.name}{format_labels(self.labelnames, key)} {value}" for key, value in self.values.items()]
+
+
+class Gauge(Metric):
+    """Gauge set directly or computed at scrape time from a registered function."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[LabelKey, float] = {}
+        self.functions: Dict[LabelKey, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float], **labels) -> None:
+        with self.lock:
+            self.functions[self.key(labels)] = fn
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            values = dict(self.values)
+            functions = dict(self.functions)
+        for key, fn in functions.items():
+            try:
+                values[key] = fn()
+            except Exception as exc:
+                logger.warning(f"Gauge {self.name} function failed: {exc}")
+        return [f"{self.name}{format_labels(self.labelnames, key)} {value}" for key, value in values.items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [per-bucket counts (last one is +Inf), sum]
+        self.values: Dict[LabelKey, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self.key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][idx] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self.values.items()}
+        lines = []
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                le_label = 'le="' + le + '"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def expose(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.expose()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# --------- Pipeline metrics ---------
+LLM_CALL_SECONDS = REGISTRY.histogram("agentchunking_llm_call_seconds", "LLM request latency.", ("stage", "model"))
+LLM_CALLS = REGISTRY.counter("agentchunking_llm_calls_total", "LLM requests by outcome.", ("stage", "model", "status"))
+LLM_TOKENS = REGISTRY.counter("agentchunking_llm_tokens_total", "Tokens reported in LLM usage metadata.", ("stage", "model", "kind"))
+LLM_PROMPT_TOKENS = REGISTRY.histogram("agentchunking_llm_prompt_tokens", "Prompt tokens per LLM request.", ("stage",), TOKEN_BUCKETS)
+KEY_RPM_HEADROOM = REGISTRY.gauge("agentchunking_key_rpm_headroom", "Requests left in the current minute per API key.", ("pool", "key"))
+KEY_RPD_HEADROOM = REGISTRY.gauge("agentchunking_key_rpd_headroom", "Requests left today per API key.", ("pool", "key"))
+TOKENIZER_SECONDS = REGISTRY.histogram("agentchunking_tokenizer_seconds", "Time per tokenizer call.", ("tokenizer",), FAST_BUCKETS)
+TOKEN_CHECKS = REGISTRY.counter("agentchunking_token_checks_total", "Token limit checks by how they were decided (estimate, exact, audit).", ("tokenizer", "decision"))
+TOKEN_ESTIMATE_ERROR = REGISTRY.histogram("agentchunking_token_estimate_relative_error", "(estimate - exact) / exact of the calibrated token estimator.", ("tokenizer",), ERROR_BUCKETS)
+TOKEN_BOUND_MISSES = REGISTRY.counter("agentchunking_token_bound_misses_total", "Exact token counts outside the estimated bounds.", ("tokenizer", "side"))
+DB_QUERY_SECONDS = REGISTRY.histogram("agentchunking_db_query_seconds", "Database statement time.", ("table", "operation"))
+DB_ROWS = REGISTRY.counter("agentchunking_db_rows_total", "Rows written or read by database operations.", ("table", "operation"))
+QUEUE_DEPTH = REGISTRY.gauge("agentchunking_queue_depth", "Items waiting in a pipeline stage.", ("stage",))
+ITEMS_PROCESSED = REGISTRY.counter("agentchunking_items_processed_total", "Items finished by a pipeline stage.", ("stage",))
+SLEEP_SECONDS = REGISTRY.counter("agentchunking_sleep_seconds_total", "Wall time spent sleeping (backoff, quota cooldown).", ("site",))
+
+
+def sleep(seconds: float, site: str) -> None:
+    """time.sleep that accounts the slept time under site."""
+    SLEEP_SECONDS.inc(seconds, site=site)
+    with tracing.span("sleep", site=site, seconds=seconds):
+        time.sleep(seconds)
+
+
+@contextmanager
+def track_llm_call(stage: str, model: str):
+    """Time an LLM request and count it as ok or error."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        LLM_CALLS.inc(stage=stage, model=model, status="error")
+        raise
+    finally:
+        LLM_CALL_SECONDS.observe(time.perf_counter() - start, stage=stage, model=model)
+    LLM_CALLS.inc(stage=stage, model=model, status="ok")
+
+
+def record_gemini_usage(stage: str, model: str, response) -> None:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_token_count", None) or 0
+    output = getattr(usage, "candidates_token_count", None) or 0
+    LLM_TOKENS.inc(prompt, stage=stage, model=model, kind="prompt")
+    LLM_TOKENS.inc(output, stage=stage, model=model, kind="output")
+    LLM_PROMPT_TOKENS.observe(prompt, stage=stage)
+    tracing.annotate(prompt_tokens=prompt, output_tokens=output, model=model)
+
+
+def record_openai_usage(stage: str, model: str, completion) -> None:
+    usage = getattr(completion, "usage", None)
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", None) or 0
+    output = getattr(usage, "completion_tokens", None) or 0
+    LLM_TOKENS.inc(prompt, stage=stage, model=model, kind="prompt")
+    LLM_TOKENS.inc(output, stage=stage, model=model, kind="output")
+    LLM_PROMPT_TOKENS.observe(prompt, stage=stage)
+    tracing.annotate(prompt_tokens=prompt, output_tokens=output, model=model)
+
+
+# --------- HTTP endpoint ---------
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.expose().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes would flood the pipeline logs
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1", registry: MetricsRegistry = REGISTRY) -> Optional[ThreadingHTTPServer]:
+    """
+    Serve the registry at http://host:port/metrics from a daemon thread.
+
+    Returns:
+        ThreadingHTTPServer | None: the server, None if the port could not be bound.
+    """
+    handler = type("BoundMetricsHandler", (MetricsHandler,), {"registry": registry})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as exc:
+        logger.warning(f"Metrics endpoint not started on {host}:{port}: {exc}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Serving metrics at http://{host}:{port}/metrics")
+    return server
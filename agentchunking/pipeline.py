@@ -0,0 +1,156 @@
+from agentchunking import metrics
+from typing import Any, Callable, Iterable, List, Optional
+from loguru import logger
+import queue
+import threading
+import time
+
+"""Staged streaming pipeline. Every stage runs as its own group of worker threads and the stages
+are connected by bounded queues: a full queue blocks the upstream put, so a fast stage (the loader)
+waits for a slow one (the copier) instead of piling the corpus up in memory.
+"""
+
+END = object()  # end of stream marker, passed on once every worker of a stage has finished
+
+
+class PipelineStopped(Exception):
+    pass
+
+
+class Stage:
+    """
+    One pipeline stage.
+
+    Args:
+        name (str): stage name, used in logs and metrics.
+        fn (callable): fn(item) -> iterable of output items (empty for a filter or a final stage).
+        workers (int): number of worker threads running fn concurrently.
+    """
+    def __init__(self, name: str, fn: Callable[[Any], Optional[Iterable[Any]]], workers: int = 1):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.items_in = 0
+        self.items_out = 0
+        self.busy_seconds = 0.0
+        self.finished_workers = 0
+        self.lock = threading.Lock()
+
+    def report(self) -> dict:
+        with self.lock:
+            return {"workers": self.workers, "in": self.items_in, "out": self.items_out,
+                    "busy_seconds": round(self.busy_seconds, 2)}
+
+
+class StreamingPipeline:
+    """
+    Runs source() -> stage 1 -> ... -> stage n with a bounded queue in front of every stage.
+    The first exception in any stage stops the whole pipeline and is re-raised by run().
+    """
+    def __init__(self, source: Callable[[], Iterable[Any]], stages: List[Stage], queue_size: int = 64, report_every: float = 60.0):
+        if not stages:
+            raise ValueError("StreamingPipeline needs at least one stage.")
+        self.source = source
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self.report_every = report_every
+        self.stop_event = threading.Event()
+        self.error = None
+        self.error_lock = threading.Lock()
+        for stage, stage_queue in zip(stages, self.queues):
+            metrics.QUEUE_DEPTH.set_function(stage_queue.qsize, stage=stage.name)
+
+    def fail(self, where: str, exc: BaseException) -> None:
+        with self.error_lock:
+            if self.error is None:
+                logger.error(f"Pipeline stage {where} failed: {exc}")
+                self.error = exc
+        self.stop_event.set()
+
+    def put(self, target: queue.Queue, item: Any) -> None:
+        # blocking put that still notices a stopped pipeline
+        while True:
+            if self.stop_event.is_set():
+                raise PipelineStopped()
+            try:
+                target.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def get(self, source: queue.Queue) -> Any:
+        while True:
+            if self.stop_event.is_set():
+                raise PipelineStopped()
+            try:
+                return source.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+    def run_source(self) -> None:
+        try:
+            for item in self.source():
+                self.put(self.queues[0], item)
+            self.put(self.queues[0], END)
+        except PipelineStopped:
+            pass
+        except BaseException as exc:
+            self.fail("source", exc)
+
+    def run_worker(self, idx: int) -> None:
+        stage = self.stages[idx]
+        inbox = self.queues[idx]
+        outbox = self.queues[idx + 1] if idx + 1 < len(self.stages) else None
+        try:
+            while True:
+                item = self.get(inbox)
+                if item is END:
+                    inbox.put(END)  # let the sibling workers see the end as well
+                    break
+                start = time.perf_counter()
+                produced = 0
+                for output in stage.fn(item) or ():
+                    produced += 1
+                    if outbox is not None:
+                        self.put(outbox, output)
+                with stage.lock:
+                    stage.items_in += 1
+                    stage.items_out += produced
+                    stage.busy_seconds += time.perf_counter() - start
+                metrics.ITEMS_PROCESSED.inc(stage=stage.name)
+            with stage.lock:
+                stage.finished_workers += 1
+                last = stage.finished_workers == stage.workers
+            if last and outbox is not None:
+                self.put(outbox, END)
+        except PipelineStopped:
+            pass
+        except BaseException as exc:
+            self.fail(stage.name, exc)
+
+    def report(self) -> dict:
+        return {stage.name: dict(stage.report(), queued=stage_queue.qsize())
+                for stage, stage_queue in zip(self.stages, self.queues)}
+
+    def run(self) -> dict:
+        """Run until the source is exhausted and every stage has drained, returns per-stage counters."""
+        threads = [threading.Thread(target=self.run_source, name="pipeline-source", daemon=True)]
+        for idx, stage in enumerate(self.stages):
+            threads += [threading.Thread(target=self.run_worker, args=(idx,), name=f"pipeline-{stage.name}-{w}", daemon=True)
+                        for w in range(stage.workers)]
+        run_start = time.time()
+        for thread in threads:
+            thread.start()
+
+        last_report = time.time()
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1.0)
+            if time.time() - last_report >= self.report_every:
+                logger.info(f"Pipeline progress after {time.time() - run_start:.0f}s: {self.report()}")
+                last_report = time.time()
+        if self.error is not None:
+            raise self.error
+        report = self.report()
+        logger.info(f"Pipeline finished in {time.time() - run_start:.1f}s: {report}")
+        return report
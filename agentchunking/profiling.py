@@ -0,0 +1,80 @@
+from collections import Counter
+from typing import List, Tuple
+from loguru import logger
+import os
+import sys
+import threading
+import time
+
+"""Opt-in sampling profiler. A daemon thread samples the Python stacks of all other threads
+every interval seconds and counts them as folded stacks ("frame;frame;frame count"), the input
+format of flamegraph.pl, speedscope and inferno.
+"""
+
+# frames of threads that are only waiting are left out unless include_idle is set
+IDLE_FRAMES = {"threading:wait", "queue:get", "selectors:select", "socketserver:serve_forever", "thread:_worker"}
+
+
+def frame_label(frame) -> str:
+    module = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]
+    return f"{module}:{frame.f_code.co_name}"
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.01, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks = Counter()
+        self.samples = 0
+        self.running = False
+        self.thread = None
+
+    def sample(self) -> None:
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            if not self.include_idle and frame_label(frame) in IDLE_FRAMES:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(thread_id, "thread"))
+            self.stacks[";".join(reversed(labels))] += 1
+        self.samples += 1
+
+    def run(self) -> None:
+        while self.running:
+            self.sample()
+            time.sleep(self.interval)
+
+    def start(self) -> "SamplingProfiler":
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="sampling-profiler", daemon=True)
+        self.thread.start()
+        logger.info(f"Sampling profiler started, interval {self.interval * 1000:.0f}ms")
+        return self
+
+    def stop(self) -> None:
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+
+    def top(self, n: int = 15) -> List[Tuple[str, float]]:
+        """Functions by inclusive share of samples (the hottest stages)."""
+        inclusive = Counter()
+        total = sum(self.stacks.values())
+        for stack, count in self.stacks.items():
+            for label in set(stack.split(";")[1:]):
+                inclusive[label] += count
+        return [(label, count / total) for label, count in inclusive.most_common(n)] if total else []
+
+    def write_folded(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as handle:
+            for stack, count in self.stacks.most_common():
+                handle.write(f"{stack} {count}\n")
+        logger.info(f"Wrote {len(self.stacks)} folded stacks from {self.samples} samples to {path}")
+        return path
@@ -0,0 +1,134 @@
+from agentchunking.constants import (EMBEDDING_QUERY_PREFIX,
+                                     RETRIEVAL_QUERY_CACHE_SIZE,
+                                     RETRIEVAL_RESULT_CACHE_SIZE,
+                                     RETRIEVAL_CANDIDATES)
+from agentchunking.lexicalIndex import reciprocal_rank_fusion
+from collections import OrderedDict
+from typing import Any, List, Optional
+import threading
+
+
+class LRUCache:
+    """Thread-safe least recently used cache with hit/miss counters."""
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[Any]:
+        with self.lock:
+            if key in self.data:
+                self.data.move_to_end(key)
+                self.hits += 1
+                return self.data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value) -> None:
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def report(self) -> dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {"size": len(self.data), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0}
+
+
+class RetrievalService:
+    """
+    Query path over the segment stores: embeds the query with the e5 "query: " prefix,
+    runs vector and/or BM25 search, fuses the rankings and hydrates text and metadata from the database.
+    Query embeddings and final result sets are kept in LRU caches, result sets are keyed by the
+    generation of the stores so a sync that adds or replaces documents retires them.
+    """
+    def __init__(self,
+                 db,
+                 embedder=None,
+                 vector_store=None,
+                 lexical_index=None,
+                 query_cache_size: int = RETRIEVAL_QUERY_CACHE_SIZE,
+                 result_cache_size: int = RETRIEVAL_RESULT_CACHE_SIZE):
+        if vector_store is None and lexical_index is None:
+            raise ValueError("RetrievalService needs a vector store, a lexical index or both.")
+        if vector_store is not None and embedder is None:
+            raise ValueError("Vector search needs an embedder for the queries.")
+        self.db = db
+        self.embedder = embedder
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        self.query_cache = LRUCache(query_cache_size)
+        self.result_cache = LRUCache(result_cache_size)
+
+    def embed_query(self, query: str):
+        vector = self.query_cache.get(query)
+        if vector is None:
+            vector = self.embedder.embed([query], prefix=EMBEDDING_QUERY_PREFIX)[0]
+            self.query_cache.put(query, vector)
+        return vector
+
+    def rank(self, query: str, k: int, mode: str) -> list:
+        candidates = max(k, RETRIEVAL_CANDIDATES)
+        rankings = []
+        if mode in ("vector", "hybrid") and self.vector_store is not None:
+            rankings.append(self.vector_store.search(self.embed_query(query), candidates))
+        if mode in ("lexical", "hybrid") and self.lexical_index is not None:
+            rankings.append(self.lexical_index.search(query, candidates))
+        if not rankings:
+            raise ValueError(f"No store available for search mode {mode!r}")
+        if len(rankings) == 1:
+            return rankings[0][:k]
+        return reciprocal_rank_fusion(rankings, top_k=k)
+
+    def hydrate(self, ranked: list) -> List[dict]:
+        """Fetch segment text (one tuple IN query) and passage metadata (one = ANY query) for ranked (key, score) pairs."""
+        if not ranked:
+            return []
+        segments = self.db.segmentation_table.select_by_keys(["passage_id", "start", "end"], [key for key, _ in ranked],
+                                                             ["passage_id", "start", "end", "text", "data"])
+        texts = {(pid, int(start), int(end)): (text, data)
+                 for pid, start, end, text, data in zip(segments["passage_id"], segments["start"], segments["end"],
+                                                        segments["text"], segments["data"])}
+        passage_ids = list({pid for (pid, _, _), _ in ranked})
+        metadata = self.db.annotation_table.get_data_by_ids("annotation_data_id", passage_ids, ["url", "site_name", "passage_heading"])
+
+        results = []
+        for key, score in ranked:
+            if key not in texts:
+                continue  # segment was replaced since the stores were built
+            text, data = texts[key]
+            info = metadata.get(key[0], {})
+            results.append({"passage_id": key[0], "start": key[1], "end": key[2], "score": float(score),
+                            "text": data or text, "original_text": text,
+                            "url": info.get("url"), "topic": info.get("site_name"), "heading": info.get("passage_heading")})
+        return results
+
+    def store_generation(self) -> tuple:
+        return tuple(store.generation for store in (self.vector_store, self.lexical_index) if store is not None)
+
+    def search(self, query: str, k: int = 10, mode: str = "hybrid") -> List[dict]:
+        """
+        Retrieve the top-k segments for a query.
+
+        Args:
+            query (str): user query.
+            k (int): number of segments to return.
+            mode (str): "vector", "lexical" or "hybrid" (reciprocal rank fusion of both).
+
+        Returns:
+            list[dict]: segments with score, text (rewritten if available), url, topic and heading.
+        """
+        cache_key = (query, k, mode, self.store_generation())
+        results = self.result_cache.get(cache_key)
+        if results is None:
+            results = self.hydrate(self.rank(query, k, mode))
+            self.result_cache.put(cache_key, results)
+        return results
+
+    def report(self) -> dict:
+        return {"query_cache": self.query_cache.report(), "result_cache": self.result_cache.report()}
@@ -0,0 +1,136 @@
+from agentchunking.constants import (REWRITER_GOOGLE_MODEL,
+                                     REWRITER_MAX_ALLOWED_RPD,
+                                     REWRITER_MAX_ALLOWED_RPM,
+                                     REWRITER_WORKERS,
+                                     REWRITER_BATCH_SIZE,
+                                     REWRITER_PACKING,
+                                     REWRITER_PACK_MAX_TOKENS,
+                                     REWRITER_PACK_MAX_SEGMENTS)
+from agentchunking.clientManagement import create_wrapped_clients_google
+from agentchunking.llm.rewriter import rewrite_passage,rewrite_packed_passages
+from agentchunking.dataLoader import count_llama_tokens
+from agentchunking.utils.texthelpers import clean_bangla_text
+from agentchunking import metrics
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+import time
+
+
+def attach_context(db, batch) -> list[dict]:
+    """Join a batch of segments with topic/heading from annotation_table."""
+    passage_ids = batch["passage_id"].unique().tolist()
+    context = db.annotation_table.get_data_by_ids("annotation_data_id", passage_ids, ["site_name", "passage_heading"])
+    segments = []
+    for segment in batch.to_dict(orient="records"):
+        info = context.get(segment["passage_id"])
+        if info is None:
+            logger.warning(f"No annotation found for passage {segment['passage_id']}, skipping")
+            continue
+        segment["topic"] = clean_bangla_text(info["site_name"] or "")
+        segment["heading"] = clean_bangla_text(info["passage_heading"] or "")
+        segments.append(segment)
+    return segments
+
+
+def rewrite_segment(segment: dict, clients):
+    return rewrite_passage(segment["topic"], segment["heading"], segment["text"], clients)
+
+
+def pack_segments(segments: list[dict],
+                  max_tokens: int = REWRITER_PACK_MAX_TOKENS,
+                  max_segments: int = REWRITER_PACK_MAX_SEGMENTS) -> list[list[dict]]:
+    """Group segments sharing topic/heading into packs that fit the llama token budget."""
+    groups = {}
+    for segment in segments:
+        groups.setdefault((segment["topic"], segment["heading"]), []).append(segment)
+
+    packs = []
+    for group in groups.values():
+        pack, pack_tokens = [], 0
+        for segment in group:
+            tokens = count_llama_tokens(segment["text"])
+            if pack and (pack_tokens + tokens > max_tokens or len(pack) >= max_segments):
+                packs.append(pack)
+                pack, pack_tokens = [], 0
+            pack.append(segment)
+            pack_tokens += tokens
+        if pack:
+            packs.append(pack)
+    return packs
+
+
+def rewrite_pack(pack: list[dict], clients) -> list:
+    """Rewrite a pack with one request, falling back to single-segment requests for
+    segments the packed response did not return valid output for."""
+    if len(pack) == 1:
+        return [rewrite_segment(pack[0], clients)]
+    local_ids = [f"s{idx + 1}" for idx in range(len(pack))]
+    rewritten = rewrite_packed_passages(pack[0]["topic"], pack[0]["heading"],
+                                        [(local_id, seg["text"]) for local_id, seg in zip(local_ids, pack)],
+                                        clients)
+    if len(rewritten) < len(pack):
+        logger.warning(f"Packed rewrite returned {len(rewritten)}/{len(pack)} valid segments, falling back for the rest")
+    return [rewritten[local_id] if local_id in rewritten else rewrite_segment(seg, clients)
+            for local_id, seg in zip(local_ids, pack)]
+
+
+def rewrite_pending_segments(db,
+                             workers: int = REWRITER_WORKERS,
+                             batch_size: int = REWRITER_BATCH_SIZE,
+                             packing: bool = REWRITER_PACKING) -> int:
+    """
+    Rewrites every segment whose data is still empty and writes the results back in batches.
+    Progress lives in segmentation_table itself, so an interrupted run resumes where it stopped.
+
+    Args:
+        db (SQLDatabaseManager): database manager.
+        workers (int): number of concurrent rewrite requests.
+        batch_size (int): number of segments fetched and written back per batch.
+        packing (bool): pack segments sharing topic/heading into one request.
+
+    Returns:
+        int: number of rewritten segments.
+    """
+    clients = create_wrapped_clients_google(REWRITER_MAX_ALLOWED_RPD, REWRITER_MAX_ALLOWED_RPM, pool="rewriter", model=REWRITER_GOOGLE_MODEL)
+    rewritten_total = 0
+    failed_total = 0
+    run_start = time.time()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in db.segmentation_table.select_iter(columns=["passage_id", "start", "end", "text"],
+                                                       condition_dict={"data": ""},
+                                                       batch_size=batch_size):
+            segments = attach_context(db, batch)
+            batch_start = time.time()
+            packs = pack_segments(segments) if packing else [[seg] for seg in segments]
+            futures = [executor.submit(rewrite_pack, pack, clients) for pack in packs]
+            metrics.QUEUE_DEPTH.set(len(segments), stage="rewriter")
+            updates = []
+            out_of_quota = False
+            for pack, future in zip(packs, futures):
+                try:
+                    results = future.result()
+                except RuntimeError:
+                    # raised by the client manager once every key is out of quota
+                    out_of_quota = True
+                    continue
+                finally:
+                    metrics.QUEUE_DEPTH.dec(len(pack), stage="rewriter")
+                for seg, rewritten in zip(pack, results):
+                    if rewritten:
+                        updates.append({"passage_id": seg["passage_id"], "start": seg["start"], "end": seg["end"], "data": rewritten})
+            db.segmentation_table.bulk_update(["passage_id", "start", "end"], updates)
+            metrics.ITEMS_PROCESSED.inc(len(updates), stage="rewriter")
+
+            rewritten_total += len(updates)
+            failed_total += len(segments) - len(updates)
+            batch_time = time.time() - batch_start
+            total_time = time.time() - run_start
+            logger.info(f"Rewrote {len(updates)}/{len(segments)} segments with {len(packs)} packs in {batch_time:.1f}s "
+                        f"({60 * len(updates) / max(batch_time, 1e-6):.1f} segments/min), "
+                        f"total {rewritten_total} at {60 * rewritten_total / max(total_time, 1e-6):.1f} segments/min, "
+                        f"{failed_total} failed")
+            if out_of_quota:
+                logger.error("Stopping rewrite stage: no client with remaining quota.")
+                break
+    return rewritten_total
@@ -0,0 +1,118 @@
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+
+"""Columnar container of segmentation_table rows. The splitter, the loader and the sink pass
+segments around as one SegmentBatch (a list per text column, int arrays for the word offsets)
+instead of one dict per segment, and the database layer inserts its row tuples directly.
+Indexing and iteration still give {"passage_id", "text", "start", "end", "data"} dicts for the
+code that looks at single segments.
+"""
+
+COLUMNS = ("passage_id", "text", "start", "end", "data")
+
+
+class SegmentBatch:
+    def __init__(self,
+                 passage_id: Optional[List[str]] = None,
+                 text: Optional[List[str]] = None,
+                 start: Optional[Iterable[int]] = None,
+                 end: Optional[Iterable[int]] = None,
+                 data: Optional[List[str]] = None) -> None:
+        self.passage_id = list(passage_id) if passage_id is not None else []
+        self.text = list(text) if text is not None else []
+        self.start = np.asarray(start if start is not None else [], dtype=np.int64)
+        self.end = np.asarray(end if end is not None else [], dtype=np.int64)
+        self.data = list(data) if data is not None else [""] * len(self.passage_id)
+        if not len(self.passage_id) == len(self.text) == len(self.start) == len(self.end) == len(self.data):
+            raise ValueError("SegmentBatch columns differ in length.")
+        # rows appended one at a time are buffered and folded into the arrays on demand
+        self.pending_start: List[int] = []
+        self.pending_end: List[int] = []
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "SegmentBatch":
+        if isinstance(records, SegmentBatch):
+            return records
+        batch = cls()
+        for record in records:
+            batch.append(record["passage_id"], record["text"], record["start"], record["end"], record.get("data", ""))
+        return batch
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> "SegmentBatch":
+        """Segments from a segmentation_table DataFrame, column by column."""
+        return cls(frame["passage_id"].tolist(), frame["text"].tolist(),
+                   frame["start"].to_numpy(), frame["end"].to_numpy(),
+                   frame["data"].tolist() if "data" in frame else None)
+
+    @classmethod
+    def whole_passages(cls, passage_ids: List[str], texts: List[str], word_counts: Optional[Iterable[int]] = None) -> "SegmentBatch":
+        """One segment per passage kept as it is (start 0, end = word count, like the loader always wrote)."""
+        if word_counts is None:
+            word_counts = [len(text.split()) for text in texts]
+        return cls(passage_ids, texts, np.zeros(len(passage_ids), dtype=np.int64), word_counts)
+
+    @classmethod
+    def concat(cls, batches: Iterable["SegmentBatch"]) -> "SegmentBatch":
+        batches = [cls.from_records(batch) for batch in batches]
+        for batch in batches:
+            batch.flush()
+        return cls([pid for batch in batches for pid in batch.passage_id],
+                   [text for batch in batches for text in batch.text],
+                   np.concatenate([batch.start for batch in batches]) if batches else None,
+                   np.concatenate([batch.end for batch in batches]) if batches else None,
+                   [data for batch in batches for data in batch.data])
+
+    def append(self, passage_id: str, text: str, start: int, end: int, data: str = "") -> None:
+        self.passage_id.append(passage_id)
+        self.text.append(text)
+        self.pending_start.append(int(start))
+        self.pending_end.append(int(end))
+        self.data.append(data)
+
+    def flush(self) -> None:
+        if self.pending_start:
+            self.start = np.concatenate([self.start, np.asarray(self.pending_start, dtype=np.int64)])
+            self.end = np.concatenate([self.end, np.asarray(self.pending_end, dtype=np.int64)])
+            self.pending_start, self.pending_end = [], []
+
+    def __len__(self) -> int:
+        return len(self.passage_id)
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[dict, "SegmentBatch"]:
+        self.flush()
+        if isinstance(key, slice):
+            return SegmentBatch(self.passage_id[key], self.text[key], self.start[key], self.end[key], self.data[key])
+        return {"passage_id": self.passage_id[key], "text": self.text[key],
+                "start": int(self.start[key]), "end": int(self.end[key]), "data": self.data[key]}
+
+    def __iter__(self) -> Iterator[dict]:
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def __add__(self, other) -> "SegmentBatch":
+        return SegmentBatch.concat([self, other])
+
+    def __radd__(self, other) -> "SegmentBatch":
+        return SegmentBatch.concat([other, self])
+
+    def passage_ids(self) -> List[str]:
+        """Distinct passage ids in order of appearance."""
+        return list(dict.fromkeys(self.passage_id))
+
+    def rows(self) -> Iterator[Tuple]:
+        """Row tuples in COLUMNS order, the parameter format of psycopg2 execute_values."""
+        self.flush()
+        return zip(self.passage_id, self.text, self.start.tolist(), self.end.tolist(), self.data)
+
+    def to_records(self) -> List[dict]:
+        return list(self)
+
+    def to_frame(self) -> pd.DataFrame:
+        self.flush()
+        return pd.DataFrame({"passage_id": self.passage_id, "text": self.text,
+                             "start": self.start, "end": self.end, "data": self.data})
+
+    def __repr__(self) -> str:
+        return f"SegmentBatch(segments={len(self)}, passages={len(set(self.passage_id))})"
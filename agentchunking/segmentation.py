@@ -1,19 +1,32 @@
-from agentchunking.constants import EMBDEEING_MODEL,COPIER_MAX_ALLOWED_RPM
+from agentchunking.constants import (EMBDEEING_MODEL,COPIER_MAX_ALLOWED_RPM,SECTION_MIN_PASSAGE_WORDS,SECTION_MIN_WORDS,
+                                     SECTION_WORKERS,SECTION_HEADING_MAX_WORDS)
 from transformers import AutoTokenizer
 from typing import List,Tuple
 from agentchunking.llm.shortner import shorten_text
+from agentchunking.segmentBatch import SegmentBatch
+from agentchunking.tokenEstimator import TokenLimit, load_token_estimator
+from agentchunking import metrics
+from agentchunking import tracing
 from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 from loguru import logger
 import time
 from datetime import datetime, timedelta
+import hashlib
+import json
 
 e5_tokenizer = AutoTokenizer.from_pretrained(EMBDEEING_MODEL)
 
 def count_e5_tokens(text: str) -> int:
-    tokens = e5_tokenizer.encode(text, add_special_tokens=True)
+    with metrics.TOKENIZER_SECONDS.time(tokenizer="e5"):
+        tokens = e5_tokenizer.encode(text, add_special_tokens=True)
     return len(tokens)
 
 
+e5_limit = TokenLimit("e5", count_e5_tokens, load_token_estimator("e5"))
+
+
 
 # # Initialize counters and timer
 # copier_request_count = 0
@@ -37,27 +50,64 @@ def count_e5_tokens(text: str) -> int:
 #     copier_request_count += 1
 
 
-def semantic_text_splitter(passage: str,
-                           passage_id:str,
-                           max_tokens: int = 500,
-                           step_words: int = 10
-) -> List[Tuple[str, int, int]]:
-    words = passage.split()
+def next_window_end(words: List[str], start: int, max_tokens: int = 500, step_words: int = 10, prefix=None) -> int:
+    """Grow a window from start in chunks of step_words until the e5 token limit and return its end.
+    With prefix (e5_limit.prefix(words)) the growth checks come from the calibrated estimate where it is
+    conclusive; the returned window is confirmed with the exact tokenizer, since e5 truncates past the limit."""
     total = len(words)
-    start = 0
-    segments: List[Tuple[str, int, int]] = []
-
-    while start < total:
-        end = start
-        # grow window in chunks of step_words until token limit
-        while end < total and count_e5_tokens(" ".join(words[start:end + 1])) <= max_tokens:
-            end += step_words
-        # if we overshot, back off one chunk
-        if end > start and count_e5_tokens(" ".join(words[start:end])) > max_tokens:
-            end -= step_words
-        # ensure at least one word
-        if end == start:
-            end = start + 1
+    end = start
+    # grow window in chunks of step_words until token limit
+    while end < total and e5_limit.window_within(words, start, end + 1, max_tokens, prefix):
+        end += step_words
+    # if we overshot, back off one chunk
+    if end > start and not e5_limit.window_within(words, start, end, max_tokens, prefix):
+        end -= step_words
+    # one exact count per window: the estimated bounds miss a small share of windows
+    while prefix is not None and end - start > 1 and not e5_limit.window_within(words, start, end, max_tokens):
+        end = max(start + 1, end - step_words)
+    # ensure at least one word
+    if end == start:
+        end = start + 1
+    return end
+
+
+def span_hash(words: List[str], start: int, end: int) -> str:
+    return hashlib.sha1(" ".join(words[start:end + 1]).encode("utf-8")).hexdigest()
+
+
+def span_hashes(passage: str, segments) -> str:
+    """passage_state_table.span_hashes of a segmentation: json [[start, end, sha1 of the source words], ...]."""
+    words = passage.split()
+    return json.dumps([[segment["start"], segment["end"], span_hash(words, segment["start"], segment["end"])]
+                       for segment in SegmentBatch.from_records(segments)])
+
+
+def reusable_segments(passage: str, old_segments, stored_hashes: str) -> SegmentBatch:
+    """Leading segments of a previous segmentation whose source words are unchanged in the edited passage.
+    The stored segment text is copier output, so spans are matched by the hash of the words they were
+    copied from (stored_hashes, see span_hashes). Their copier output is reused instead of calling the LLM again."""
+    old_segments = SegmentBatch.from_records(old_segments)
+    old_segments.flush()  # appended records are pending until flushed, start must cover all of them
+    hashes = {(start, end): digest for start, end, digest in json.loads(stored_hashes)} if stored_hashes else {}
+    words = passage.split()
+    reused = SegmentBatch()
+    expected_start = 0
+    for idx in old_segments.start.argsort(kind="stable"):
+        segment = old_segments[int(idx)]
+        if segment["start"] != expected_start or segment["end"] >= len(words):
+            break
+        if hashes.get((segment["start"], segment["end"])) != span_hash(words, segment["start"], segment["end"]):
+            break
+        reused.append(**segment)
+        expected_start = segment["end"] + 1
+    return reused
+
+
+def copy_next_segment(words: List[str], start: int, passage_id: str, max_tokens: int, step_words: int, prefix=None) -> dict:
+    """Grow the window at start and let the copier cut it at a natural breaking point."""
+    with tracing.span("chunk", start_word=start) as chunk_span:
+        with tracing.span("window_growth"):
+            end = next_window_end(words, start, max_tokens, step_words, prefix)
 
         chunk = " ".join(words[start:end])
         #enforce_copier_rpm()
@@ -69,11 +119,99 @@ def semantic_text_splitter(passage: str,
                 text_shortened=True
             except Exception as e: 
                 text_shortened=False
+                chunk_span.increment("retries")
                 logger.info(f"-----chunk\n\n{chunk}\n\n--------------")
                 logger.warning("Sleeping for 60 seconds before retrying with next client...")
-                time.sleep(60)  # wait before retrying
+                metrics.sleep(60, site="copier_retry")  # wait before retrying
+
+        # never past the end of words, which is the end of the section when a passage is sectioned
+        copied = min(len(shortened.split()), len(words) - start)
+        chunk_span.set(window_words=end - start, copied_words=copied)
+    metrics.ITEMS_PROCESSED.inc(stage="copier")
+    return {"passage_id":passage_id,"text":shortened, "start":start, "end":start + copied - 1,"data":''}
 
-        current_start=start
-        start += len(shortened.split())
-        segments.append({"passage_id":passage_id,"text":shortened, "start":current_start, "end":start - 1,"data":''})
+
+def is_heading(line: str, max_words: int = SECTION_HEADING_MAX_WORDS) -> bool:
+    line = line.strip()
+    return line.startswith("#") or (len(line.split()) <= max_words and not line.endswith(("।", ".", "?", "!", ":", ";", ",", "|")))
+
+
+def passage_sections(passage: str, min_words: int = SECTION_MIN_WORDS) -> List[Tuple[int, int]]:
+    """
+    Cut a passage into independent sections at strong local boundaries: blank lines between paragraphs
+    and heading lines. Paragraphs are grouped until a section has at least min_words words.
+
+    Returns:
+        list of (start, end): word ranges [start, end) over passage.split(), covering the whole passage.
+    """
+    boundaries = []
+    offset = 0
+    after_blank = False
+    for line in passage.split("\n"):
+        count = len(line.split())
+        if count == 0:
+            after_blank = True
+            continue
+        if offset > 0 and (after_blank or is_heading(line)):
+            boundaries.append(offset)
+        after_blank = False
+        offset += count
+
+    sections = []
+    section_start = 0
+    for boundary in boundaries:
+        if boundary - section_start >= min_words and offset - boundary >= min_words:
+            sections.append((section_start, boundary))
+            section_start = boundary
+    sections.append((section_start, offset))
+    return sections
+
+
+def split_section(words: List[str], start: int, end: int, passage_id: str, max_tokens: int, step_words: int, prefix=None) -> SegmentBatch:
+    """Sequential copier loop over words[start:end]; offsets stay global to the passage."""
+    words = words[:end]
+    segments = SegmentBatch()
+    while start < end:
+        segment = copy_next_segment(words, start, passage_id, max_tokens, step_words, prefix)
+        start = segment["end"] + 1
+        segments.append(**segment)
     return segments
+
+
+def semantic_text_splitter(passage: str,
+                           passage_id:str,
+                           max_tokens: int = 500,
+                           step_words: int = 10,
+                           start_word: int = 0,
+                           section_workers: int = SECTION_WORKERS
+) -> SegmentBatch:
+    """
+    Segment a passage with the copier. Long passages are first cut into sections (passage_sections)
+    that are segmented concurrently, a segment never crosses a section boundary.
+
+    Args:
+        passage (str): passage text.
+        passage_id (str): passage id of the segments.
+        max_tokens (int): e5 token limit of a copier window.
+        step_words (int): window growth step.
+        start_word (int): first word to segment (the words before it are already segmented).
+        section_workers (int): sections segmented concurrently, 1 segments everything sequentially.
+
+    Returns:
+        SegmentBatch: segments ordered by start, with start/end word offsets into passage.split().
+    """
+    words = passage.split()
+    total = len(words)
+    prefix = e5_limit.prefix(words)
+    if section_workers <= 1 or total - start_word < SECTION_MIN_PASSAGE_WORDS:
+        return split_section(words, start_word, total, passage_id, max_tokens, step_words, prefix)
+
+    sections = [(max(start, start_word), end) for start, end in passage_sections(passage) if end > start_word]
+    if len(sections) == 1:
+        return split_section(words, start_word, total, passage_id, max_tokens, step_words, prefix)
+    tracing.annotate(sections=len(sections))
+    with ThreadPoolExecutor(max_workers=min(section_workers, len(sections)), thread_name_prefix=f"sections-{passage_id}") as executor:
+        # each section runs in a copy of the caller's context, so its chunk spans nest under the passage span
+        futures = [executor.submit(contextvars.copy_context().run, split_section, words, start, end, passage_id, max_tokens, step_words, prefix)
+                   for start, end in sections]
+        return SegmentBatch.concat([future.result() for future in futures])
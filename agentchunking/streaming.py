@@ -0,0 +1,108 @@
+from agentchunking.constants import (PIPELINE_QUEUE_SIZE,
+                                     PIPELINE_LOADER_BATCH_SIZE,
+                                     PIPELINE_SPLITTER_WORKERS,
+                                     PIPELINE_COPIER_WORKERS,
+                                     PIPELINE_SINK_WORKERS,
+                                     PIPELINE_REWRITER_WORKERS,
+                                     REWRITER_GOOGLE_MODEL,
+                                     REWRITER_MAX_ALLOWED_RPD,
+                                     REWRITER_MAX_ALLOWED_RPM)
+from agentchunking.dataLoader import iter_current_data, prepare_passages, passage_state
+from agentchunking.segmentation import semantic_text_splitter, reusable_segments
+from agentchunking.pipeline import Stage, StreamingPipeline
+from agentchunking.segmentBatch import SegmentBatch
+from agentchunking.utils.texthelpers import clean_bangla_text
+from agentchunking import tracing
+from datetime import datetime
+from loguru import logger
+
+
+def run_streaming_segmentation(db,
+                               rewrite: bool = False,
+                               loader_batch_size: int = PIPELINE_LOADER_BATCH_SIZE,
+                               queue_size: int = PIPELINE_QUEUE_SIZE,
+                               splitter_workers: int = PIPELINE_SPLITTER_WORKERS,
+                               copier_workers: int = PIPELINE_COPIER_WORKERS,
+                               sink_workers: int = PIPELINE_SINK_WORKERS,
+                               rewriter_workers: int = PIPELINE_REWRITER_WORKERS) -> dict:
+    """
+    Segment (and optionally rewrite) every new or edited passage as a streaming pipeline:
+
+        loader   -> batches of new/edited passages streamed from annotation_table
+        splitter -> token counts, passages short enough to keep as they are get their single segment
+        copier   -> LLM segmentation of the long passages (the slow stage, most workers)
+        sink     -> atomic replace of the passage's segments and state
+        rewriter -> rewrite of the written segments (only with rewrite=True)
+
+    Args:
+        db (SQLDatabaseManager): database manager.
+        rewrite (bool): add the rewriter stage after the sink.
+        loader_batch_size (int): annotation rows per loader batch.
+        queue_size (int): capacity of every inter-stage queue.
+        *_workers (int): worker threads per stage.
+
+    Returns:
+        dict: per stage counters (items in/out, busy seconds).
+    """
+    def load():
+        return iter_current_data(db, loader_batch_size)
+
+    def split(batch):
+        batch = prepare_passages(batch)
+        for _, row in batch.iterrows():
+            segments = None
+            if row["use_as_it_is"]:
+                segments = SegmentBatch.whole_passages([row["id"]], [row["text"]])
+            yield row, segments
+
+    def copy(item):
+        row, segments = item
+        if segments is None:
+            with tracing.span("passage", passage_id=row["id"], words=int(row["word_count"]), resegment=bool(row["resegment"])):
+                if row["resegment"]:
+                    old_segments = SegmentBatch.from_frame(db.segmentation_table.select(condition_dict={"passage_id": row["id"]}))
+                    old_state = db.passage_state_table.select_columns(["span_hashes"], condition_dict={"passage_id": row["id"]})
+                    reused = reusable_segments(row["text"], old_segments, old_state["span_hashes"].iloc[0] if len(old_state) else "")
+                    start_word = reused[-1]["end"] + 1 if reused else 0
+                    segments = reused + semantic_text_splitter(row["text"], row["id"], start_word=start_word)
+                else:
+                    segments = semantic_text_splitter(row["text"], row["id"])
+        yield row, segments
+
+    def sink(item):
+        row, segments = item
+        db.replace_passage_segments([row["id"]], segments, [passage_state(row, datetime.now(), segments)])
+        if rewrite:
+            yield row, segments
+
+    stages = [Stage("splitter", split, splitter_workers),
+              Stage("copier", copy, copier_workers),
+              Stage("sink", sink, sink_workers)]
+
+    if rewrite:
+        from agentchunking.clientManagement import create_wrapped_clients_google
+        from agentchunking.rewriting import pack_segments, rewrite_pack
+        clients = create_wrapped_clients_google(REWRITER_MAX_ALLOWED_RPD, REWRITER_MAX_ALLOWED_RPM, pool="rewriter", model=REWRITER_GOOGLE_MODEL)
+
+        def rewrite_stage(item):
+            row, segments = item
+            topic, heading = clean_bangla_text(row["topic"] or ""), clean_bangla_text(row["heading"] or "")
+            pending = [dict(seg, topic=topic, heading=heading) for seg in segments if not seg.get("data")]
+            updates = []
+            for pack in pack_segments(pending):
+                try:
+                    results = rewrite_pack(pack, clients)
+                except RuntimeError as exc:
+                    # out of rewriter quota: the segments stay pending for rewrite.py
+                    logger.warning(f"Rewrite skipped for passage {row['id']}: {exc}")
+                    continue
+                for seg, rewritten in zip(pack, results):
+                    if rewritten:
+                        updates.append({"passage_id": seg["passage_id"], "start": seg["start"], "end": seg["end"], "data": rewritten})
+            db.segmentation_table.bulk_update(["passage_id", "start", "end"], updates)
+            return ()
+
+        stages.append(Stage("rewriter", rewrite_stage, rewriter_workers))
+
+    logger.info("Starting streaming pipeline: " + ", ".join(f"{s.name} x{s.workers}" for s in stages))
+    return StreamingPipeline(load, stages, queue_size=queue_size).run()
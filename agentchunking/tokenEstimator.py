@@ -0,0 +1,166 @@
+from agentchunking.constants import (TOKEN_ESTIMATOR_PATH, TOKEN_ESTIMATE_QUANTILE, TOKEN_ESTIMATE_AUDIT_EVERY,
+                                     TOKEN_ESTIMATE_HARD_MARGIN)
+from agentchunking import metrics
+from typing import Callable, List, Optional, Tuple
+from loguru import logger
+import numpy as np
+import itertools
+import json
+import os
+import re
+
+"""Calibrated token estimates for Bengali/English text. A linear model over character class and word
+counts, fitted on exact e5 / Llama counts of a corpus sample, gives an estimate with lower and upper
+bounds. TokenLimit answers "count_tokens(text) <= limit" from the bounds and only runs the exact
+tokenizer when they straddle the limit.
+"""
+
+FEATURES = ("bengali_chars", "latin_chars", "digits", "other_chars", "words")
+BENGALI = re.compile(r"[\u0980-\u09FF]")
+LATIN = re.compile(r"[A-Za-z]")
+DIGITS = re.compile(r"[0-9]")
+SPACE = re.compile(r"\s")
+
+
+def word_features(word: str) -> List[int]:
+    bengali = len(BENGALI.findall(word))
+    latin = len(LATIN.findall(word))
+    digits = len(DIGITS.findall(word))
+    return [bengali, latin, digits, len(word) - bengali - latin - digits, 1]
+
+
+def text_features(text: str) -> np.ndarray:
+    """FEATURES of a text; whitespace only separates words (the tokenizers do not count it)."""
+    bengali = len(BENGALI.findall(text))
+    latin = len(LATIN.findall(text))
+    digits = len(DIGITS.findall(text))
+    chars = len(text) - len(SPACE.findall(text))
+    return np.array([bengali, latin, digits, chars - bengali - latin - digits, len(text.split())], dtype=np.float64)
+
+
+def prefix_features(words: List[str]) -> np.ndarray:
+    """Cumulative FEATURES over words: the features of " ".join(words[a:b]) are prefix[b] - prefix[a]."""
+    prefix = np.zeros((len(words) + 1, len(FEATURES)), dtype=np.float64)
+    if words:
+        np.cumsum(np.array([word_features(word) for word in words], dtype=np.float64), axis=0, out=prefix[1:])
+    return prefix
+
+
+class TokenEstimator:
+    """
+    tokens ~= coef . features + intercept, bounds: estimate * [low_ratio, high_ratio] -/+ slack.
+
+    Args:
+        name (str): tokenizer name, used as metrics label.
+        coef (list): one weight per FEATURES entry.
+        intercept (float): tokens added to every text (special tokens).
+        low_ratio, high_ratio (float): quantiles of exact / estimate on the calibration sample.
+        slack (float): tokens added on both sides, covers short texts where the ratio is noisy.
+    """
+    def __init__(self, name: str, coef: List[float], intercept: float, low_ratio: float, high_ratio: float, slack: float = 2.0, **info):
+        self.name = name
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.low_ratio = float(low_ratio)
+        self.high_ratio = float(high_ratio)
+        self.slack = float(slack)
+        self.info = info  # calibration sample size and error, kept in the json
+
+    def estimate(self, features: np.ndarray) -> float:
+        return max(float(features @ self.coef) + self.intercept, 1.0)
+
+    def bounds(self, features: np.ndarray) -> Tuple[float, float, float]:
+        """(estimate, lower bound, upper bound) in tokens."""
+        estimate = self.estimate(features)
+        return estimate, estimate * self.low_ratio - self.slack, estimate * self.high_ratio + self.slack
+
+    def to_dict(self) -> dict:
+        return dict(self.info, coef=self.coef.tolist(), intercept=self.intercept, low_ratio=self.low_ratio,
+                    high_ratio=self.high_ratio, slack=self.slack, features=list(FEATURES))
+
+
+def fit_token_estimator(name: str, texts: List[str], counts: List[int], quantile: float = TOKEN_ESTIMATE_QUANTILE, slack: float = 2.0) -> TokenEstimator:
+    """Least squares fit of the token model on exact counts, bounds from the quantiles of exact / estimate."""
+    features = np.stack([text_features(text) for text in texts])
+    counts = np.asarray(counts, dtype=np.float64)
+    design = np.hstack([features, np.ones((len(features), 1))])
+    solution, *_ = np.linalg.lstsq(design, counts, rcond=None)
+    estimator = TokenEstimator(name, solution[:-1], solution[-1], 1.0, 1.0, slack)
+    estimates = np.array([estimator.estimate(row) for row in features])
+    ratios = counts / estimates
+    estimator.low_ratio = float(np.quantile(ratios, 1 - quantile))
+    estimator.high_ratio = float(np.quantile(ratios, quantile))
+    estimator.info = {"samples": len(texts), "quantile": quantile,
+                      "mean_abs_relative_error": float(np.mean(np.abs(estimates - counts) / counts))}
+    return estimator
+
+
+def save_token_estimators(estimators: List[TokenEstimator], path: str = TOKEN_ESTIMATOR_PATH) -> str:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump({estimator.name: estimator.to_dict() for estimator in estimators}, handle, indent=2)
+    return path
+
+
+def load_token_estimator(name: str, path: str = TOKEN_ESTIMATOR_PATH) -> Optional[TokenEstimator]:
+    """Calibrated estimator of a tokenizer, None (exact counts only) if it was never calibrated."""
+    if not os.path.exists(path):
+        logger.info(f"No token calibration at {path}, {name} limits use the exact tokenizer")
+        return None
+    with open(path, "r", encoding="utf-8") as handle:
+        calibration = json.load(handle).get(name)
+    if calibration is None:
+        logger.info(f"No {name} calibration in {path}, its limits use the exact tokenizer")
+        return None
+    calibration.pop("features", None)
+    return TokenEstimator(name, **calibration)
+
+
+class TokenLimit:
+    """
+    count_tokens(text) <= limit checks that use the exact tokenizer only when the estimated bounds
+    straddle the limit, plus every audit_every-th check to keep measuring the calibration error.
+    The bounds are quantiles, so a small share of estimated "within" decisions is over the limit;
+    hard checks (limits the embedder truncates at) only accept an upper bound hard_margin below the limit.
+    Without an estimator every check is exact.
+    """
+    def __init__(self, name: str, count_exact: Callable[[str], int], estimator: Optional[TokenEstimator] = None,
+                 audit_every: int = TOKEN_ESTIMATE_AUDIT_EVERY, hard_margin: float = TOKEN_ESTIMATE_HARD_MARGIN):
+        self.name = name
+        self.count_exact = count_exact
+        self.estimator = estimator
+        self.audit_every = audit_every
+        self.hard_margin = hard_margin
+        self.checks = itertools.count()
+
+    def prefix(self, words: List[str]) -> Optional[np.ndarray]:
+        """Prefix features for window checks over words, None when every check is exact anyway."""
+        return prefix_features(words) if self.estimator is not None else None
+
+    def within(self, text: str, limit: int, hard: bool = False) -> bool:
+        if self.estimator is None:
+            return self.count_exact(text) <= limit
+        return self.decide(text_features(text), limit, lambda: text, hard)
+
+    def window_within(self, words: List[str], start: int, end: int, limit: int, prefix: Optional[np.ndarray] = None) -> bool:
+        """Token check of " ".join(words[start:end]) in O(1) from prefix features."""
+        end = min(end, len(words))
+        if prefix is None:
+            return self.count_exact(" ".join(words[start:end])) <= limit
+        return self.decide(prefix[end] - prefix[start], limit, lambda: " ".join(words[start:end]))
+
+    def decide(self, features: np.ndarray, limit: int, text: Callable[[], str], hard: bool = False) -> bool:
+        estimate, low, high = self.estimator.bounds(features)
+        audit = self.audit_every > 0 and next(self.checks) % self.audit_every == 0
+        within_bound = high * (1 + self.hard_margin) if hard else high
+        if not audit and (within_bound <= limit or low > limit):
+            metrics.TOKEN_CHECKS.inc(tokenizer=self.name, decision="estimate")
+            return within_bound <= limit
+        count = self.count_exact(text())
+        metrics.TOKEN_CHECKS.inc(tokenizer=self.name, decision="audit" if audit else "exact")
+        metrics.TOKEN_ESTIMATE_ERROR.observe((estimate - count) / max(count, 1), tokenizer=self.name)
+        if count < low:
+            metrics.TOKEN_BOUND_MISSES.inc(tokenizer=self.name, side="below")
+        elif count > high:
+            metrics.TOKEN_BOUND_MISSES.inc(tokenizer=self.name, side="above")
+        return count <= limit
@@ -0,0 +1,155 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+import json
+import os
+import random
+import threading
+import time
+
+"""Span tracing of the pipeline (passage -> chunk -> LLM call -> DB write).
+Disabled by default; while disabled span() only checks a flag, so instrumented code pays nothing.
+Finished spans are exported as Chrome trace JSON (chrome://tracing, Perfetto) and OTLP/JSON
+(ExportTraceServiceRequest, accepted by OpenTelemetry collectors).
+"""
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "thread_id", "thread_name", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        thread = threading.current_thread()
+        self.thread_id = thread.ident
+        self.thread_name = thread.name
+        self.attributes = attributes
+        self.error = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def increment(self, key: str, amount: int = 1) -> None:
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+
+class NoopSpan:
+    def set(self, **attributes) -> None:
+        pass
+
+    def increment(self, key: str, amount: int = 1) -> None:
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    def __init__(self, service_name: str = "agentchunking"):
+        self.service_name = service_name
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.finished: List[Span] = []
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Open a child span of the current span (a new trace at the top level)."""
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        parent = current_span.get()
+        trace_id = parent.trace_id if parent is not None else f"{random.getrandbits(128):032x}"
+        span = Span(name, trace_id, parent.span_id if parent is not None else None, attributes)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            current_span.reset(token)
+            span.end_ns = time.time_ns()
+            with self.lock:
+                self.finished.append(span)
+
+    def annotate(self, **attributes) -> None:
+        """Set attributes on the current span, if tracing is on and a span is open."""
+        if self.enabled:
+            span = current_span.get()
+            if span is not None:
+                span.set(**attributes)
+
+    def drain(self) -> List[Span]:
+        with self.lock:
+            spans, self.finished = self.finished, []
+        return spans
+
+    def chrome_trace(self, spans: List[Span]) -> dict:
+        pid = os.getpid()
+        events = []
+        threads = {}
+        for span in spans:
+            threads[span.thread_id] = span.thread_name
+            args = dict(span.attributes, span_id=span.span_id, trace_id=span.trace_id)
+            if span.error:
+                args["error"] = span.error
+            events.append({"name": span.name, "ph": "X", "pid": pid, "tid": span.thread_id,
+                           "ts": span.start_ns / 1000, "dur": (span.end_ns - span.start_ns) / 1000, "args": args})
+        for tid, name in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def otlp_trace(self, spans: List[Span]) -> dict:
+        otlp_spans = []
+        for span in spans:
+            item = {"traceId": span.trace_id, "spanId": span.span_id, "name": span.name, "kind": 1,
+                    "startTimeUnixNano": str(span.start_ns), "endTimeUnixNano": str(span.end_ns),
+                    "attributes": [{"key": key, "value": otlp_value(value)} for key, value in span.attributes.items()]
+                                  + [{"key": "thread.name", "value": {"stringValue": span.thread_name}}],
+                    "status": {"code": 2, "message": span.error} if span.error else {"code": 1}}
+            if span.parent_id:
+                item["parentSpanId"] = span.parent_id
+            otlp_spans.append(item)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "agentchunking.tracing"}, "spans": otlp_spans}]}]}
+
+    def flush(self, directory: str, name: str) -> Optional[str]:
+        """
+        Write the spans finished since the last flush to <directory>/<name>.trace.json (Chrome)
+        and <directory>/<name>.otlp.json (OTLP/JSON).
+
+        Returns:
+            str | None: path of the Chrome trace, None if there was nothing to write.
+        """
+        spans = self.drain()
+        if not spans:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        safe_name = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in str(name))
+        chrome_path = os.path.join(directory, f"{safe_name}.trace.json")
+        with open(chrome_path, "w", encoding="utf-8") as handle:
+            json.dump(self.chrome_trace(spans), handle, ensure_ascii=False)
+        with open(os.path.join(directory, f"{safe_name}.otlp.json"), "w", encoding="utf-8") as handle:
+            json.dump(self.otlp_trace(spans), handle, ensure_ascii=False)
+        return chrome_path
+
+
+tracer = Tracer()
+span = tracer.span
+annotate = tracer.annotate
@@ -0,0 +1,17 @@
+import re
+
+
+def clear_tag_text(text):
+    if "passage_heading:" in text:
+        return text.split('\n', 1)[-1]
+    else:
+        return text
+    
+def clean_bangla_text(text):
+    # Remove trailing underscores, hyphens, newlines, pipes
+    text = re.sub(r'[_|-|\n]+$', '', text.rstrip())
+    # Keep Bangla characters (U+0980 to U+09FF), alphanumeric, and spaces; remove others
+    text = re.sub(r'[^\u0980-\u09FFa-zA-Z0-9\s]', '', text)
+    # Replace multiple spaces with a single space
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
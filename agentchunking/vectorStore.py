@@ -0,0 +1,338 @@
+from agentchunking.constants import (VECTOR_STORE_DIR,
+                                     VECTOR_DIM,
+                                     VECTOR_INDEX,
+                                     IVF_NLIST,
+                                     IVF_NPROBE,
+                                     HNSW_M,
+                                     HNSW_EF_CONSTRUCTION,
+                                     HNSW_EF_SEARCH,
+                                     STORE_SYNC_WATERMARK_LAG)
+from agentchunking.embedding import decode_embedding
+from typing import List, Tuple
+from datetime import datetime
+from loguru import logger
+import numpy as np
+import json
+import os
+
+SegmentKey = Tuple[str, int, int]  # (passage_id, start, end) as in SegmentationTable
+
+
+class IVFIndex:
+    """
+    Inverted file index on inner product: k-means centroids and one posting list of rows per centroid.
+    Row assignments are appended to a file, so new vectors are added without retraining.
+    Before training (too few vectors) search falls back to exact scan.
+    """
+    def __init__(self, directory: str, nlist: int = IVF_NLIST, nprobe: int = IVF_NPROBE):
+        self.directory = directory
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids_path = os.path.join(directory, "ivf_centroids.npy")
+        self.assign_path = os.path.join(directory, "ivf_assign.i32")
+        self.centroids = np.load(self.centroids_path) if os.path.exists(self.centroids_path) else None
+        self.lists = None
+        self.assigned = 0
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors: np.ndarray, iterations: int = 10, seed: int = 0) -> None:
+        rng = np.random.RandomState(seed)
+        sample = vectors[rng.choice(len(vectors), size=min(len(vectors), self.nlist * 64), replace=False)].astype(np.float32)
+        centroids = sample[rng.choice(len(sample), size=self.nlist, replace=False)]
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(self.nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            # spherical k-means: vectors are normalized, keep centroids on the unit sphere
+            centroids /= np.clip(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12, None)
+        self.centroids = centroids
+        np.save(self.centroids_path, centroids)
+        if os.path.exists(self.assign_path):
+            os.remove(self.assign_path)
+        self.lists = None
+        self.assigned = 0
+        logger.info(f"Trained IVF index with {self.nlist} lists on {len(sample)} vectors")
+
+    def add(self, vectors: np.ndarray, first_row: int) -> None:
+        if not self.trained:
+            return
+        assign = np.empty(len(vectors), dtype=np.int32)
+        for offset in range(0, len(vectors), 65536):
+            chunk = vectors[offset:offset + 65536].astype(np.float32)
+            assign[offset:offset + len(chunk)] = np.argmax(chunk @ self.centroids.T, axis=1)
+        with open(self.assign_path, "ab") as handle:
+            handle.write(assign.tobytes())
+        if self.lists is not None:
+            for row, c in enumerate(assign, start=first_row):
+                self.lists[c].append(row)
+        self.assigned = first_row + len(vectors)
+
+    def load_lists(self) -> None:
+        assign = np.fromfile(self.assign_path, dtype=np.int32) if os.path.exists(self.assign_path) else np.zeros(0, dtype=np.int32)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(self.nlist + 1))
+        self.lists = [list(order[bounds[c]:bounds[c + 1]]) for c in range(self.nlist)]
+        self.assigned = len(assign)
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        if self.lists is None:
+            self.load_lists()
+        probes = np.argsort(-(self.centroids @ query))[:self.nprobe]
+        rows = [self.lists[c] for c in probes]
+        return np.concatenate([np.asarray(r, dtype=np.int64) for r in rows]) if rows else np.zeros(0, dtype=np.int64)
+
+
+class HNSWIndex:
+    """HNSW graph index backed by hnswlib (optional dependency)."""
+    def __init__(self, directory: str, dim: int, m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION, ef_search: int = HNSW_EF_SEARCH):
+        try:
+            import hnswlib
+        except ImportError as exc:
+            raise ImportError("The hnsw vector index needs `pip install hnswlib`") from exc
+        self.path = os.path.join(directory, "hnsw.bin")
+        self.index = hnswlib.Index(space="ip", dim=dim)
+        if os.path.exists(self.path):
+            self.index.load_index(self.path)
+        else:
+            self.index.init_index(max_elements=1024, M=m, ef_construction=ef_construction)
+        self.index.set_ef(ef_search)
+
+    @property
+    def trained(self) -> bool:
+        return True
+
+    def add(self, vectors: np.ndarray, first_row: int) -> None:
+        needed = first_row + len(vectors)
+        if needed > self.index.get_max_elements():
+            self.index.resize_index(max(needed, 2 * self.index.get_max_elements()))
+        self.index.add_items(vectors.astype(np.float32), np.arange(first_row, needed))
+        self.index.save_index(self.path)
+
+    def delete(self, rows: List[int]) -> None:
+        marked = 0
+        for row in rows:
+            try:
+                self.index.mark_deleted(int(row))
+                marked += 1
+            except RuntimeError:
+                pass  # already marked (deletes are replayed on load)
+        if marked:
+            self.index.save_index(self.path)
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, self.index.get_current_count() - self.index.get_deleted_count())
+        if k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        rows, distances = self.index.knn_query(query.astype(np.float32)[None, :], k=k)
+        # hnswlib "ip" space returns 1 - inner product
+        return rows[0].astype(np.int64), 1.0 - distances[0]
+
+
+class SegmentVectorStore:
+    """
+    Append-only store of segment embeddings: a memory-mapped float16 matrix (vectors.f16),
+    the aligned segment keys (ids.jsonl) and an approximate nearest neighbour index.
+    meta.json holds the committed row count, rows past it (from an interrupted append) are ignored,
+    and the watermark of the last sync_vector_store run.
+    Deleted rows are listed in deleted.i64 and skipped by search; their key can be appended again.
+    """
+    def __init__(self, directory: str = VECTOR_STORE_DIR, dim: int = VECTOR_DIM, index: str = VECTOR_INDEX):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.dim = dim
+        self.vectors_path = os.path.join(directory, "vectors.f16")
+        self.ids_path = os.path.join(directory, "ids.jsonl")
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.deleted_path = os.path.join(directory, "deleted.i64")
+
+        self.count = 0
+        self.generation = 0  # bumped on every append/delete, keys the retrieval result cache
+        self.watermark = None  # isoformat, embeddings created up to it are stored
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r") as handle:
+                meta = json.load(handle)
+            self.count, self.dim = meta["count"], meta["dim"]
+            self.watermark = meta.get("watermark")
+
+        self.keys: List[SegmentKey] = []
+        if os.path.exists(self.ids_path):
+            with open(self.ids_path, "r", encoding="utf-8") as handle:
+                for line in handle:
+                    if len(self.keys) == self.count:
+                        break
+                    passage_id, start, end = json.loads(line)
+                    self.keys.append((passage_id, start, end))
+        self.truncate_to_count()
+        self.matrix = self.open_matrix()
+        deleted = np.fromfile(self.deleted_path, dtype=np.int64) if os.path.exists(self.deleted_path) else np.zeros(0, dtype=np.int64)
+        self.deleted = np.zeros(self.count, dtype=bool)
+        self.deleted[deleted[deleted < self.count]] = True
+        self.key_to_row = {key: row for row, key in enumerate(self.keys) if not self.deleted[row]}
+
+        # the index is written after meta.json, catch up on rows an interrupted append did not index
+        self.index = HNSWIndex(directory, self.dim) if index == "hnsw" else IVFIndex(directory)
+        if isinstance(self.index, IVFIndex) and self.index.trained:
+            self.index.load_lists()
+            if self.index.assigned < self.count:
+                self.index.add(self.matrix[self.index.assigned:self.count], self.index.assigned)
+        elif isinstance(self.index, HNSWIndex):
+            indexed = self.index.index.get_current_count()
+            if indexed < self.count:
+                self.index.add(self.matrix[indexed:self.count], indexed)
+            if self.deleted.any():
+                self.index.delete(np.flatnonzero(self.deleted))
+
+    def truncate_to_count(self) -> None:
+        size = self.count * self.dim * 2
+        if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) > size:
+            with open(self.vectors_path, "r+b") as handle:
+                handle.truncate(size)
+        with open(self.ids_path, "a+", encoding="utf-8") as handle:
+            handle.seek(0)
+            lines = handle.readlines()
+        if len(lines) > self.count:
+            with open(self.ids_path, "w", encoding="utf-8") as handle:
+                handle.writelines(lines[:self.count])
+
+    def open_matrix(self):
+        if self.count == 0:
+            return np.zeros((0, self.dim), dtype=np.float16)
+        return np.memmap(self.vectors_path, dtype=np.float16, mode="r", shape=(self.count, self.dim))
+
+    def save_meta(self) -> None:
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as handle:
+            json.dump({"count": self.count, "dim": self.dim, "watermark": self.watermark}, handle)
+        os.replace(tmp_path, self.meta_path)
+
+    def __len__(self) -> int:
+        return len(self.key_to_row)
+
+    def __contains__(self, key: SegmentKey) -> bool:
+        return key in self.key_to_row
+
+    def append(self, keys: List[SegmentKey], vectors: np.ndarray) -> int:
+        """Append new segments (already stored keys are skipped), returns the number appended."""
+        fresh = [idx for idx, key in enumerate(keys) if key not in self.key_to_row]
+        if not fresh:
+            return 0
+        vectors = np.ascontiguousarray(vectors[fresh], dtype=np.float16)
+        keys = [keys[idx] for idx in fresh]
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Vector dim {vectors.shape[1]} does not match store dim {self.dim}")
+
+        first_row = self.count
+        with open(self.vectors_path, "ab") as handle:
+            handle.write(vectors.tobytes())
+        with open(self.ids_path, "a", encoding="utf-8") as handle:
+            for passage_id, start, end in keys:
+                handle.write(json.dumps([passage_id, int(start), int(end)], ensure_ascii=False) + "\n")
+        self.count += len(keys)
+        self.save_meta()
+
+        for row, key in enumerate(keys, start=first_row):
+            self.keys.append(key)
+            self.key_to_row[key] = row
+        self.deleted = np.concatenate([self.deleted, np.zeros(len(keys), dtype=bool)])
+        self.matrix = self.open_matrix()
+
+        if isinstance(self.index, IVFIndex) and not self.index.trained and self.count >= 39 * self.index.nlist:
+            self.index.train(self.matrix)
+            self.index.add(self.matrix, 0)
+        else:
+            self.index.add(vectors, first_row)
+        self.generation += 1
+        return len(keys)
+
+    def delete(self, keys: List[SegmentKey]) -> int:
+        """Delete stored segments (e.g. replaced by re-segmentation), returns the number deleted."""
+        rows = np.asarray([self.key_to_row.pop(key) for key in keys if key in self.key_to_row], dtype=np.int64)
+        if not len(rows):
+            return 0
+        with open(self.deleted_path, "ab") as handle:
+            handle.write(rows.tobytes())
+        self.deleted[rows] = True
+        if isinstance(self.index, HNSWIndex):
+            self.index.delete(rows)
+        self.generation += 1
+        return len(rows)
+
+    def exact_scores(self, query: np.ndarray, rows: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        if rows is None:
+            scores = np.concatenate([self.matrix[offset:offset + 65536].astype(np.float32) @ query
+                                     for offset in range(0, self.count, 65536)])
+            return np.arange(self.count), scores
+        rows = np.sort(rows)  # sequential reads on the memory map
+        return rows, self.matrix[rows].astype(np.float32) @ query
+
+    def search(self, query: np.ndarray, k: int = 10) -> List[Tuple[SegmentKey, float]]:
+        """Top-k segments by inner product (cosine for the normalized e5 vectors)."""
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        if self.count == 0:
+            return []
+        if isinstance(self.index, HNSWIndex):
+            rows, scores = self.index.search(query, k)
+        else:
+            rows, scores = self.exact_scores(query, self.index.candidates(query) if self.index.trained else None)
+            live = ~self.deleted[rows]
+            rows, scores = rows[live], scores[live]
+            top = np.argsort(-scores)[:k]
+            rows, scores = rows[top], scores[top]
+        return [(self.keys[row], float(score)) for row, score in zip(rows, scores)]
+
+
+def sync_vector_store(db, store: SegmentVectorStore, batch_size: int = 4096, full: bool = False,
+                      watermark_lag: int = STORE_SYNC_WATERMARK_LAG) -> int:
+    """
+    Bring the store up to date with segment_embedding_table since its watermark.
+    Only passages with a segment updated or embedded in (watermark, new watermark] are read: new embeddings
+    are appended, a re-embedded segment whose vector changed under the same key replaces its stored row,
+    and stored segments of those passages whose embedding is gone (replace_passage_segments drops them
+    with the replaced segments) are deleted.
+
+    Args:
+        db (SQLDatabaseManager): database manager.
+        store (SegmentVectorStore): vector store.
+        batch_size (int): rows per server side cursor batch.
+        full (bool): compare every embedding and delete every stored segment whose embedding is gone.
+        watermark_lag (int): seconds before the database clock that the new watermark stays behind.
+
+    Returns:
+        int: number of appended (new or replacing) vectors.
+    """
+    high = db.sync_watermark(watermark_lag)
+    low = None if full or store.watermark is None else datetime.fromisoformat(store.watermark)
+    if low is not None and high <= low:
+        logger.info(f"Vector store is up to date, watermark {store.watermark} is ahead of {high}")
+        return 0
+    appended = 0
+    replaced = 0
+    current = set()
+    passages = set()
+    for batch in db.changed_passage_embeddings(low, high, batch_size=batch_size):
+        passages.update(batch["passage_id"])
+        batch = batch[batch["start"].notna()]  # passages without any embedding left
+        keys = [(pid, int(start), int(end)) for pid, start, end in zip(batch["passage_id"], batch["start"], batch["end"])]
+        current.update(keys)
+        pending = [idx for idx, blob in enumerate(batch["embedding"]) if blob is not None]
+        if not pending:
+            continue
+        vectors = np.stack([decode_embedding(batch["embedding"].iat[idx]) for idx in pending])
+        keys = [keys[idx] for idx in pending]
+        # a key embedded again keeps its row while the vector is unchanged, otherwise the row is replaced
+        changed = [key for key, vector in zip(keys, vectors)
+                   if key in store and not np.array_equal(store.matrix[store.key_to_row[key]], vector)]
+        replaced += store.delete(changed)
+        appended += store.append(keys, vectors)
+    stale = [key for key in store.key_to_row if (low is None or key[0] in passages) and key not in current]
+    deleted = store.delete(stale)
+    store.watermark = high.isoformat()
+    store.save_meta()
+    logger.info(f"Appended {appended} ({replaced} replacing re-embedded segments) and deleted {deleted} segments "
+                f"of {len(passages)} changed passages in the vector store, {len(store)} in total, watermark {store.watermark}")
+    return appended
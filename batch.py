@@ -0,0 +1,62 @@
+from agentchunking.utils.filehelpers import config_loader
+from agentchunking.database.manager import SQLDatabaseManager
+from agentchunking.constants import DB_CONFIG_PATH, BATCH_WORK_DIR
+from agentchunking.batchJobs import (LocalFileBatchBackend,
+                                     load_copier_state,
+                                     export_copier_requests,
+                                     ingest_copier_results,
+                                     export_rewriter_requests,
+                                     ingest_rewriter_results)
+from datetime import datetime
+from loguru import logger
+import argparse
+import os
+import shutil
+
+# Offline batch mode, one round per invocation:
+#   python batch.py copier     (repeat until no passage is left unfinished, the next run picks up new passages)
+#   python batch.py rewriter
+BACKENDS = {"local": LocalFileBatchBackend}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the copier or the rewriter through an offline batch backend.")
+    parser.add_argument("kind", choices=["copier", "rewriter"])
+    parser.add_argument("--backend", choices=list(BACKENDS), default="local")
+    parser.add_argument("--work-dir", default=BATCH_WORK_DIR)
+    parser.add_argument("--round", default=None, help="name of the round directory, defaults to the start time")
+    args = parser.parse_args()
+
+    round_dir = os.path.join(args.work_dir, args.kind, args.round or datetime.now().strftime("%Y%m%d-%H%M%S"))
+    request_dir = os.path.join(round_dir, "requests")
+    result_dir = os.path.join(round_dir, "results")
+    # a reused round name must not leave shards of the previous round behind for the ingest
+    shutil.rmtree(round_dir, ignore_errors=True)
+    backend = BACKENDS[args.backend](os.path.join(args.work_dir, "jobs"))
+
+    if args.kind == "copier":
+        from agentchunking.dataLoader import get_current_data_splits
+        state_path = os.path.join(args.work_dir, "copier_state.json")
+        # rounds continue the staged passages until all of them are finished, then new and edited passages are loaded
+        if load_copier_state(state_path)["passages"]:
+            data = None
+            db = SQLDatabaseManager(config_loader(DB_CONFIG_PATH))
+        else:
+            data, db = get_current_data_splits()
+        shards = export_copier_requests(data, state_path, request_dir)
+    else:
+        db = SQLDatabaseManager(config_loader(DB_CONFIG_PATH))
+        shards = export_rewriter_requests(db, request_dir)
+
+    if not shards:
+        logger.info(f"No pending {args.kind} requests.")
+    else:
+        job_id = backend.submit(shards)
+        state = backend.wait(job_id)
+        if state != "done":
+            logger.error(f"Batch job {job_id} ended with state {state}")
+        else:
+            results = backend.fetch_results(job_id, result_dir)
+            if args.kind == "copier":
+                ingest_copier_results(db, results, state_path)
+            else:
+                ingest_rewriter_results(db, shards, results)
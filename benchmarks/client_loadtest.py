@@ -0,0 +1,57 @@
+from agentchunking.clientManagement import create_wrapped_clients_google
+from agentchunking.llm.shortner import shorten_text_goole_api
+from agentchunking.constants import COPIER_GOOGLE_MODEL
+from concurrent.futures import ThreadPoolExecutor
+from synthetic import synthetic_corpus
+import numpy as np
+import argparse
+import json
+import time
+
+"""Drive the copier request path (client manager, quota wrapper, genai client) against the
+local stand-in server started with llm_server.py. Reports throughput, latency percentiles and
+how requests ended (ok, 429, 503, out of quota).
+"""
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of client management against the local LLM stand-in.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--rpm", type=int, default=1000, help="client side RPM limit per key")
+    parser.add_argument("--rpd", type=int, default=10**6, help="client side RPD limit per key")
+    parser.add_argument("--backend", choices=["local", "fake"], default="local")
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    clients = create_wrapped_clients_google(args.rpd, args.rpm, pool="loadtest", backend=args.backend, model=COPIER_GOOGLE_MODEL)
+    texts = synthetic_corpus(200, args.seed)["text"].tolist()
+    outcomes = {}
+
+    def one_request(idx):
+        start = time.perf_counter()
+        try:
+            shorten_text_goole_api(texts[idx % len(texts)], clients.get_client())
+            outcome = "ok"
+        except RuntimeError:
+            outcome = "out_of_quota"
+        except Exception as exc:
+            outcome = "503" if "503" in str(exc) else "429" if "429" in str(exc) else type(exc).__name__
+        return outcome, time.perf_counter() - start
+
+    run_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(one_request, range(args.requests)))
+    elapsed = time.perf_counter() - run_start
+
+    for outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    latencies = np.asarray([latency for outcome, latency in results if outcome == "ok"]) * 1000
+    report = {"requests": args.requests,
+              "concurrency": args.concurrency,
+              "keys": len(clients.clients),
+              "seconds": round(elapsed, 2),
+              "requests_per_min": round(60 * args.requests / elapsed, 1),
+              "outcomes": outcomes,
+              "ok_p50_ms": round(float(np.percentile(latencies, 50)), 1) if len(latencies) else None,
+              "ok_p99_ms": round(float(np.percentile(latencies, 99)), 1) if len(latencies) else None}
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,51 @@
+from agentchunking.embedding import SegmentEmbedder
+import argparse
+import json
+import os
+import random
+import time
+import torch
+
+# Bengali government-style sentences, mixed with numbers and english names as in the corpus
+SENTENCES = [
+    "জাতীয় পরিচয়পত্র সংশোধনের জন্য নির্ধারিত ফরম পূরণ করে নিকটস্থ উপজেলা নির্বাচন অফিসে জমা দিতে হবে।",
+    "আবেদন ফি ২৩০ টাকা এবং তা অনলাইনে bKash বা Nagad এর মাধ্যমে পরিশোধ করা যাবে।",
+    "২০২৩ সালের ১৫ জানুয়ারি থেকে নতুন নিয়ম কার্যকর হয়েছে।",
+    "বিস্তারিত তথ্যের জন্য www.nidw.gov.bd ওয়েবসাইটে যোগাযোগ করুন।",
+    "ভূমি উন্নয়ন কর অনলাইনে পরিশোধের সুবিধা সকল ইউনিয়ন ভূমি অফিসে চালু রয়েছে।",
+]
+
+
+def synthetic_segments(n: int, seed: int = 13) -> list[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(SENTENCES) for _ in range(rng.randint(1, 12))) for _ in range(n)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CPU throughput of the segment embedding stage.")
+    parser.add_argument("--n", type=int, default=512, help="number of segments")
+    parser.add_argument("--backend", choices=["torch", "onnx"], default="torch")
+    parser.add_argument("--no-quantize", action="store_true")
+    parser.add_argument("--max-batch-tokens", type=int, default=16384)
+    parser.add_argument("--threads", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    embedder = SegmentEmbedder(backend=args.backend,
+                               quantize=not args.no_quantize,
+                               max_batch_tokens=args.max_batch_tokens)
+    texts = synthetic_segments(args.n)
+    embedder.embed(texts[:8])  # warm up
+
+    start = time.perf_counter()
+    vectors = embedder.embed(texts)
+    elapsed = time.perf_counter() - start
+    result = {"backend": args.backend,
+              "quantized": not args.no_quantize,
+              "segments": len(texts),
+              "threads": args.threads,
+              "seconds": round(elapsed, 3),
+              "segments_per_sec": round(len(texts) / elapsed, 2),
+              "segments_per_sec_per_core": round(len(texts) / elapsed / args.threads, 2),
+              "dim": int(vectors.shape[1])}
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,71 @@
+from agentchunking.utils.filehelpers import config_loader
+from agentchunking.database.manager import SQLDatabaseManager
+from agentchunking.constants import DB_CONFIG_PATH
+from agentchunking.retrieval import RetrievalService
+from concurrent.futures import ThreadPoolExecutor
+from synthetic import synthetic_queries
+import numpy as np
+import argparse
+import json
+import random
+import time
+
+"""Cold latency is measured on the first request of every distinct query (empty caches),
+warm latency on a workload repeating the same queries (mostly result cache hits).
+"""
+
+
+def run(service, workload, k, mode, concurrency):
+    def timed_search(query):
+        start = time.perf_counter()
+        service.search(query, k=k, mode=mode)
+        return time.perf_counter() - start
+
+    run_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = np.asarray(list(executor.map(timed_search, workload))) * 1000
+    elapsed = time.perf_counter() - run_start
+    return {"requests": len(workload),
+            "qps": round(len(workload) / elapsed, 2),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 2)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of the retrieval service: p50/p99 latency and QPS.")
+    parser.add_argument("--queries", help="file with one query per line, defaults to synthetic queries")
+    parser.add_argument("--distinct", type=int, default=500, help="synthetic queries drawn when --queries is not given")
+    parser.add_argument("--requests", type=int, default=1000, help="requests of the warm run")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mode", choices=["vector", "lexical", "hybrid"], default="hybrid")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    queries = synthetic_queries(args.distinct, args.seed)
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as handle:
+            queries = [line.strip() for line in handle if line.strip()]
+
+    db = SQLDatabaseManager(config_loader(DB_CONFIG_PATH))
+    embedder = vector_store = lexical_index = None
+    if args.mode in ("vector", "hybrid"):
+        from agentchunking.embedding import SegmentEmbedder
+        from agentchunking.vectorStore import SegmentVectorStore
+        embedder, vector_store = SegmentEmbedder(), SegmentVectorStore()
+    if args.mode in ("lexical", "hybrid"):
+        from agentchunking.lexicalIndex import BM25Index
+        lexical_index = BM25Index()
+    service = RetrievalService(db, embedder, vector_store, lexical_index)
+
+    queries = list(dict.fromkeys(queries))
+    rng = random.Random(args.seed)
+    cold = run(service, queries, args.k, args.mode, args.concurrency)
+    warm = run(service, [rng.choice(queries) for _ in range(args.requests)], args.k, args.mode, args.concurrency)
+
+    print(json.dumps({"mode": args.mode,
+                      "concurrency": args.concurrency,
+                      "distinct_queries": len(queries),
+                      "cold": cold,
+                      "warm": warm,
+                      "caches": service.report()}, indent=2))
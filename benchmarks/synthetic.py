@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import random
+
+"""Seeded synthetic corpus shaped like annotation_table: Bengali government-service passages
+with headings, numbers, english names and leftover HTML tags, lengths drawn from a log-normal
+distribution (most passages a few hundred words, a long tail of multi-thousand word pages).
+"""
+
+WORDS = ("আবেদন ফরম জমা দিতে হবে নিকটস্থ উপজেলা অফিসে জাতীয় পরিচয়পত্র সংশোধন ফি টাকা অনলাইনে "
+         "পরিশোধ করা যাবে ভূমি উন্নয়ন কর ইউনিয়ন সেবা নাগরিক সনদ জন্ম নিবন্ধন মৃত্যু পাসপোর্ট নবায়ন "
+         "প্রয়োজনীয় কাগজপত্র সত্যায়িত কপি ছবি দুই কর্মদিবসের মধ্যে সরকারি নির্ধারিত তারিখ থেকে নতুন নিয়ম "
+         "কার্যকর হয়েছে বিস্তারিত তথ্যের জন্য ওয়েবসাইটে যোগাযোগ করুন মন্ত্রণালয় অধিদপ্তর জেলা প্রশাসক "
+         "কার্যালয় প্রকল্প বাস্তবায়ন বাজেট বরাদ্দ শিক্ষা স্বাস্থ্য কৃষি ভাতা প্রদান তালিকা প্রকাশ").split()
+ENGLISH = ["bKash", "Nagad", "www.nidw.gov.bd", "NID", "e-Passport", "online", "PDF", "SMS"]
+DIGITS = str.maketrans("0123456789", "০১২৩৪৫৬৭৮৯")
+SITES = ["nidw.gov.bd", "land.gov.bd", "passport.gov.bd", "bdris.gov.bd", "moe.gov.bd", "dghs.gov.bd"]
+
+
+def sentence(rng: random.Random) -> str:
+    words = []
+    for _ in range(rng.randint(6, 22)):
+        roll = rng.random()
+        if roll < 0.06:
+            words.append(str(rng.randint(1, 2030)).translate(DIGITS))
+        elif roll < 0.09:
+            words.append(rng.choice(ENGLISH))
+        else:
+            words.append(rng.choice(WORDS))
+    return " ".join(words) + "।"
+
+
+def passage(rng: random.Random, n_words: int) -> str:
+    """Paragraphs of sentences until n_words, with occasional headings and HTML tags."""
+    paragraphs, words = [], 0
+    while words < n_words:
+        sentences = [sentence(rng) for _ in range(rng.randint(2, 7))]
+        paragraph = " ".join(sentences)
+        if rng.random() < 0.15:
+            paragraph = f"<h3>{' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5)))}</h3> " + paragraph
+        if rng.random() < 0.2:
+            paragraph = f"<p>{paragraph}</p>"
+        paragraphs.append(paragraph)
+        words += len(paragraph.split())
+    return "\n\n".join(paragraphs)
+
+
+def passage_lengths(n: int, seed: int, median_words: int = 350, sigma: float = 0.9, max_words: int = 8000) -> np.ndarray:
+    rng = np.random.RandomState(seed)
+    return np.clip(rng.lognormal(np.log(median_words), sigma, size=n), 20, max_words).astype(int)
+
+
+def synthetic_corpus(n: int, seed: int = 13, median_words: int = 350) -> pd.DataFrame:
+    """
+    annotation_table-like rows (annotation_data_id, url, text, site_name, passage_heading).
+    The same seed always produces the same corpus.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for idx, n_words in enumerate(passage_lengths(n, seed, median_words)):
+        site = rng.choice(SITES)
+        rows.append({"annotation_data_id": f"bench-{seed}-{idx:06d}",
+                     "url": f"https://{site}/page/{idx}",
+                     "text": passage(rng, int(n_words)),
+                     "site_name": site,
+                     "passage_heading": " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6)))})
+    return pd.DataFrame(rows)
+
+
+def synthetic_queries(n: int, seed: int = 13) -> list:
+    """n distinct short queries (3 to 8 words) drawn from the corpus vocabulary."""
+    rng = random.Random(seed)
+    queries = {}
+    while len(queries) < n:
+        words = sentence(rng).rstrip("।").split()
+        start = rng.randint(0, max(0, len(words) - 3))
+        queries[" ".join(words[start:start + rng.randint(3, 8)])] = None
+    return list(queries)
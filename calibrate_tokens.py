@@ -0,0 +1,61 @@
+from agentchunking.utils.filehelpers import config_loader
+from agentchunking.database.manager import SQLDatabaseManager
+from agentchunking.constants import DB_CONFIG_PATH, TOKEN_ESTIMATOR_PATH, TOKEN_ESTIMATE_QUANTILE, MAX_TOKEN_PASSAGE_TO_USE_AS_IT_IS
+from agentchunking.dataLoader import count_e5_tokens, count_llama_tokens
+from agentchunking.tokenEstimator import fit_token_estimator, save_token_estimators, text_features
+from agentchunking.utils.texthelpers import clear_tag_text
+from loguru import logger
+import numpy as np
+import argparse
+import json
+import random
+
+# Fit the e5 / Llama token estimators on exact counts of a corpus sample: whole passages plus random
+# word windows of the sizes the splitter checks. Reports held-out error, bound coverage and the share of
+# limit checks the estimate decides on its own.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate the fast token estimators against the exact tokenizers.")
+    parser.add_argument("--passages", type=int, default=2000)
+    parser.add_argument("--windows-per-passage", type=int, default=4)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--quantile", type=float, default=TOKEN_ESTIMATE_QUANTILE)
+    parser.add_argument("--out", default=TOKEN_ESTIMATOR_PATH)
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    db = SQLDatabaseManager(config_loader(DB_CONFIG_PATH))
+    texts = []
+    for batch in db.annotation_table.select_iter(columns=["text"], batch_size=1000):
+        for text in batch["text"]:
+            words = clear_tag_text(text).split()
+            if len(words) <= 10:
+                continue
+            texts.append(" ".join(words))
+            for _ in range(args.windows_per_passage):
+                start = rng.randrange(len(words))
+                texts.append(" ".join(words[start:start + rng.randint(10, 800)]))
+        if len(texts) >= args.passages * (1 + args.windows_per_passage):
+            break
+    rng.shuffle(texts)
+    split = int(len(texts) * (1 - args.holdout))
+    train, test = texts[:split], texts[split:]
+    logger.info(f"Calibrating on {len(train)} texts, {len(test)} held out")
+
+    estimators = []
+    report = {}
+    for name, count in (("e5", count_e5_tokens), ("llama", count_llama_tokens)):
+        estimator = fit_token_estimator(name, train, [count(text) for text in train], quantile=args.quantile)
+        exact = np.array([count(text) for text in test], dtype=np.float64)
+        bounds = np.array([estimator.bounds(text_features(text)) for text in test])
+        limit = MAX_TOKEN_PASSAGE_TO_USE_AS_IT_IS
+        report[name] = {"mean_abs_relative_error": round(float(np.mean(np.abs(bounds[:, 0] - exact) / exact)), 4),
+                        "p99_abs_relative_error": round(float(np.quantile(np.abs(bounds[:, 0] - exact) / exact, 0.99)), 4),
+                        "within_bounds": round(float(np.mean((exact >= bounds[:, 1]) & (exact <= bounds[:, 2]))), 4),
+                        f"decided_by_estimate_at_{limit}": round(float(np.mean((bounds[:, 2] <= limit) | (bounds[:, 1] > limit))), 4),
+                        "low_ratio": round(estimator.low_ratio, 4),
+                        "high_ratio": round(estimator.high_ratio, 4)}
+        estimators.append(estimator)
+    save_token_estimators(estimators, args.out)
+    logger.info(f"Wrote {args.out}")
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,14 @@
+from agentchunking.utils.filehelpers import config_loader
+from agentchunking.database.manager import SQLDatabaseManager
+from agentchunking.constants import DB_CONFIG_PATH
+from agentchunking.embedding import SegmentEmbedder, embed_pending_segments
+from agentchunking.vectorStore import SegmentVectorStore, sync_vector_store
+from loguru import logger
+
+if __name__ == "__main__":
+    db = SQLDatabaseManager(config_loader(DB_CONFIG_PATH))
+    embedder = SegmentEmbedder()
+    embedded = embed_pending_segments(db, embedder)
+    logger.info(f"Embedding finished for {embedded} segments.")
+    store = SegmentVectorStore()
+    sync_vector_store(db, store)
@@ -0,0 +1,35 @@
+from agentchunking.utils.filehelpers import config_loader
+from agentchunking.database.manager import SQLDatabaseManager
+from agentchunking.constants import (DB_CONFIG_PATH,
+                                     EXPORT_DIR,
+                                     EXPORT_SHARD_ROWS,
+                                     EXPORT_ROW_GROUP_ROWS,
+                                     EXPORT_WATERMARK_LAG)
+from agentchunking.export import export_segments
+from loguru import logger
+import argparse
+
+# Export finished segments with url/topic/heading to Parquet shards for the downstream indexing jobs,
+# incrementally from the watermark in <out-dir>/manifest.json.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export segments changed since the last export to zstd Parquet shards.")
+    parser.add_argument("--out-dir", default=EXPORT_DIR)
+    parser.add_argument("--full", action="store_true", help="export everything, readers start over from this export")
+    parser.add_argument("--include-pending", action="store_true", help="also export passages the rewriter has not finished")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--shard-rows", type=int, default=EXPORT_SHARD_ROWS)
+    parser.add_argument("--row-group-rows", type=int, default=EXPORT_ROW_GROUP_ROWS)
+    parser.add_argument("--watermark-lag", type=int, default=EXPORT_WATERMARK_LAG)
+    args = parser.parse_args()
+
+    db = SQLDatabaseManager(config_loader(DB_CONFIG_PATH))
+    entry = export_segments(db,
+                            directory=args.out_dir,
+                            full=args.full,
+                            include_pending=args.include_pending,
+                            batch_size=args.batch_size,
+                            shard_rows=args.shard_rows,
+                            row_group_rows=args.row_group_rows,
+                            watermark_lag=args.watermark_lag)
+    if entry is not None:
+        logger.info(f"Export {entry['export_id']} finished: {entry['rows']} rows in {len(entry['shards'])} shards")
@@ -0,0 +1,11 @@
+from agentchunking.utils.filehelpers import config_loader
+from agentchunking.database.manager import SQLDatabaseManager
+from agentchunking.constants import DB_CONFIG_PATH, LEXICAL_MAX_SEGMENTS
+from agentchunking.lexicalIndex import BM25Index, sync_lexical_index
+
+if __name__ == "__main__":
+    db = SQLDatabaseManager(config_loader(DB_CONFIG_PATH))
+    index = BM25Index()
+    sync_lexical_index(db, index)
+    if len(index.segments) > LEXICAL_MAX_SEGMENTS:
+        index.merge()
@@ -0,0 +1,28 @@
+from agentchunking.llm.localServer import StandInBehaviour, start_stand_in_server
+from agentchunking.constants import LOCAL_LLM_SERVER_URL
+import argparse
+
+# Local stand-in for the Gemini / OpenAI-compatible APIs. Point the pipeline at it with
+#   LLM_CLIENT_BACKEND=local in the environment (or agentchunking/constants.py)
+# or, for OpenAI-compatible backends, a configs/providers.yaml entry with base_url http://127.0.0.1:8765/v1
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve deterministic copier/rewriter responses with injected latency, errors and quotas.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(LOCAL_LLM_SERVER_URL.rsplit(":", 1)[1]))
+    parser.add_argument("--latency-median", type=float, default=1.0, help="seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal sigma, 0 for fixed latency")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of requests rejected with 429")
+    parser.add_argument("--rate-503", type=float, default=0.0, help="fraction of requests rejected with 503")
+    parser.add_argument("--rpm", type=int, default=None, help="requests per minute per key")
+    parser.add_argument("--rpd", type=int, default=None, help="requests per day per key")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    behaviour = StandInBehaviour(latency_median=args.latency_median,
+                                 latency_sigma=args.latency_sigma,
+                                 rate_429=args.rate_429,
+                                 rate_503=args.rate_503,
+                                 rpm=args.rpm,
+                                 rpd=args.rpd,
+                                 seed=args.seed)
+    start_stand_in_server(behaviour, args.port, args.host)
@@ -0,0 +1,13 @@
+from agentchunking.utils.filehelpers import config_loader
+from agentchunking.database.manager import SQLDatabaseManager
+from agentchunking.constants import DB_CONFIG_PATH,METRICS_PORT
+from agentchunking import metrics
+from agentchunking.rewriting import rewrite_pending_segments
+from loguru import logger
+
+if __name__ == "__main__":
+    if METRICS_PORT:
+        metrics.start_metrics_server(METRICS_PORT)
+    db = SQLDatabaseManager(config_loader(DB_CONFIG_PATH))
+    rewritten = rewrite_pending_segments(db)
+    logger.info(f"Rewriting finished for {rewritten} segments.")
@@ -1,28 +1,91 @@
 from agentchunking.dataLoader import get_current_data_splits
-from agentchunking.segmentation import semantic_text_splitter
+from agentchunking.segmentation import semantic_text_splitter,count_e5_tokens,reusable_segments
+from agentchunking.dataLoader import passage_state
+from agentchunking.segmentBatch import SegmentBatch
+from agentchunking.dedup import project_segments
+from agentchunking.llm.shortner import get_copier_router
+from agentchunking.constants import METRICS_PORT,TRACE_DIR,PROFILE_DIR,PROFILE_INTERVAL
+from agentchunking.profiling import SamplingProfiler
+from agentchunking import metrics
+from agentchunking import tracing
 from loguru import logger
-import time
+from datetime import datetime
+import argparse
+import os
 
 if __name__ == "__main__":
-    data, db = get_current_data_splits()
+    parser = argparse.ArgumentParser(description="Segment every new or edited passage with the copier LLM.")
+    parser.add_argument("--trace", action="store_true", help=f"write a Chrome/OTLP trace per passage to {TRACE_DIR}")
+    parser.add_argument("--profile", action="store_true", help=f"sample stacks and write folded flamegraph data to {PROFILE_DIR}")
+    parser.add_argument("--profile-interval", type=float, default=PROFILE_INTERVAL, help="seconds between stack samples")
+    args = parser.parse_args()
+    tracing.tracer.enabled = args.trace
+    profiler = SamplingProfiler(args.profile_interval).start() if args.profile else None
+
+    if METRICS_PORT:
+        metrics.start_metrics_server(METRICS_PORT)
+    with tracing.span("load"):
+        data, db = get_current_data_splits()
+    if args.trace:
+        tracing.tracer.flush(TRACE_DIR, "loader")
     if len(data) > 0:
+        # representatives of near-duplicate groups, kept so their boundaries can be projected
+        representatives = set(data["duplicate_of"].dropna())
+        segmented_representatives = {}
+        calls_saved = 0
         idx = 0
         while idx < len(data):
             row = data.iloc[idx]
+            metrics.QUEUE_DEPTH.set(len(data) - idx, stage="segmentation")
             passage_id = row["id"]
             passage = row["text"]
             try:
-                logger.info(f"Processing passage: {passage_id}")
-                segments = semantic_text_splitter(passage, passage_id)
-                db.segmentation_table_insert(segments)
-                idx += 1  # proceed only if success
+                with tracing.span("passage", passage_id=passage_id, words=len(passage.split()),
+                                  resegment=bool(row["resegment"]), duplicate_of=str(row["duplicate_of"])) as passage_span:
+                    logger.info(f"Processing passage: {passage_id}")
+                    segments = None
+                    if row["duplicate_of"] in segmented_representatives:
+                        rep_text, rep_segments = segmented_representatives[row["duplicate_of"]]
+                        segments = project_segments(rep_text, rep_segments, passage, passage_id, count_tokens=count_e5_tokens)
+                        if segments is not None:
+                            calls_saved += len(rep_segments)
+                            logger.info(f"Projected {len(segments)} segments from {row['duplicate_of']}, LLM calls saved so far: {calls_saved}")
+                        else:
+                            logger.info(f"Alignment with {row['duplicate_of']} failed, segmenting with the LLM")
+                    if segments is None and row["resegment"]:
+                        # edited passage: keep the leading segments whose words did not change
+                        old_segments = SegmentBatch.from_frame(db.segmentation_table.select(condition_dict={"passage_id": passage_id}))
+                        old_state = db.passage_state_table.select_columns(["span_hashes"], condition_dict={"passage_id": passage_id})
+                        reused = reusable_segments(passage, old_segments, old_state["span_hashes"].iloc[0] if len(old_state) else "")
+                        start_word = reused[-1]["end"] + 1 if reused else 0
+                        logger.info(f"Re-segmenting edited passage from word {start_word}, reusing {len(reused)} segments")
+                        segments = reused + semantic_text_splitter(passage, passage_id, start_word=start_word)
+                    if segments is None:
+                        segments = semantic_text_splitter(passage, passage_id)
+                    if passage_id in representatives:
+                        segmented_representatives[passage_id] = (passage, segments)
+                    passage_span.set(segments=len(segments))
+                    db.replace_passage_segments([passage_id], segments, [passage_state(row, datetime.now(), segments)])
+                    idx += 1  # proceed only if success
+                    metrics.ITEMS_PROCESSED.inc(stage="segmentation")
+                    if get_copier_router().hedge_percentile is not None:
+                        logger.info(f"Hedging report: {get_copier_router().hedge_report()}")
             except Exception as e:
                 logger.error(f"Segmentation failed for passage {passage_id}: {e}")
                 if "503 UNAVAILABLE" in str(e):
                     logger.info("Server Is overloaded Trting again in 10 mins")
-                    time.sleep(600)
+                    metrics.sleep(600, site="segment_overloaded")
                 else:
                     logger.info("Sleeping for 60 seconds before retrying...")
-                    time.sleep(60)  # wait before retrying
+                    metrics.sleep(60, site="segment_retry")  # wait before retrying
+            if args.trace:
+                tracing.tracer.flush(TRACE_DIR, passage_id)
+        logger.info(f"Near-duplicate projection saved {calls_saved} LLM calls")
     else:
-        logger.info("All data has been segmented. Rewriting can be initialized.")
+        logger.info("All data has been segmented. Rewriting can be initialized with rewrite.py.")
+
+    if profiler is not None:
+        profiler.stop()
+        profiler.write_folded(os.path.join(PROFILE_DIR, f"segment-{datetime.now():%Y%m%d-%H%M%S}.folded"))
+        for label, share in profiler.top():
+            logger.info(f"profile {share:6.1%} {label}")
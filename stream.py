@@ -0,0 +1,40 @@
+from agentchunking.utils.filehelpers import config_loader
+from agentchunking.database.manager import SQLDatabaseManager
+from agentchunking.constants import (DB_CONFIG_PATH,
+                                     METRICS_PORT,
+                                     PIPELINE_QUEUE_SIZE,
+                                     PIPELINE_LOADER_BATCH_SIZE,
+                                     PIPELINE_SPLITTER_WORKERS,
+                                     PIPELINE_COPIER_WORKERS,
+                                     PIPELINE_SINK_WORKERS,
+                                     PIPELINE_REWRITER_WORKERS)
+from agentchunking.streaming import run_streaming_segmentation
+from agentchunking import metrics
+from loguru import logger
+import argparse
+
+# Streaming alternative to segment.py (+ rewrite.py): loader, splitter, copier, sink and
+# optionally the rewriter run concurrently, connected by bounded queues.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Segment (and rewrite) new or edited passages as a streaming pipeline.")
+    parser.add_argument("--rewrite", action="store_true", help="rewrite segments as soon as they are written")
+    parser.add_argument("--queue-size", type=int, default=PIPELINE_QUEUE_SIZE)
+    parser.add_argument("--loader-batch-size", type=int, default=PIPELINE_LOADER_BATCH_SIZE)
+    parser.add_argument("--splitter-workers", type=int, default=PIPELINE_SPLITTER_WORKERS)
+    parser.add_argument("--copier-workers", type=int, default=PIPELINE_COPIER_WORKERS)
+    parser.add_argument("--sink-workers", type=int, default=PIPELINE_SINK_WORKERS)
+    parser.add_argument("--rewriter-workers", type=int, default=PIPELINE_REWRITER_WORKERS)
+    args = parser.parse_args()
+
+    if METRICS_PORT:
+        metrics.start_metrics_server(METRICS_PORT)
+    db = SQLDatabaseManager(config_loader(DB_CONFIG_PATH))
+    report = run_streaming_segmentation(db,
+                                        rewrite=args.rewrite,
+                                        loader_batch_size=args.loader_batch_size,
+                                        queue_size=args.queue_size,
+                                        splitter_workers=args.splitter_workers,
+                                        copier_workers=args.copier_workers,
+                                        sink_workers=args.sink_workers,
+                                        rewriter_workers=args.rewriter_workers)
+    logger.info(f"Streaming segmentation finished: {report}")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# tests import the package from the repository root without installing it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,103 @@
+import threading
+import time
+
+from agentchunking.clientManagement import APIClientWrapper
+from agentchunking.llm.router import LLMBackend, ProviderRouter
+
+
+def sleeper(seconds, threads=None):
+    def call(text, client):
+        if threads is not None:
+            threads.append(threading.current_thread().name)
+        time.sleep(seconds)
+        return client
+    return call
+
+
+def backend(name, call_fn, **kwargs):
+    return LLMBackend(name, APIClientWrapper(name, 10**6, 10**6), call_fn, **kwargs)
+
+
+def warmed_router(backends, latency=0.01, **kwargs):
+    router = ProviderRouter(backends, hedge_percentile=90, hedge_max_fraction=1.0, hedge_min_samples=5, **kwargs)
+    router.recent_latencies.extend([latency] * 20)
+    router.total_calls = 20
+    return router
+
+
+def test_slow_primary_is_hedged():
+    slow = backend("slow", sleeper(0.5), prior_latency=0.001)  # best score, picked as primary
+    fast = backend("fast", sleeper(0.01))
+    router = warmed_router([slow, fast])
+    start = time.perf_counter()
+    assert router.call("text") == "fast"
+    assert time.perf_counter() - start < 0.4
+    assert router.hedge_report()["hedges_won"] == 1
+
+
+def test_fast_primary_is_not_hedged():
+    router = warmed_router([backend("a", sleeper(0.0), prior_latency=0.001), backend("b", sleeper(0.0))], latency=0.2)
+    for _ in range(5):
+        assert router.call("text") == "a"
+    assert router.hedge_report()["hedges_sent"] == 0
+
+
+def test_calls_without_history_stay_on_the_caller_thread():
+    threads = []
+    router = ProviderRouter([backend("a", sleeper(0.0, threads))], hedge_percentile=95)
+    router.call("text")
+    assert threads == [threading.current_thread().name]
+
+
+def test_hedge_pool_only_exists_with_hedging():
+    assert ProviderRouter([backend("a", sleeper(0.0))]).executor is None
+    assert ProviderRouter([backend("a", sleeper(0.0))], hedge_percentile=95).executor is not None
+
+
+def test_queue_time_does_not_trigger_hedges():
+    # one pool thread per backend: the second call waits on the pool while the first runs
+    slow_start = threading.Event()
+
+    def blocking(text, client):
+        slow_start.set()
+        time.sleep(0.3)
+        return client
+
+    a = backend("a", blocking, prior_latency=0.001)
+    b = backend("b", sleeper(0.0), prior_latency=10.0)
+    router = warmed_router([a, b], latency=0.5)
+    router.executor._max_workers = 1
+    results = []
+    first = threading.Thread(target=lambda: results.append(router.call("one")))
+    first.start()
+    slow_start.wait()
+    results.append(router.call("two"))
+    first.join()
+    assert results == ["a", "a"]
+    assert router.hedge_report()["hedges_sent"] == 0
+
+
+def test_concurrent_hedges_never_exceed_the_cap():
+    router = ProviderRouter([backend("a", sleeper(0.0)), backend("b", sleeper(0.0))],
+                            hedge_percentile=90, hedge_max_fraction=0.1)
+    router.total_calls = 50
+    barrier = threading.Barrier(32)
+    reserved = []
+
+    def contend():
+        barrier.wait()
+        reserved.append(router.reserve_hedge())
+
+    threads = [threading.Thread(target=contend) for _ in range(32)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(reserved) == 5 and router.hedges_sent == 5
+
+
+def test_hedge_without_a_free_backend_is_released():
+    slow = backend("slow", sleeper(0.2))
+    router = warmed_router([slow])
+    assert router.call("text") == "slow"
+    assert router.hedge_report()["hedges_sent"] == 0
@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from agentchunking.lexicalIndex import BM25Index, IndexSegment, decode_varints, encode_varints, sync_lexical_index, tokenize
+
+
+def test_varint_roundtrip():
+    values = [0, 1, 127, 128, 255, 300, 16383, 16384, 2**31 - 1, 2**40]
+    encoded = encode_varints(values)
+    assert decode_varints(encoded, 0, len(values)) == values
+    assert len(encode_varints([127])) == 1 and len(encode_varints([128])) == 2
+
+
+def test_postings_roundtrip(tmp_path):
+    docs = [(("p1", 0, 2), ["ক", "খ", "ক"]), (("p2", 0, 1), ["খ"]), (("p3", 0, 1), ["ক"])]
+    segment = IndexSegment.write(str(tmp_path / "seg"), docs)
+    assert segment.postings_for("ক") == [(0, 2), (2, 1)]
+    assert segment.postings_for("খ") == [(0, 1), (1, 1)]
+    assert segment.postings_for("গ") == []
+
+
+def test_tokenize_normalizes_bengali_digits():
+    assert tokenize("সাল ২০২৩") == tokenize("সাল 2023")
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25"))
+    index.add_documents([(("p1", 0, 3), "আমি ভাত খাই"), (("p2", 0, 3), "তুমি ভাত খাও"), (("p3", 0, 2), "সে যায়")])
+    return index
+
+
+def test_superseded_copies_do_not_change_scores(index):
+    before = index.search("ভাত")
+    index.add_documents([(("p1", 0, 3), "আমি ভাত খাই"), (("p2", 0, 3), "তুমি ভাত খাও")])
+    superseded = index.search("ভাত")
+    index.merge()
+    merged = index.search("ভাত")
+    assert len(index.segments) == 1 and len(index) == 3
+    for results in (superseded, merged):
+        assert dict(results) == pytest.approx(dict(before))
+
+
+def test_delete_is_persisted_and_undone_by_add(index, tmp_path):
+    assert index.delete([("p1", 0, 3), ("missing", 0, 1)]) == 1
+    assert [key for key, _ in index.search("ভাত")] == [("p2", 0, 3)]
+    reopened = BM25Index(str(tmp_path / "bm25"))
+    assert ("p1", 0, 3) not in reopened and len(reopened) == 2
+    reopened.add_documents([(("p1", 0, 3), "আমি ভাত খাই")])
+    assert ("p1", 0, 3) in reopened
+    reopened.merge()
+    assert reopened.tombstones == {}
+    assert {key for key, _ in reopened.search("ভাত")} == {("p1", 0, 3), ("p2", 0, 3)}
+
+
+def test_top_k_is_not_short_after_deletes(index):
+    index.add_documents([(("p4", 0, 2), "ভাত রান্না"), (("p5", 0, 2), "ভাত খাওয়া")])
+    index.delete([("p1", 0, 3)])
+    assert len(index.search("ভাত", k=3)) == 3
+
+
+class FakeSegmentDB:
+    """segmentation_table rows with their updated_at, served the way SQLDatabaseManager does for syncs."""
+    def __init__(self):
+        self.rows = {}
+        self.clock = datetime(2026, 1, 1)
+        self.scanned = 0
+
+    def put(self, key, text):
+        self.clock += timedelta(seconds=1)
+        self.rows[key] = (text, self.clock)
+
+    def sync_watermark(self, lag):
+        return self.clock
+
+    def changed_passage_segments(self, low, high, batch_size):
+        passages = {key[0] for key, (_, stamp) in self.rows.items() if low is None or low < stamp <= high}
+        rows = [(pid, start, end, text if low is None or stamp > low else None)
+                for (pid, start, end), (text, stamp) in self.rows.items() if pid in passages]
+        self.scanned += len(rows)
+        yield pd.DataFrame(rows, columns=["passage_id", "start", "end", "text"])
+
+
+def test_sync_reindexes_edits_under_an_unchanged_key(tmp_path):
+    db = FakeSegmentDB()
+    db.put(("p1", 0, 3), "আমি ভাত খাই")
+    db.put(("p2", 0, 2), "সে যায়")
+    db.put(("p2", 2, 4), "তুমি আসো")
+    index = BM25Index(str(tmp_path / "bm25"))
+    assert sync_lexical_index(db, index) == 3
+
+    db.put(("p1", 0, 3), "আমি রুটি খাই")  # same word span, new text
+    db.scanned = 0
+    assert sync_lexical_index(db, index) == 1
+    assert db.scanned == 1  # only the changed passage is read
+    assert index.search("ভাত") == []
+    assert [key for key, _ in index.search("রুটি")] == [("p1", 0, 3)]
+
+    reopened = BM25Index(str(tmp_path / "bm25"))
+    assert reopened.watermark == index.watermark
+    assert sync_lexical_index(db, reopened) == 0
+
+
+def test_sync_deletes_replaced_segments_of_changed_passages(tmp_path):
+    db = FakeSegmentDB()
+    db.put(("p1", 0, 2), "আমি ভাত")
+    db.put(("p1", 2, 4), "খাই রোজ")
+    db.put(("p2", 0, 2), "সে যায়")
+    index = BM25Index(str(tmp_path / "bm25"))
+    sync_lexical_index(db, index)
+
+    del db.rows[("p1", 0, 2)], db.rows[("p1", 2, 4)]  # re-segmented into one segment
+    db.put(("p1", 0, 4), "আমি ভাত খাই রোজ")
+    assert sync_lexical_index(db, index) == 1
+    assert set(index.live) == {("p1", 0, 4), ("p2", 0, 2)}
+
+
+class FakeAnnotations:
+    def get_data_by_ids(self, id_column_name, ids, select_columns):
+        return {pid: {"url": f"https://{pid}", "site_name": "site", "passage_heading": "heading"} for pid in ids}
+
+
+def test_retrieval_hydrates_with_one_query_and_retires_cached_results(index):
+    from sqlalchemy import create_engine
+    from agentchunking.database.definitions import SegmentationTable, SQLTable
+    from agentchunking.retrieval import RetrievalService
+
+    engine = create_engine("sqlite://")
+    SegmentationTable.__table__.create(engine)
+    segmentation = SQLTable(engine, SegmentationTable.__table__)
+    segmentation.insert([{"passage_id": "p1", "start": 0, "end": 3, "text": "আমি ভাত খাই", "data": ""},
+                         {"passage_id": "p2", "start": 0, "end": 3, "text": "তুমি ভাত খাও", "data": "তুমি ভাত খাও।"},
+                         {"passage_id": "p4", "start": 0, "end": 2, "text": "ভাত রান্না", "data": ""}])
+    db = type("DB", (), {"segmentation_table": segmentation, "annotation_table": FakeAnnotations()})()
+    service = RetrievalService(db, lexical_index=index)
+
+    results = service.search("ভাত", mode="lexical")
+    assert {r["passage_id"]: r["text"] for r in results} == {"p1": "আমি ভাত খাই", "p2": "তুমি ভাত খাও।"}
+    assert service.search("ভাত", mode="lexical") == results
+    assert service.report()["result_cache"]["hits"] == 1
+
+    index.add_documents([(("p4", 0, 2), "ভাত রান্না")])
+    assert {r["passage_id"] for r in service.search("ভাত", mode="lexical")} == {"p1", "p2", "p4"}
@@ -0,0 +1,8 @@
+from agentchunking.metrics import MetricsRegistry
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    counter = registry.counter("test_total", "Test counter.", ("site",))
+    counter.inc(site='C:\\keys\n"primary"')
+    assert 'test_total{site="C:\\\\keys\\n\\"primary\\""} 1.0' in registry.expose().splitlines()
@@ -0,0 +1,61 @@
+from sqlalchemy import create_engine, inspect, text
+
+from agentchunking.database.migrations import MIGRATIONS, applied_versions, run_migrations
+
+
+def sqlite_engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+
+
+def test_versions_are_unique_and_ordered():
+    versions = [version for version, _, _ in MIGRATIONS]
+    assert versions == sorted(set(versions))
+    assert versions[0] == 1
+
+
+def test_table_migrations_apply_once(tmp_path):
+    engine = sqlite_engine(tmp_path)
+    table_steps = [m for m in MIGRATIONS if all(callable(step) for step in m[2])]
+    assert run_migrations(engine, table_steps) == [3, 4]
+    assert run_migrations(engine, table_steps) == []
+    assert applied_versions(engine) == {3, 4}
+    assert {"segment_embedding_table", "passage_state_table"} <= set(inspect(engine).get_table_names())
+
+
+def test_only_pending_migrations_run(tmp_path):
+    engine = sqlite_engine(tmp_path)
+    steps = [(1, "create t", ["CREATE TABLE t (id INTEGER PRIMARY KEY)"])]
+    assert run_migrations(engine, steps) == [1]
+    steps.append((2, "add t.updated_at", ["ALTER TABLE t ADD COLUMN updated_at TIMESTAMP"]))
+    assert run_migrations(engine, steps) == [2]
+    with engine.connect() as conn:
+        columns = [row[1] for row in conn.execute(text("PRAGMA table_info(t)"))]
+        descriptions = dict(conn.execute(text("SELECT version, description FROM schema_migrations")).fetchall())
+    assert columns == ["id", "updated_at"]
+    assert descriptions == {1: "create t", 2: "add t.updated_at"}
+
+
+def test_failed_migration_is_not_recorded(tmp_path):
+    engine = sqlite_engine(tmp_path)
+    steps = [(1, "broken", ["CREATE TABLE"])]
+    try:
+        run_migrations(engine, steps)
+    except Exception:
+        pass
+    assert applied_versions(engine) == set()
+
+
+def test_export_watermark_migration_touches_updated_at():
+    version, _, steps = next(m for m in MIGRATIONS if m[0] == 5)
+    sql = " ".join(steps)
+    assert "ADD COLUMN IF NOT EXISTS updated_at" in sql
+    assert "BEFORE UPDATE ON segmentation_table" in sql
+    assert "CONCURRENTLY" in steps[-1]  # index built without blocking writers, last so it runs after the column exists
+
+
+def test_span_hashes_migration_matches_the_table():
+    from agentchunking.database.definitions import PassageStateTable
+
+    version, _, steps = next(m for m in MIGRATIONS if m[0] == 7)
+    assert "ADD COLUMN IF NOT EXISTS span_hashes" in steps[0]
+    assert "span_hashes" in PassageStateTable.__table__.c
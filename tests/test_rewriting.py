@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("google.genai")
+pytest.importorskip("pydantic")
+pytest.importorskip("transformers")
+
+from agentchunking import rewriting
+from agentchunking.clientManagement import APIClientWrapper, PriorityClientManager
+from agentchunking.llm.fake import FakeGeminiClient
+
+
+class FakeTable:
+    def __init__(self, batches=None, annotations=None):
+        self.batches = batches or []
+        self.annotations = annotations or {}
+        self.batches_read = 0
+        self.updates = []
+
+    def select_iter(self, columns, condition_dict, batch_size):
+        for batch in self.batches:
+            self.batches_read += 1
+            yield batch
+
+    def get_data_by_ids(self, id_column, ids, columns):
+        return {pid: self.annotations[pid] for pid in ids if pid in self.annotations}
+
+    def bulk_update(self, keys, updates):
+        self.updates.append(updates)
+
+
+class FakeDB:
+    def __init__(self, batches, annotations):
+        self.segmentation_table = FakeTable(batches=batches)
+        self.annotation_table = FakeTable(annotations=annotations)
+
+
+@pytest.mark.parametrize("packing", [False, True])
+def test_rewrite_stage_stops_once_every_key_is_exhausted(monkeypatch, packing):
+    client = FakeGeminiClient()
+    wrappers = [APIClientWrapper(client, 1, 10**6) for _ in range(2)]
+    for wrapper in wrappers:
+        wrapper.calls_made = 1  # daily budget already spent
+    monkeypatch.setattr(rewriting, "create_wrapped_clients_google",
+                        lambda *args, **kwargs: PriorityClientManager(wrappers, pool="test-exhausted", max_wait=0.1))
+    batch = pd.DataFrame({"passage_id": ["p1", "p1", "p2"], "start": [0, 3, 0], "end": [3, 6, 2],
+                          "text": ["এক দুই তিন", "চার পাঁচ ছয়", "সাত আট"]})
+    db = FakeDB([batch, batch.copy(), batch.copy()],
+                {"p1": {"site_name": "বিষয়", "passage_heading": "শিরোনাম"},
+                 "p2": {"site_name": "বিষয়", "passage_heading": "শিরোনাম"}})
+
+    assert rewriting.rewrite_pending_segments(db, workers=2, batch_size=3, packing=packing) == 0
+    assert db.segmentation_table.batches_read == 1
+    assert db.segmentation_table.updates == [[]]
+    assert client.calls == 0
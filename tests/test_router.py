@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+
+import pytest
+
+from agentchunking.clientManagement import APIClientWrapper, PriorityClientManager
+from agentchunking.llm.localServer import StandInBehaviour, start_stand_in_server
+from agentchunking.llm.router import LLMBackend, ProviderRouter
+
+
+class EchoClient:
+    """Stands in for a genai client: answers with the passage it was sent."""
+    def __init__(self):
+        self.models = self
+
+    def generate_content(self, model, contents):
+        return type("Response", (), {"text": json.dumps({"new_passage": contents})})()
+
+
+def fake_copier(text, client):
+    response = client.models.generate_content(model="fake", contents=text)
+    return json.loads(response.text)["new_passage"]
+
+
+def failing(text, client):
+    raise RuntimeError("backend down")
+
+
+def backend(name, call_fn=fake_copier, client=None, rpd=10**6, rpm=10**6, **kwargs):
+    return LLMBackend(name, APIClientWrapper(client or EchoClient(), rpd, rpm), call_fn, **kwargs)
+
+
+def test_failing_backend_is_routed_around():
+    bad, good = backend("bad", failing), backend("good")
+    router = ProviderRouter([bad, good])
+    results = [router.call("এক দুই তিন।") for _ in range(10)]
+    assert results == ["এক দুই তিন।"] * 10
+    assert good.calls == 10
+
+
+def test_exhausted_backend_falls_back_then_raises():
+    small, large = backend("small", rpd=2), backend("large", rpd=3)
+    router = ProviderRouter([small, large])
+    for _ in range(5):
+        router.call("এক দুই।")
+    assert small.wrapper.calls_made == 2 and large.wrapper.calls_made == 3
+    with pytest.raises(RuntimeError, match="remaining quota"):
+        router.call("এক দুই।")
+
+
+def test_failing_backend_scores_worse_than_a_working_one():
+    bad, good = backend("bad", failing), backend("good")
+    router = ProviderRouter([bad, good])
+    for _ in range(10):
+        router.call("এক দুই তিন।")
+    assert bad.calls <= 1
+    assert bad.score() > good.score()
+
+
+def test_unmeasured_backend_error_rate_counts():
+    unmeasured = backend("unmeasured", prior_latency=1.0)
+    assert unmeasured.score() == pytest.approx(1.0)
+    unmeasured.record(None, failed=True)
+    assert unmeasured.score() > 1.0
+
+
+def test_concurrent_callers_never_exceed_rpm():
+    backends = [backend(f"key-{idx}", rpm=5) for idx in range(4)]
+    router = ProviderRouter(backends)
+    outcomes = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(5):
+            try:
+                router.call("এক দুই।")
+                outcome = "ok"
+            except RuntimeError:
+                outcome = "exhausted"
+            with lock:
+                outcomes.append(outcome)
+
+    threads = [threading.Thread(target=worker) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert outcomes.count("ok") == 20
+    assert all(b.wrapper.calls_made == 5 for b in backends)
+
+
+def test_priority_manager_spreads_daily_budget():
+    small, large = APIClientWrapper("small", 100, 10**6), APIClientWrapper("large", 1000, 10**6)
+    manager = PriorityClientManager([small, large], pool="test-spread")
+    for _ in range(550):
+        manager.get_client()
+    assert small.used_fraction() == pytest.approx(large.used_fraction(), abs=0.02)
+
+
+def test_priority_manager_waits_without_holding_the_lock():
+    wrapper = APIClientWrapper("key", 10**6, 1)
+    wrapper.calls_made = 1
+    wrapper.request_timestamps.append(datetime.now() - timedelta(seconds=59.7))
+    manager = PriorityClientManager([wrapper], pool="test-wait", max_wait=5.0)
+    picked = []
+    waiter = threading.Thread(target=lambda: picked.append(manager.get_next_available_client()))
+    waiter.start()
+    time.sleep(0.05)
+    assert manager.lock.acquire(timeout=0.1)
+    manager.lock.release()
+    waiter.join()
+    assert picked == [0]
+
+
+def test_priority_manager_gives_up_after_max_wait():
+    wrapper = APIClientWrapper("key", 1, 10**6)
+    manager = PriorityClientManager([wrapper], pool="test-exhausted", max_wait=0.1)
+    manager.get_client()
+    with pytest.raises(RuntimeError, match="daily limit"):
+        manager.get_client()
+
+
+def test_router_against_local_stand_in_server():
+    behaviour = StandInBehaviour(latency_median=0.001, latency_sigma=0.0, rpm=3)
+    server = start_stand_in_server(behaviour, port=0, block=False)
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1beta/models/stand-in:generateContent"
+
+    def generate(text, key):
+        request = urllib.request.Request(url, data=json.dumps({"contents": [{"parts": [{"text": text}]}]}).encode("utf-8"),
+                                         headers={"Content-Type": "application/json", "x-goog-api-key": key})
+        with urllib.request.urlopen(request, timeout=5) as response:
+            body = json.loads(response.read())
+        return json.loads(body["candidates"][0]["content"]["parts"][0]["text"])["new_passage"]
+
+    try:
+        # the client side allows more than the server, the router must fall back on 429s
+        router = ProviderRouter([backend(f"local-{idx}", generate, client=f"key-{idx}") for idx in range(2)])
+        results = [router.call("প্রথম বাক্য। দ্বিতীয় বাক্য।") for _ in range(6)]
+        assert all(results)
+        with pytest.raises(urllib.error.HTTPError):
+            router.call("প্রথম বাক্য।")
+        assert behaviour.report()["ok"] == 6
+    finally:
+        server.shutdown()
+
+
+def test_copier_router_is_built_on_first_use(monkeypatch):
+    from agentchunking.llm import shortner
+
+    monkeypatch.setattr(shortner, "PROVIDERS_CONFIG_PATH", "configs/missing.yaml")
+    router = shortner.create_copier_router(backend="fake")
+    assert all(backend.name.startswith("google-") for backend in router.backends)
+    assert router.call("এক দুই তিন।")
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+
+from agentchunking.database.definitions import SQLTable, SegmentationTable
+from agentchunking.segmentBatch import COLUMNS, SegmentBatch
+
+
+def sample_batch():
+    batch = SegmentBatch()
+    batch.append("p1", "এক দুই", 0, 1)
+    batch.append("p1", "তিন", 2, 2)
+    batch.append("p2", "চার পাঁচ", 0, 1, data="লেখা")
+    return batch
+
+
+def test_append_and_index():
+    batch = sample_batch()
+    assert len(batch) == 3
+    assert batch[1] == {"passage_id": "p1", "text": "তিন", "start": 2, "end": 2, "data": ""}
+    assert batch.start.dtype == np.int64 and list(batch.end) == [1, 2, 1]
+    assert batch.passage_ids() == ["p1", "p2"]
+
+
+def test_slice_concat_and_records_roundtrip():
+    batch = sample_batch()
+    head, tail = batch[:2], batch[2:]
+    assert isinstance(head, SegmentBatch) and len(tail) == 1
+    assert (head + tail).to_records() == batch.to_records()
+    assert ([] + batch).to_records() == batch.to_records()
+    assert SegmentBatch.from_records(batch.to_records()).to_records() == batch.to_records()
+    assert SegmentBatch.from_frame(batch.to_frame()).to_records() == batch.to_records()
+    assert list(batch.rows())[2] == ("p2", "চার পাঁচ", 0, 1, "লেখা")
+    assert len(COLUMNS) == len(list(batch.rows())[0])
+
+
+def test_whole_passages_and_validation():
+    batch = SegmentBatch.whole_passages(["a", "b"], ["এক দুই তিন", "চার"])
+    assert list(batch.start) == [0, 0] and list(batch.end) == [3, 1]
+    with pytest.raises(ValueError):
+        SegmentBatch(["a"], ["x", "y"], [0], [1])
+
+
+def test_insert_into_file_backed_sqlite(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'segments.db'}")
+    SegmentationTable.__table__.create(engine)
+    table = SQLTable(engine, SegmentationTable.__table__)
+    batch = sample_batch()
+    table.insert(batch)
+    stored = table.select_columns(["passage_id", "text", "start", "end", "data"]).sort_values(["passage_id", "start"])
+    assert SegmentBatch.from_frame(stored).to_records() == batch.to_records()
+
+
+def test_reusable_segments_match_source_spans_not_copier_text():
+    pytest.importorskip("transformers")
+    from agentchunking.segmentation import reusable_segments, span_hashes
+
+    old_passage = "এক দুই তিন। চার পাঁচ। ছয় সাত আট।"
+    # copier output differs from the source words (punctuation, spacing)
+    old_segments = [{"passage_id": "p1", "text": "এক দুই তিন", "start": 0, "end": 2, "data": "rewritten"},
+                    {"passage_id": "p1", "text": "চার পাঁচ", "start": 3, "end": 4, "data": ""},
+                    {"passage_id": "p1", "text": "ছয় সাত আট", "start": 5, "end": 7, "data": ""}]
+    stored = span_hashes(old_passage, old_segments)
+
+    edited = "এক দুই তিন। চার পাঁচ। ছয় নয় আট।"
+    reused = reusable_segments(edited, old_segments, stored)
+    assert [(s["start"], s["end"], s["data"]) for s in reused] == [(0, 2, "rewritten"), (3, 4, "")]
+    assert len(reusable_segments("শূন্য দুই তিন। চার পাঁচ।", old_segments, stored)) == 0
+    assert len(reusable_segments(edited, old_segments, "")) == 0  # passages segmented before span hashes
+
+
+def test_row_metrics_count_rows_of_every_result_shape():
+    from agentchunking import metrics
+
+    engine = create_engine("sqlite://")
+    SegmentationTable.__table__.create(engine)
+    table = SQLTable(engine, SegmentationTable.__table__)
+    table.insert(sample_batch().to_records())
+
+    def rows_of(operation):
+        return metrics.DB_ROWS.value(table="segmentation_table", operation=operation)
+
+    before = rows_of("get_data_by_ids")
+    table.get_data_by_ids("passage_id", ["p1", "p2"], ["text", "start", "end", "data"], 5000, 1, "columns")
+    assert rows_of("get_data_by_ids") - before == len(sample_batch())
+    before = rows_of("bulk_update")
+    table.bulk_update(condition_columns=["passage_id", "start", "end"],
+                      update_array=[{"passage_id": "p1", "start": 0, "end": 1, "data": "x"}])
+    assert rows_of("bulk_update") - before == 1
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from agentchunking.llm.singleflight import SingleFlight, prompt_fingerprint
+
+
+def run_concurrently(fn, count):
+    results, errors = [], []
+    barrier = threading.Barrier(count)
+
+    def worker():
+        barrier.wait()
+        try:
+            results.append(fn())
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_identical_calls_share_one_request():
+    flight = SingleFlight("test")
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return "result"
+
+    results, errors = run_concurrently(lambda: flight.do("key", slow), 8)
+    assert results == ["result"] * 8 and not errors
+    assert len(calls) == 1
+    assert flight.report() == {"calls": 8, "coalesced": 7, "in_flight": 0}
+
+
+def test_exception_reaches_every_waiter():
+    flight = SingleFlight("test")
+
+    def failing():
+        time.sleep(0.2)
+        raise ValueError("boom")
+
+    results, errors = run_concurrently(lambda: flight.do("key", failing), 4)
+    assert not results
+    assert len(errors) == 4 and all(isinstance(exc, ValueError) for exc in errors)
+
+
+def test_nothing_is_cached_after_the_call():
+    flight = SingleFlight("test")
+    counter = iter(range(10))
+    assert flight.do("key", lambda: next(counter)) == 0
+    assert flight.do("key", lambda: next(counter)) == 1
+
+
+def test_fingerprint_separates_parts():
+    assert prompt_fingerprint("ab", "c") != prompt_fingerprint("a", "bc")
+    assert prompt_fingerprint("model", "prompt") == prompt_fingerprint("model", "prompt")
+
+
+def test_coalesced_rewrites_spend_quota_once():
+    pytest.importorskip("google.genai")
+    pytest.importorskip("pydantic")
+    from agentchunking.clientManagement import APIClientWrapper, PriorityClientManager
+    from agentchunking.llm.fake import FakeGeminiClient
+    from agentchunking.llm.rewriter import rewrite_passage
+
+    wrapper = APIClientWrapper(FakeGeminiClient(latency=0.2), 10**6, 10**6)
+    clients = PriorityClientManager([wrapper], pool="test-rewriter")
+    results, errors = run_concurrently(lambda: rewrite_passage("বিষয়", "শিরোনাম", "একটি অনুচ্ছেদ।", clients), 5)
+    assert len(results) == 5 and not errors
+    assert wrapper.calls_made == 1
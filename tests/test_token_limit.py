@@ -0,0 +1,93 @@
+import random
+
+import numpy as np
+import pytest
+
+from agentchunking.tokenEstimator import (TokenLimit, fit_token_estimator, load_token_estimator, prefix_features,
+                                          save_token_estimators, text_features)
+
+WORDS = ["বাংলাদেশ", "সরকার", "তথ্য", "২০২৩", "সেবা", "online", "ফরম", "নাগরিক", "আবেদন", "১২৩৪"]
+
+
+def count_tokens(text):
+    """Deterministic stand-in tokenizer: a Bengali word costs about a token per three characters."""
+    return 2 + sum(1 + len(word) // 3 for word in text.split())
+
+
+def random_text(rng, low=1, high=300):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+@pytest.fixture(scope="module")
+def estimator():
+    rng = random.Random(0)
+    texts = [random_text(rng) for _ in range(400)]
+    return fit_token_estimator("test", texts, [count_tokens(text) for text in texts], quantile=0.999)
+
+
+def test_prefix_features_match_text_features():
+    words = random_text(random.Random(1), 20, 20).split()
+    prefix = prefix_features(words)
+    assert np.allclose(prefix[15] - prefix[5], text_features(" ".join(words[5:15])))
+
+
+def test_decisions_match_the_exact_tokenizer(estimator):
+    exact_calls = []
+
+    def counted(text):
+        exact_calls.append(text)
+        return count_tokens(text)
+
+    limit = TokenLimit("test", counted, estimator, audit_every=0)
+    rng = random.Random(2)
+    texts = [random_text(rng) for _ in range(300)]
+    for text in texts:
+        assert limit.within(text, 400) == (count_tokens(text) <= 400)
+    assert len(exact_calls) < len(texts) / 2
+
+
+def test_window_checks_match_whole_text_checks(estimator):
+    limit = TokenLimit("test", count_tokens, estimator, audit_every=0)
+    words = random_text(random.Random(3), 500, 500).split()
+    prefix = limit.prefix(words)
+    for start, end in [(0, 10), (0, 200), (100, 450), (480, 600)]:
+        expected = count_tokens(" ".join(words[start:end])) <= 300
+        assert limit.window_within(words, start, end, 300, prefix) == expected
+        assert limit.window_within(words, start, end, 300) == expected
+
+
+def test_audits_run_the_exact_tokenizer(estimator):
+    calls = []
+    limit = TokenLimit("test", lambda text: calls.append(text) or count_tokens(text), estimator, audit_every=5)
+    for _ in range(10):
+        limit.within("সেবা", 10_000)  # far below the limit, decided by the estimate unless audited
+    assert len(calls) == 2
+
+
+def test_without_estimator_every_check_is_exact():
+    calls = []
+    limit = TokenLimit("test", lambda text: calls.append(text) or count_tokens(text))
+    assert limit.prefix(["এক"]) is None
+    assert limit.within("এক দুই", 10)
+    assert len(calls) == 1
+
+
+def test_save_and_load(tmp_path, estimator):
+    path = str(tmp_path / "calibration.json")
+    save_token_estimators([estimator], path)
+    loaded = load_token_estimator("test", path)
+    features = text_features("বাংলাদেশ সরকার ২০২৩")
+    assert loaded.bounds(features) == pytest.approx(estimator.bounds(features))
+    assert load_token_estimator("missing", path) is None
+    assert load_token_estimator("test", str(tmp_path / "absent.json")) is None
+
+
+def test_hard_checks_count_texts_close_to_the_limit(estimator):
+    calls = []
+    limit = TokenLimit("test", lambda text: calls.append(text) or count_tokens(text), estimator, audit_every=0, hard_margin=0.5)
+    text = random_text(random.Random(4), 100, 100)
+    _, _, high = estimator.bounds(text_features(text))
+    bound = int(high) + 1  # conclusive for a plain check, inside the margin of a hard one
+    assert limit.within(text, bound) and not calls
+    assert limit.within(text, bound, hard=True) == (count_tokens(text) <= bound)
+    assert len(calls) == 1
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("transformers")
+
+from agentchunking.vectorStore import SegmentVectorStore, sync_vector_store
+
+
+class FakeEmbeddingDB:
+    """segment_embedding_table rows with their embedded_at, served the way SQLDatabaseManager does for syncs."""
+    def __init__(self):
+        self.rows = {}
+        self.touched = {}  # passage_id -> last segmentation_table update
+        self.clock = datetime(2026, 1, 1)
+        self.scanned = 0
+
+    def tick(self):
+        self.clock += timedelta(seconds=1)
+        return self.clock
+
+    def embed(self, key, vector):
+        self.rows[key] = (np.asarray(vector, dtype="<f2").tobytes(), self.tick())
+
+    def resegment(self, passage_id):
+        self.rows = {key: row for key, row in self.rows.items() if key[0] != passage_id}
+        self.touched[passage_id] = self.tick()
+
+    def sync_watermark(self, lag):
+        return self.clock
+
+    def changed_passage_embeddings(self, low, high, batch_size):
+        passages = {key[0] for key, (_, stamp) in self.rows.items() if low is None or low < stamp <= high}
+        passages |= {pid for pid, stamp in self.touched.items() if low is not None and low < stamp <= high}
+        rows = [(pid, start, end, blob if low is None or stamp > low else None)
+                for (pid, start, end), (blob, stamp) in self.rows.items() if pid in passages]
+        rows += [(pid, None, None, None) for pid in passages if not any(key[0] == pid for key in self.rows)]
+        self.scanned += len(rows)
+        yield pd.DataFrame(rows, columns=["passage_id", "start", "end", "embedding"])
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_sync_replaces_a_re_embedded_vector_under_the_same_key(tmp_path):
+    db = FakeEmbeddingDB()
+    db.embed(("p1", 0, 4), unit(1, 0, 0, 0))
+    db.embed(("p2", 0, 3), unit(0, 1, 0, 0))
+    store = SegmentVectorStore(str(tmp_path / "vectors"), dim=4, index="ivf")
+    assert sync_vector_store(db, store) == 2
+
+    db.resegment("p1")
+    db.embed(("p1", 0, 4), unit(0, 0, 1, 0))  # same key, new text and vector
+    db.scanned = 0
+    assert sync_vector_store(db, store) == 1
+    assert db.scanned == 1  # only the changed passage is read
+    assert len(store) == 2
+    assert store.search(unit(0, 0, 1, 0), k=1)[0] == (("p1", 0, 4), pytest.approx(1.0, abs=1e-3))
+    assert store.search(unit(1, 0, 0, 0), k=1)[0][1] < 0.5
+
+    reopened = SegmentVectorStore(str(tmp_path / "vectors"), dim=4, index="ivf")
+    assert reopened.watermark == store.watermark and len(reopened) == 2
+    assert sync_vector_store(db, reopened) == 0
+
+
+def test_sync_deletes_segments_of_re_segmented_passages(tmp_path):
+    db = FakeEmbeddingDB()
+    db.embed(("p1", 0, 2), unit(1, 0, 0, 0))
+    db.embed(("p1", 2, 4), unit(0, 1, 0, 0))
+    db.embed(("p2", 0, 3), unit(0, 0, 1, 0))
+    store = SegmentVectorStore(str(tmp_path / "vectors"), dim=4, index="ivf")
+    sync_vector_store(db, store)
+
+    db.resegment("p1")  # new segments are not embedded yet
+    assert sync_vector_store(db, store) == 0
+    assert set(store.key_to_row) == {("p2", 0, 3)}
+
+
+def test_full_sync_keeps_unchanged_vectors(tmp_path):
+    db = FakeEmbeddingDB()
+    db.embed(("p1", 0, 2), unit(1, 0, 0, 0))
+    store = SegmentVectorStore(str(tmp_path / "vectors"), dim=4, index="ivf")
+    sync_vector_store(db, store)
+    assert sync_vector_store(db, store, full=True) == 0
+    assert store.count == 1